@@ -1,3 +1,29 @@
 from django.test import TestCase
+from django.urls import reverse
+
+from doctor.models import Appointment, Doctor_Information
+from hospital.models import User
+from lifeaid.testing import QueryBudgetMixin
+from .models import chatMessages
 
 # Create your tests here.
+
+
+class ChatQueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    def test_patient_chat_home(self):
+        user = User.objects.create(username='patient', is_patient=True)
+        patient = user.patient  # profiles are created by hospital.signals
+        for n in range(6):
+            doctor_user = User.objects.create(username=f'doctor{n}', is_doctor=True)
+            doctor = doctor_user.profile
+            Doctor_Information.objects.filter(pk=doctor.pk).update(name=f'Doctor {n}')
+            Appointment.objects.create(doctor=doctor, patient=patient, appointment_status='confirmed')
+            chatMessages.objects.create(user_from=user, user_to=doctor_user, message=f'Hello {n}')
+            chatMessages.objects.create(user_from=doctor_user, user_to=user, message=f'Reply {n}')
+
+        self.client.force_login(user)
+        with self.assertQueryBudget('chat-home'):
+            response = self.client.get(reverse('chat-home', args=[user.pk]), {'u': doctor_user.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Doctor 5')
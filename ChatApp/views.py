@@ -1,4 +1,3 @@
-from multiprocessing import context
 from django.shortcuts import render, redirect
 from django.http import HttpResponse
 from django.contrib import messages
@@ -15,6 +14,8 @@ import json,datetime
 from django.core import serializers
 from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
+from hospital import presence
+from lifeaid.ratelimit import ratelimit
 
 # Create your views here.
 
@@ -28,7 +29,7 @@ def home(request,pk):
             patients = Patient.objects.get(user_id=pk)
             #doctor = Doctor_Information.objects.all()
             appointments = Appointment.objects.filter(patient=patients).filter(appointment_status='confirmed')
-            doctor= Doctor_Information.objects.filter(appointment__in=appointments)
+            doctor= Doctor_Information.objects.filter(appointment__in=appointments).select_related('user').distinct()
             
             chats = {}
             if request.method == 'GET' and 'u' in request.GET:
@@ -50,7 +51,7 @@ def home(request,pk):
             }
             elif request.method == 'GET' and 'search' in request.GET:
                 query = request.GET.get('search')
-                doctor= Doctor_Information.objects.filter(Q(user__first_name__icontains=query) | Q(user__last_name__icontains=query))
+                doctor= Doctor_Information.objects.filter(Q(user__first_name__icontains=query) | Q(user__last_name__icontains=query)).select_related('user')
                 #chats = chatMessages.objects.filter(Q(user_from=request.user.id, user_to=request.GET['u']) | Q(user_from=request.GET['u'], user_to=request.user.id))
                 #chats = chats.order_by('date_created')
                 #doc = Doctor_Information.objects.get(username=request.GET['search'])
@@ -75,6 +76,7 @@ def home(request,pk):
                     "app":appointments,
                     "chat_id": int(request.GET['u'] if request.method == 'GET' and 'u' in request.GET else 0)
                 }
+            context["online"] = presence.online_user_ids(d.user_id for d in context["doctor"])
             print(request.GET['u'] if request.method == 'GET' and 'u' in request.GET else 0)
             return render(request,"chat.html",context)
     elif request.user.is_doctor:
@@ -83,7 +85,7 @@ def home(request,pk):
             #patients = Patient.objects.all()
             doctor = Doctor_Information.objects.get(user_id=pk)
             appointments = Appointment.objects.filter(doctor=doctor).filter(appointment_status='confirmed')
-            patients= Patient.objects.filter(appointment__in=appointments)
+            patients= Patient.objects.filter(appointment__in=appointments).select_related('user').distinct()
 
             chats = {}
             if request.method == 'GET' and 'u' in request.GET:
@@ -105,7 +107,7 @@ def home(request,pk):
             }
             elif request.method == 'GET' and 'search' in request.GET:
                 query = request.GET.get('search')
-                patients= Patient.objects.filter(Q(user__first_name__icontains=query) | Q(user__last_name__icontains=query))
+                patients= Patient.objects.filter(Q(user__first_name__icontains=query) | Q(user__last_name__icontains=query)).select_related('user')
                 #chats = chatMessages.objects.filter(Q(user_from=request.user.id, user_to=request.GET['u']) | Q(user_from=request.GET['u'], user_to=request.user.id))
                 #chats = chats.order_by('date_created')
                 #doc = Doctor_Information.objects.get(username=request.GET['search'])
@@ -131,6 +133,7 @@ def home(request,pk):
                     "doctor":doctor,
                     "chat_id": int(request.GET['u'] if request.method == 'GET' and 'u' in request.GET else 0)
                 }
+            context["online"] = presence.online_user_ids(p.user_id for p in context["patient"])
             print(request.GET['u'] if request.method == 'GET' and 'u' in request.GET else 0)
             return render(request,"chat-doctor.html",context)
 
@@ -145,6 +148,7 @@ def profile(request):
 @csrf_exempt
 @login_required(login_url='login')
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
+@ratelimit('chat', methods=None)
 def get_messages(request):
     chats = chatMessages.objects.filter(Q(id__gt=request.POST['last_id']),Q(user_from=request.user.id, user_to=request.POST['chat_id']) | Q(user_from=request.POST['chat_id'], user_to=request.user.id))
     new_msgs = []
@@ -162,6 +166,7 @@ def get_messages(request):
 @csrf_exempt
 @login_required(login_url='login')
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
+@ratelimit('chat', methods=None)
 def send_chat(request):
     resp = {}
     User = get_user_model()
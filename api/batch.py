@@ -0,0 +1,169 @@
+"""
+Several of the patient's own resources in one request, for the mobile
+dashboard (POST /api/batch/):
+
+    {"requests": [
+        {"resource": "appointments", "filters": {"status": "pending"}, "limit": 10},
+        {"resource": "prescriptions"},
+        {"resource": "reports", "filters": {"doctor": 4}},
+        {"resource": "payments"}
+    ]}
+
+Each sub-request is answered in order with {"status": 200, "data": [...]} or
+{"status": 400, "errors": {...}}; one bad entry doesn't fail the others.
+Rows carry doctor and patient ids only. The doctors and patients they refer
+to are gathered across every sub-request by a Loader and fetched once each
+(in_bulk), then returned under "included". The patient making the request is
+already loaded, so it costs no query.
+"""
+
+from django.core.exceptions import ValidationError
+
+from doctor.models import Appointment, Doctor_Information, Prescription, Report
+from hospital.models import Patient
+from sslcommerz.models import Payment
+from .serializers import DoctorSerializer, PatientSerializer
+
+
+MAX_SUB_REQUESTS = 10
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class BatchError(Exception):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+class Loader:
+    """
+    Collects the ids asked for while the sub-requests run, then loads them
+    all with one in_bulk() query (fewer if some were primed).
+    """
+
+    def __init__(self, queryset, serialize):
+        self.queryset = queryset
+        self.serialize = serialize
+        self.wanted = set()
+        self.loaded = {}
+
+    def want(self, pk):
+        if pk is not None and pk not in self.loaded:
+            self.wanted.add(pk)
+        return pk
+
+    def prime(self, obj):
+        self.loaded[obj.pk] = obj
+        self.wanted.discard(obj.pk)
+
+    def resolve(self):
+        if self.wanted:
+            self.loaded.update(self.queryset.in_bulk(self.wanted))
+            self.wanted = set()
+        return {pk: self.serialize(obj) for pk, obj in self.loaded.items()}
+
+
+class Resource:
+    """
+    One kind of sub-request: the patient's rows of a model, newest first,
+    read with values(fields). filters maps a request filter to a lookup.
+    """
+
+    def __init__(self, model, patient_field, ordering, fields, filters):
+        self.model = model
+        self.patient_field = patient_field
+        self.ordering = ordering
+        self.fields = fields
+        self.filters = filters
+
+    def rows(self, patient, filters, limit, loaders):
+        unknown = sorted(set(filters) - set(self.filters))
+        if unknown:
+            raise BatchError({'filters': 'Unknown filter(s): %s. Choose from: %s.' % (', '.join(unknown), ', '.join(sorted(self.filters)))})
+
+        queryset = self.model.objects.filter(**{self.patient_field: patient})
+        queryset = queryset.filter(**{self.filters[name]: value for name, value in filters.items()})
+        rows = list(queryset.order_by(self.ordering).values(*self.fields)[:limit])
+        for row in rows:
+            if 'doctor' in row:
+                loaders['doctors'].want(row['doctor'])
+            if 'patient' in row:
+                loaders['patients'].want(row['patient'])
+        return rows
+
+
+RESOURCES = {
+    'appointments': Resource(
+        Appointment, 'patient', '-date',
+        ['id', 'date', 'time', 'doctor', 'patient', 'appointment_type', 'appointment_status', 'serial_number', 'payment_status', 'message'],
+        {'status': 'appointment_status', 'doctor': 'doctor_id', 'date_from': 'date__gte', 'date_to': 'date__lte', 'payment_status': 'payment_status'},
+    ),
+    'prescriptions': Resource(
+        Prescription, 'patient', '-prescription_id',
+        ['prescription_id', 'create_date', 'doctor', 'patient', 'medicine_name', 'quantity', 'days', 'time',
+         'relation_with_meal', 'medicine_description', 'test_name', 'test_description', 'extra_information'],
+        {'doctor': 'doctor_id', 'date_from': 'create_date__gte', 'date_to': 'create_date__lte'},
+    ),
+    'reports': Resource(
+        Report, 'patient', '-report_id',
+        ['report_id', 'doctor', 'patient', 'specimen_id', 'specimen_type', 'collection_date', 'receiving_date',
+         'test_name', 'result', 'unit', 'referred_value', 'delivery_date', 'other_information'],
+        {'doctor': 'doctor_id', 'date_from': 'delivery_date__gte', 'date_to': 'delivery_date__lte'},
+    ),
+    # No card numbers
+    'payments': Resource(
+        Payment, 'patient', '-payment_id',
+        ['payment_id', 'invoice_number', 'patient', 'appointment', 'order', 'test_order', 'prescription', 'payment_type',
+         'transaction_id', 'currency_amount', 'currency', 'card_type', 'status', 'transaction_date'],
+        {'payment_type': 'payment_type', 'status': 'status'},
+    ),
+}
+
+
+def make_loaders(request):
+    context = {'request': request}
+    return {
+        'doctors': Loader(
+            Doctor_Information.objects.select_related('hospital_name', 'department_name', 'specialization'),
+            lambda doctor: DoctorSerializer(doctor, context=context).data,
+        ),
+        'patients': Loader(Patient.objects.all(), lambda patient: PatientSerializer(patient, context=context).data),
+    }
+
+
+def sub_request_limit(entry):
+    limit = entry.get('limit', DEFAULT_LIMIT)
+    if not isinstance(limit, int) or isinstance(limit, bool) or not 1 <= limit <= MAX_LIMIT:
+        raise BatchError({'limit': 'Must be a whole number between 1 and %d.' % MAX_LIMIT})
+    return limit
+
+
+def run_batch(patient, entries, loaders):
+    """
+    Answer each sub-request for patient. Returns the responses, in order;
+    the caller resolves the loaders afterwards.
+    """
+    responses = []
+    for entry in entries:
+        try:
+            if not isinstance(entry, dict):
+                raise BatchError({'non_field_errors': 'Each request must be an object.'})
+            resource = RESOURCES.get(entry.get('resource'))
+            if resource is None:
+                raise BatchError({'resource': 'Choose from: %s.' % ', '.join(RESOURCES)})
+            filters = entry.get('filters') or {}
+            if not isinstance(filters, dict):
+                raise BatchError({'filters': 'Must be an object.'})
+            data = resource.rows(patient, filters, sub_request_limit(entry), loaders)
+        except BatchError as exc:
+            responses.append({'status': 400, 'errors': exc.errors})
+        except ValidationError as exc:
+            # A filter value Django can't convert (a word for a date)
+            responses.append({'status': 400, 'errors': {'filters': exc.messages}})
+        except (ValueError, TypeError) as exc:
+            # ... or a word for a doctor id, a list for a status
+            responses.append({'status': 400, 'errors': {'filters': [str(exc)]}})
+        else:
+            responses.append({'status': 200, 'data': data})
+    return responses
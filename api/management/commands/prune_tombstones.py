@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Delete sync tombstones older than SYNC_TOMBSTONE_DAYS (run it from cron daily)'
+
+    def handle(self, *args, **options):
+        pruned = prune_tombstones()
+        self.stdout.write(f'Pruned {pruned} tombstone(s)')
@@ -0,0 +1,19 @@
+from django.db import models
+
+
+class Tombstone(models.Model):
+    """
+    A row deleted from one of the models in api/sync.py, so clients that
+    synced before the delete are told to drop it. patient_id and doctor_id
+    are copied from the row: it can't be joined to any more, but each user
+    should only hear about their own deletes. Pruned after
+    SYNC_TOMBSTONE_DAYS (`manage.py prune_tombstones`).
+    """
+    model = models.CharField(max_length=100)
+    object_id = models.IntegerField()
+    patient_id = models.IntegerField(null=True, blank=True)
+    doctor_id = models.IntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return '%s %s' % (self.model, self.object_id)
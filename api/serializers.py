@@ -1,6 +1,8 @@
+from django.db import models
 from rest_framework import serializers
 from hospital.models import Hospital_Information, Patient, User 
 from doctor.models import Doctor_Information
+from hospital_admin.models import hospital_department
 
 # Serialization --> convert python data (from our database models) to JSON data
 
@@ -10,6 +12,74 @@ class HospitalSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+HOSPITAL_FIELDS = [field.name for field in Hospital_Information._meta.concrete_fields]
+
+
+class RowSerializer:
+    """
+    Read-only, faster stand-in for a ModelSerializer(many=True) on rows from
+    model.objects.values(*fields): no model instances and no per-field
+    serializer objects, but the same output (absolute image URLs, datetimes
+    in the local time zone). Iterating it converts the rows lazily.
+    """
+
+    def __init__(self, model, rows, fields, request=None):
+        self.rows = rows
+        self.converters = [(name, self.converter(model._meta.get_field(name), request)) for name in fields]
+
+    @staticmethod
+    def converter(field, request):
+        if isinstance(field, models.FileField):
+            def file_url(value):
+                if not value:
+                    return None
+                url = field.storage.url(value)
+                return request.build_absolute_uri(url) if request is not None else url
+            return file_url
+        if isinstance(field, models.DateTimeField):
+            return serializers.DateTimeField().to_representation
+        return None
+
+    def __iter__(self):
+        converters = self.converters
+        for row in self.rows:
+            yield {name: convert(row[name]) if convert and row[name] is not None else row[name] for name, convert in converters}
+
+    @property
+    def data(self):
+        return list(self)
+
+
+class DoctorSerializer(serializers.ModelSerializer):
+    # Related names come from select_related() in the view, ids from the row
+    hospital_id = serializers.IntegerField(source='hospital_name_id', read_only=True)
+    hospital_name = serializers.CharField(source='hospital_name.name', read_only=True)
+    department_id = serializers.IntegerField(source='department_name_id', read_only=True)
+    department_name = serializers.CharField(source='department_name.hospital_department_name', read_only=True)
+    specialization_id = serializers.IntegerField(read_only=True)
+    specialization = serializers.CharField(source='specialization.specialization_name', read_only=True)
+
+    class Meta:
+        model = Doctor_Information
+        fields = [
+            'doctor_id', 'name', 'gender', 'description', 'featured_image', 'department',
+            'hospital_id', 'hospital_name', 'department_id', 'department_name', 'specialization_id', 'specialization',
+            'visiting_hour', 'consultation_fee', 'report_fee', 'next_available_slot',
+        ]
+
+
+class PatientSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Patient
+        fields = ['patient_id', 'name', 'username', 'featured_image', 'blood_group']
+
+
+class DepartmentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = hospital_department
+        fields = ['hospital_department_id', 'hospital_department_name', 'hospital', 'featured_image']
+
+
 # class ProjectSerializer(serializers.ModelSerializer):
 #     owner = ProfileSerializer(many=False)
 #     tags = TagSerializer(many=True)
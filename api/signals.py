@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from doctor.models import Appointment, Prescription, Report
+from hospital.models import Hospital_Information
+from pharmacy.models import Medicine
+from .models import Tombstone
+from .sync import SYNCED_MODELS
+
+
+# Deletes, for clients syncing with /api/sync/
+
+@receiver(post_delete, sender=Hospital_Information)
+@receiver(post_delete, sender=Medicine)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=Prescription)
+@receiver(post_delete, sender=Report)
+def recordTombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(
+        model=SYNCED_MODELS[sender], object_id=instance.pk,
+        patient_id=getattr(instance, 'patient_id', None), doctor_id=getattr(instance, 'doctor_id', None),
+    )
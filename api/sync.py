@@ -0,0 +1,129 @@
+"""
+Delta sync for mobile and kiosk clients (GET /api/sync/?since=<token>).
+
+The response is NDJSON, streamed as it is read. Each line is one of:
+
+    {"resource": "appointments", "op": "upsert", "data": {...}}
+    {"resource": "appointments", "op": "delete", "id": 12}
+    {"token": "..."}
+
+Without `since` every row the user may see is sent (a full sync). With it,
+only rows whose updated_at moved since the token was issued, then the
+deletes recorded in the Tombstone table. The token comes last: a client
+that didn't get it (a dropped connection) keeps its old one and asks again.
+Rows near the token's time are sent twice (SYNC_OVERLAP_SECONDS), so
+applying the lines must be idempotent. Tokens older than
+SYNC_TOMBSTONE_DAYS are refused, the deletes before then are gone.
+
+Hospitals and medicines are sent to everyone. Appointments, prescriptions
+and reports only to their patient and doctor, and to hospital admins.
+"""
+
+import datetime
+import json
+
+from django.conf import settings
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+
+from doctor.models import Appointment, Doctor_Information, Prescription, Report
+from hospital.models import Hospital_Information, Patient
+from pharmacy.models import Medicine
+from .models import Tombstone
+from .serializers import RowSerializer
+
+
+SYNCED = {
+    'hospitals': Hospital_Information,
+    'medicines': Medicine,
+    'appointments': Appointment,
+    'prescriptions': Prescription,
+    'reports': Report,
+}
+SYNCED_MODELS = {model: name for name, model in SYNCED.items()}
+
+# Rows with a patient and a doctor, only synced to them
+PERSONAL = {'appointments', 'prescriptions', 'reports'}
+
+TOKEN_SALT = 'api.sync'
+CHUNK_SIZE = 500
+
+
+class TokenExpired(Exception):
+    pass
+
+
+def make_token(moment):
+    return signing.dumps(int(moment.timestamp() * 1_000_000), salt=TOKEN_SALT)
+
+
+def read_token(token):
+    """
+    The time a token was issued. Raises signing.BadSignature for tokens we
+    didn't make and TokenExpired for ones too old to sync from.
+    """
+    moment = datetime.datetime.fromtimestamp(signing.loads(token, salt=TOKEN_SALT) / 1_000_000, tz=datetime.timezone.utc)
+    if moment < timezone.now() - datetime.timedelta(days=settings.SYNC_TOMBSTONE_DAYS):
+        raise TokenExpired
+    return moment
+
+
+def owner_filter(user):
+    """
+    Which personal rows user may sync, as filter() arguments that work on
+    the rows and on their tombstones: {} for all of them, None for none.
+    """
+    if user.is_hospital_admin or user.is_superuser:
+        return {}
+    if user.is_patient:
+        pk = Patient.objects.filter(user=user).values_list('pk', flat=True).first()
+        return {'patient_id': pk} if pk is not None else None
+    if user.is_doctor:
+        pk = Doctor_Information.objects.filter(user=user).values_list('pk', flat=True).first()
+        return {'doctor_id': pk} if pk is not None else None
+    return None
+
+
+def changes(user, since, request):
+    """
+    Yield the sync lines for user (dicts), ending with the new token. since
+    is a datetime from read_token(), or None for a full sync.
+    """
+    started = timezone.now()
+    owner = owner_filter(user)
+    after = since - datetime.timedelta(seconds=settings.SYNC_OVERLAP_SECONDS) if since else None
+
+    for name, model in SYNCED.items():
+        if name in PERSONAL and owner is None:
+            continue
+        rows = model.objects.filter(**owner) if name in PERSONAL else model.objects.all()
+        if after:
+            rows = rows.filter(updated_at__gte=after)
+        fields = [field.name for field in model._meta.concrete_fields]
+        rows = rows.order_by('updated_at', 'pk').values(*fields).iterator(chunk_size=CHUNK_SIZE)
+        for data in RowSerializer(model, rows, fields, request):
+            yield {'resource': name, 'op': 'upsert', 'data': data}
+
+    if after:
+        visible = Q(model__in=set(SYNCED) - PERSONAL)
+        if owner is not None:
+            visible |= Q(model__in=PERSONAL, **owner)
+        deletes = Tombstone.objects.filter(visible, deleted_at__gte=after).order_by('deleted_at', 'pk')
+        for model, object_id in deletes.values_list('model', 'object_id').iterator(chunk_size=CHUNK_SIZE):
+            yield {'resource': model, 'op': 'delete', 'id': object_id}
+
+    yield {'token': make_token(started)}
+
+
+def prune_tombstones():
+    # Tokens this old are refused by read_token(), nothing reads these any more
+    cutoff = timezone.now() - datetime.timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
+
+
+def ndjson(lines):
+    for line in lines:
+        yield json.dumps(line, cls=DjangoJSONEncoder) + '\n'
@@ -0,0 +1,319 @@
+import datetime
+import gzip
+import json
+import os
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from doctor.models import Appointment, Doctor_Information, Prescription, Report
+from hospital.models import Hospital_Information, User
+from hospital_admin.models import hospital_department, specialization
+from lifeaid.testing import QueryBudgetMixin
+from pharmacy.models import Medicine
+from sslcommerz.models import Payment
+from .models import Tombstone
+from .sync import make_token
+from .serializers import HOSPITAL_FIELDS, HospitalSerializer, RowSerializer
+
+
+class HospitalListTests(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('api-hospitals')
+        self.hospitals = [
+            Hospital_Information.objects.create(name='Hospital %d' % i, address='Dhaka', hospital_type='public', available_icu_no=i)
+            for i in range(5)
+        ]
+
+    def get(self, url=None, **headers):
+        response = self.client.get(url or self.url, **headers)
+        if response.get('Content-Encoding') == 'gzip':
+            return response, json.loads(gzip.decompress(response.content))
+        return response, response.json() if response.status_code == 200 else None
+
+    def test_cursor_pages_cover_every_hospital_once(self):
+        seen = []
+        url = self.url + '?page_size=2'
+        while url:
+            response, body = self.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [row['hospital_id'] for row in body['results']]
+            url = body['next']
+        self.assertEqual(seen, [hospital.pk for hospital in self.hospitals])
+
+    def test_sparse_fieldsets(self):
+        response, body = self.get(self.url + '?fields=name,available_icu_no')
+        self.assertEqual(body['results'][0], {'hospital_id': self.hospitals[0].pk, 'name': 'Hospital 0', 'available_icu_no': 0})
+
+        response, body = self.get(self.url + '?fields=name,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['fields'])
+
+    def test_fast_path_matches_the_model_serializer(self):
+        request = RequestFactory().get(self.url)
+        queryset = Hospital_Information.objects.order_by('hospital_id')
+        expected = HospitalSerializer(queryset, many=True, context={'request': request}).data
+        rows = RowSerializer(Hospital_Information, queryset.values(*HOSPITAL_FIELDS), HOSPITAL_FIELDS, request).data
+        self.assertEqual(rows, [dict(row) for row in expected])
+
+    def test_gzip_and_etag(self):
+        response, body = self.get(HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(body['results']), 5)
+
+        response, body = self.get(HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        self.hospitals[0].available_icu_no = 9
+        self.hospitals[0].save()
+        response, body = self.get(HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_department_changes_make_a_new_etag(self):
+        # The hospital's updated_at is in the response
+        response, body = self.get()
+        hospital_department.objects.create(hospital=self.hospitals[0], hospital_department_name='Cardiology')
+        response, body = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_query_budget(self):
+        with self.assertQueryBudget('api-hospitals'):
+            self.get(self.url + '?page_size=2&fields=name')
+
+
+@override_settings(DOCTOR_DAILY_APPOINTMENTS=2, APPOINTMENT_BOOKING_DAYS=7)
+class MobileApiTests(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='patient', password='secret', is_patient=True)
+        self.client.defaults['HTTP_AUTHORIZATION'] = 'Bearer %s' % RefreshToken.for_user(self.user).access_token
+
+        self.hospital = Hospital_Information.objects.create(name='Popular', hospital_type='private')
+        self.cardiology = hospital_department.objects.create(hospital=self.hospital, hospital_department_name='Cardiology')
+        self.surgeon = specialization.objects.create(hospital=self.hospital, specialization_name='Surgeon')
+        self.doctors = []
+        for name, department in [('Rahim', self.cardiology), ('Karim', None), ('Salma', self.cardiology)]:
+            user = User.objects.create(username=name.lower(), is_doctor=True)
+            doctor = user.profile
+            doctor.name = name
+            doctor.register_status = 'Accepted'
+            doctor.hospital_name = self.hospital
+            doctor.department_name = department
+            doctor.specialization = self.surgeon if department else None
+            doctor.save()
+            self.doctors.append(doctor)
+
+    def test_jwt_is_required(self):
+        del self.client.defaults['HTTP_AUTHORIZATION']
+        self.assertEqual(self.client.get(reverse('api-doctors')).status_code, 401)
+
+        self.client.force_login(self.user)  # a site session isn't enough
+        self.assertEqual(self.client.get(reverse('api-doctors')).status_code, 401)
+
+        access = self.client.post(reverse('token_obtain_pair'), {'username': 'patient', 'password': 'secret'}).json()['access']
+        response = self.client.get(reverse('api-doctors'), HTTP_AUTHORIZATION='Bearer %s' % access)
+        self.assertEqual(response.status_code, 200)
+
+    def test_doctor_filters(self):
+        response = self.client.get(reverse('api-doctors'), {'department': self.cardiology.pk})
+        results = response.json()['results']
+        self.assertEqual([doctor['name'] for doctor in results], ['Rahim', 'Salma'])
+        self.assertEqual(results[0]['department_name'], 'Cardiology')
+        self.assertEqual(results[0]['specialization'], 'Surgeon')
+        self.assertEqual(results[0]['hospital_name'], 'Popular')
+
+        response = self.client.get(reverse('api-doctors'), {'specialization': 'surgeons'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_doctor_pages_are_cached_until_a_doctor_changes(self):
+        with self.assertQueryBudget('api-doctors'):
+            self.client.get(reverse('api-doctors'), {'page_size': 2})
+        with self.assertNumQueries(1):  # the JWT's user
+            self.client.get(reverse('api-doctors'), {'page_size': 2})
+
+        self.doctors[0].name = 'Rahim Uddin'
+        self.doctors[0].save()
+        response = self.client.get(reverse('api-doctors'), {'page_size': 2})
+        self.assertEqual(response.json()['results'][0]['name'], 'Rahim Uddin')
+
+    def test_sort_and_filter_by_next_available_slot(self):
+        now = timezone.now()
+        rahim, karim, salma = self.doctors
+        Doctor_Information.objects.filter(pk=salma.pk).update(next_available_slot=now + datetime.timedelta(hours=2))
+        Doctor_Information.objects.filter(pk=karim.pk).update(next_available_slot=now + datetime.timedelta(days=3))
+        Doctor_Information.objects.filter(pk=rahim.pk).update(next_available_slot=now - datetime.timedelta(hours=1))  # gone by
+
+        response = self.client.get(reverse('api-doctors'), {'sort': 'available'})
+        self.assertEqual([doctor['name'] for doctor in response.json()['results']], ['Salma', 'Karim'])
+
+        response = self.client.get(reverse('api-doctors'), {'available_by': (now + datetime.timedelta(days=1)).date().isoformat()})
+        self.assertEqual([doctor['name'] for doctor in response.json()['results']], ['Salma'])
+
+        self.assertEqual(self.client.get(reverse('api-doctors'), {'available_by': 'soon'}).status_code, 400)
+
+    def test_departments(self):
+        other = Hospital_Information.objects.create(name='Square', hospital_type='private')
+        hospital_department.objects.create(hospital=other, hospital_department_name='Neurology')
+
+        with self.assertQueryBudget('api-departments'):
+            response = self.client.get(reverse('api-departments'), {'hospital': self.hospital.pk})
+        self.assertEqual([row['hospital_department_name'] for row in response.json()['results']], ['Cardiology'])
+
+    def test_availability_skips_full_days(self):
+        today = timezone.localdate()
+        tomorrow = today + datetime.timedelta(days=1)
+        patient = self.user.patient
+        for status in ['pending', 'confirmed', 'cancelled']:
+            Appointment.objects.create(doctor=self.doctors[0], patient=patient, date=tomorrow, appointment_status=status, appointment_type='checkup')
+        Appointment.objects.create(doctor=self.doctors[0], patient=patient, date=today, appointment_status='pending', appointment_type='checkup')
+
+        url = reverse('api-doctor-availability', args=[self.doctors[0].pk])
+        with self.assertQueryBudget('api-doctor-availability'):
+            response = self.client.get(url)
+        dates = response.json()['dates']
+        self.assertEqual(dates[0], {'date': today.isoformat(), 'places_left': 1})
+        self.assertNotIn(tomorrow.isoformat(), [row['date'] for row in dates])
+        self.assertEqual(len(dates), 6)
+
+        self.assertEqual(self.client.get(url, {'days': 8}).status_code, 400)
+
+
+class BatchTests(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='patient', is_patient=True)
+        self.patient = self.user.patient
+        self.client.defaults['HTTP_AUTHORIZATION'] = 'Bearer %s' % RefreshToken.for_user(self.user).access_token
+
+        self.doctors = [User.objects.create(username=name, is_doctor=True).profile for name in ['rahim', 'karim']]
+        today = timezone.localdate()
+        for doctor in self.doctors:
+            Appointment.objects.create(doctor=doctor, patient=self.patient, date=today, appointment_status='pending', appointment_type='checkup')
+            Prescription.objects.create(doctor=doctor, patient=self.patient, create_date=today, medicine_name='Napa')
+            Report.objects.create(doctor=doctor, patient=self.patient, test_name='CBC')
+        Payment.objects.create(patient=self.patient, payment_type='appointment', card_no='4111111111111111')
+
+        other = User.objects.create(username='other', is_patient=True).patient
+        Appointment.objects.create(doctor=self.doctors[0], patient=other, date=today, appointment_status='pending', appointment_type='checkup')
+
+    def batch(self, *entries):
+        return self.client.post(reverse('api-batch'), {'requests': list(entries)}, content_type='application/json')
+
+    def test_dashboard_in_one_request(self):
+        with self.assertQueryBudget('api-batch'):
+            response = self.batch(
+                {'resource': 'appointments'}, {'resource': 'prescriptions'}, {'resource': 'reports'}, {'resource': 'payments'},
+            )
+        body = response.json()
+        self.assertEqual([entry['status'] for entry in body['responses']], [200] * 4)
+        self.assertEqual([len(entry['data']) for entry in body['responses']], [2, 2, 2, 1])
+        self.assertNotIn('card_no', body['responses'][3]['data'][0])
+
+        # Each doctor and patient appears once, however many rows refer to them
+        self.assertEqual(sorted(body['included']['doctors']), sorted(str(doctor.pk) for doctor in self.doctors))
+        self.assertEqual(list(body['included']['patients']), [str(self.patient.pk)])
+
+    def test_filters_and_limits(self):
+        body = self.batch(
+            {'resource': 'appointments', 'filters': {'doctor': self.doctors[0].pk}},
+            {'resource': 'reports', 'limit': 1},
+        ).json()
+        self.assertEqual(len(body['responses'][0]['data']), 1)
+        self.assertEqual(len(body['responses'][1]['data']), 1)
+
+        # Only the doctors the returned rows refer to
+        referred = {row['doctor'] for entry in body['responses'] for row in entry['data']}
+        self.assertEqual({int(pk) for pk in body['included']['doctors']}, referred)
+
+    def test_bad_sub_requests_dont_fail_the_others(self):
+        body = self.batch(
+            {'resource': 'medicines'},
+            {'resource': 'appointments', 'filters': {'room': 3}},
+            {'resource': 'appointments', 'filters': {'date_from': 'yesterday'}},
+            {'resource': 'appointments', 'filters': {'doctor': 'rahim'}},
+            {'resource': 'appointments', 'limit': 1000},
+            {'resource': 'payments'},
+        ).json()
+        self.assertEqual([entry['status'] for entry in body['responses']], [400, 400, 400, 400, 400, 200])
+
+    def test_only_patients(self):
+        self.assertEqual(self.batch().status_code, 400)
+        self.assertEqual(self.batch(*[{'resource': 'payments'}] * 11).status_code, 400)
+
+        doctor_user = self.doctors[0].user
+        self.client.defaults['HTTP_AUTHORIZATION'] = 'Bearer %s' % RefreshToken.for_user(doctor_user).access_token
+        self.assertEqual(self.batch({'resource': 'payments'}).status_code, 403)
+
+
+@override_settings(SYNC_OVERLAP_SECONDS=0)
+class SyncTests(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='patient', is_patient=True)
+        self.client.defaults['HTTP_AUTHORIZATION'] = 'Bearer %s' % RefreshToken.for_user(self.user).access_token
+
+        self.doctor = User.objects.create(username='rahim', is_doctor=True).profile
+        other = User.objects.create(username='other', is_patient=True).patient
+        self.hospital = Hospital_Information.objects.create(name='Popular', hospital_type='private')
+        self.medicine = Medicine.objects.create(name='Napa', stock_quantity=10)
+        self.appointments = [
+            Appointment.objects.create(doctor=self.doctor, patient=patient, date=timezone.localdate(), appointment_status='pending', appointment_type='checkup')
+            for patient in [self.user.patient, self.user.patient, other]
+        ]
+
+    def sync(self, token=None):
+        response = self.client.get(reverse('api-sync'), {'since': token} if token else {})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        return lines[:-1], lines[-1]['token']
+
+    def test_full_sync_sends_only_the_users_rows(self):
+        with self.assertQueryBudget('api-sync'):
+            lines, token = self.sync()
+        pk_names = {'hospitals': 'hospital_id', 'medicines': 'serial_number', 'appointments': 'id'}
+        sent = [(line['resource'], line['data'][pk_names[line['resource']]]) for line in lines]
+        self.assertEqual(sent, [
+            ('hospitals', self.hospital.pk), ('medicines', self.medicine.pk),
+            ('appointments', self.appointments[0].pk), ('appointments', self.appointments[1].pk),
+        ])
+
+    def test_delta_sync_sends_changes_and_deletes(self):
+        lines, token = self.sync()
+
+        self.appointments[0].appointment_status = 'confirmed'
+        self.appointments[0].save()
+        deleted = self.appointments[1].pk
+        self.appointments[1].delete()
+        self.appointments[2].delete()  # someone else's
+        self.hospital.delete()
+
+        lines, token = self.sync(token)
+        self.assertEqual([(line['resource'], line['op']) for line in lines], [
+            ('appointments', 'upsert'), ('appointments', 'delete'), ('hospitals', 'delete'),
+        ])
+        self.assertEqual(lines[0]['data']['appointment_status'], 'confirmed')
+        self.assertEqual(lines[1]['id'], deleted)
+
+        lines, token = self.sync(token)
+        self.assertEqual(lines, [])
+
+    def test_bad_and_expired_tokens(self):
+        response = self.client.get(reverse('api-sync'), {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+        old = make_token(timezone.now() - datetime.timedelta(days=91))
+        self.assertEqual(self.client.get(reverse('api-sync'), {'since': old}).status_code, 410)
+
+    def test_prune_tombstones(self):
+        self.appointments[2].delete()
+        Tombstone.objects.update(deleted_at=timezone.now() - datetime.timedelta(days=91))
+        self.hospital.delete()
+        call_command('prune_tombstones', stdout=open(os.devnull, 'w'))
+        self.assertEqual(list(Tombstone.objects.values_list('model', flat=True)), ['hospitals'])
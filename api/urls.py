@@ -1,5 +1,6 @@
 from django.urls import path
 from . import views
+from lifeaid.ratelimit import LoginThrottle
 
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -7,10 +8,16 @@ from rest_framework_simplejwt.views import (
 )
 
 urlpatterns = [
-    path('users/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    # Password checks are slow: limited like the login pages
+    path('users/token/', TokenObtainPairView.as_view(throttle_classes=[LoginThrottle]), name='token_obtain_pair'),
     path('users/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
     path('', views.getRoutes),
-    path('hospital/', views.getHospitals),
-    path('hospital/<int:pk>/', views.getHospitalProfile),
+    path('hospital/', views.getHospitals, name='api-hospitals'),
+    path('hospital/<int:pk>/', views.getHospitalProfile, name='api-hospital'),
+    path('doctors/', views.getDoctors, name='api-doctors'),
+    path('doctors/<int:pk>/availability/', views.getDoctorAvailability, name='api-doctor-availability'),
+    path('departments/', views.getDepartments, name='api-departments'),
+    path('batch/', views.postBatch, name='api-batch'),
+    path('sync/', views.getSync, name='api-sync'),
 ]
@@ -1,8 +1,26 @@
-from rest_framework.decorators import api_view, permission_classes
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.core import signing
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
-from .serializers import HospitalSerializer
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from .batch import MAX_SUB_REQUESTS, make_loaders, run_batch
+from .sync import TokenExpired, changes, ndjson, read_token
+from .serializers import DepartmentSerializer, DoctorSerializer, HOSPITAL_FIELDS, HospitalSerializer, RowSerializer
 from hospital.models import Hospital_Information, Patient, User 
+from hospital_admin.models import hospital_department, specialization
+from lifeaid.refcache import reference_cache
+from doctor.availability import open_dates
 from doctor.models import Doctor_Information
 
 @api_view(['GET'])
@@ -10,23 +28,90 @@ def getRoutes(request):
     # Specify which urls (routes) to accept
     
     routes = [
-        {'GET': '/api/hospital/'},
+        {'GET': '/api/hospital/?fields=name,address&page_size=50&cursor=...'},
         {'GET': '/api/hospital/id'},
 
+        # JWT only (Authorization: Bearer <access token>)
+        {'GET': '/api/doctors/?hospital=id&department=id&specialization=id&available_by=YYYY-MM-DD&sort=available&cursor=...'},
+        {'GET': '/api/doctors/id/availability/?days=14'},
+        {'GET': '/api/departments/?hospital=id&cursor=...'},
+        {'POST': '/api/batch/'},  # patients: several of their resources at once (api/batch.py)
+        {'GET': '/api/sync/?since=token'},  # NDJSON of what changed since the last sync (api/sync.py)
+
         # to test built-in authentication - JSON web tokens have an expiration date
         {'POST': '/api/users/token'},
         {'POST': '/api/users/token/refresh'},
     ]
     return Response(routes)
 
+class HospitalPagination(CursorPagination):
+    # Keyset pagination on the primary key: every page is one indexed range
+    # query, however deep, and rows added meanwhile don't shift later pages
+    ordering = 'hospital_id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+def requested_fields(request):
+    # ?fields=name,address,available_icu_no -> only those columns are read and
+    # returned. hospital_id is always included, the cursor is built from it.
+    value = request.query_params.get('fields')
+    if not value:
+        return HOSPITAL_FIELDS
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = sorted(set(fields) - set(HOSPITAL_FIELDS))
+    if unknown:
+        raise ValidationError({'fields': 'Unknown field(s): %s. Choose from: %s.' % (', '.join(unknown), ', '.join(HOSPITAL_FIELDS))})
+    return ['hospital_id'] + [name for name in dict.fromkeys(fields) if name != 'hospital_id']
+
+
+def versions_etag(*models):
+    # No query: the versions are bumped whenever one of the models is saved,
+    # deleted or touched (hospital/signals.py)
+    def etag(request, *args, **kwargs):
+        key = repr((request.build_absolute_uri(), reference_cache.versions(models)))
+        return hashlib.md5(key.encode()).hexdigest()
+    return etag
+
+
+def cached_page(request, name, models, build):
+    # The response data for this URL, shared between requests and processes
+    # until one of the models changes
+    key = 'api:%s:%s' % (name, hashlib.md5(request.build_absolute_uri().encode()).hexdigest())
+    return Response(reference_cache.get(key, build, models))
+
+
+def int_param(request, name):
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: 'Must be a whole number.'})
+
+
+def date_param(request, name):
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: 'Must be a date (YYYY-MM-DD).'})
+
+
 # @permission_classes([IsAuthenticated]) # set up a restricted route
 
+@gzip_page
 @api_view(['GET'])
+@condition(etag_func=versions_etag(Hospital_Information))
 def getHospitals(request):
-    hospitals = Hospital_Information.objects.all() # query the database (get python object)
-    serializer = HospitalSerializer(hospitals, many=True) # convert python object to JSON object
-    # many=True because we are serializing a list of objects
-    return Response(serializer.data)
+    fields = requested_fields(request)
+    paginator = HospitalPagination()
+    rows = paginator.paginate_queryset(Hospital_Information.objects.values(*fields), request)
+    return paginator.get_paginated_response(RowSerializer(Hospital_Information, rows, fields, request).data)
 
 
 @api_view(['GET'])
@@ -34,3 +119,125 @@ def getHospitalProfile(request, pk):
     hospitals = Hospital_Information.objects.get(hospital_id=pk)
     serializer = HospitalSerializer(hospitals, many=False) # many=False for a single object
     return Response(serializer.data)
+
+
+# Mobile client: JWT-authenticated reads instead of the HTML pages
+
+DOCTOR_MODELS = [Doctor_Information, Hospital_Information, hospital_department, specialization]
+
+
+class DoctorPagination(CursorPagination):
+    ordering = 'doctor_id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class AvailableDoctorPagination(DoctorPagination):
+    ordering = ('next_available_slot', 'doctor_id')
+
+
+class DepartmentPagination(DoctorPagination):
+    ordering = 'hospital_department_id'
+
+
+@gzip_page
+@api_view(['GET'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+@condition(etag_func=versions_etag(*DOCTOR_MODELS))
+def getDoctors(request):
+    filters = {
+        'hospital_name_id': int_param(request, 'hospital'),
+        'department_name_id': int_param(request, 'department'),
+        'specialization_id': int_param(request, 'specialization'),
+    }
+    doctors = (
+        Doctor_Information.objects
+        .filter(register_status='Accepted', **{field: value for field, value in filters.items() if value is not None})
+        .select_related('hospital_name', 'department_name', 'specialization')
+    )
+    # Only doctors with a free slot to come, when sorting or filtering on it
+    # (the cursor can't page over nulls)
+    sort_available = request.query_params.get('sort') == 'available'
+    available_by = date_param(request, 'available_by')
+    if sort_available or available_by:
+        doctors = doctors.filter(next_available_slot__gte=timezone.now())
+    if available_by:
+        end = timezone.make_aware(datetime.datetime.combine(available_by + datetime.timedelta(days=1), datetime.time.min))
+        doctors = doctors.filter(next_available_slot__lt=end)
+
+    def build():
+        paginator = AvailableDoctorPagination() if sort_available else DoctorPagination()
+        page = paginator.paginate_queryset(doctors, request)
+        return paginator.get_paginated_response(list(DoctorSerializer(page, many=True, context={'request': request}).data)).data
+
+    return cached_page(request, 'doctors', DOCTOR_MODELS, build)
+
+
+@gzip_page
+@api_view(['GET'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+@condition(etag_func=versions_etag(hospital_department))
+def getDepartments(request):
+    departments = hospital_department.objects.all()
+    hospital_id = int_param(request, 'hospital')
+    if hospital_id is not None:
+        departments = departments.filter(hospital_id=hospital_id)
+
+    def build():
+        paginator = DepartmentPagination()
+        page = paginator.paginate_queryset(departments, request)
+        return paginator.get_paginated_response(list(DepartmentSerializer(page, many=True, context={'request': request}).data)).data
+
+    return cached_page(request, 'departments', [hospital_department], build)
+
+
+@api_view(['GET'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+def getDoctorAvailability(request, pk):
+    # Not cached: appointments are booked all day
+    doctor = get_object_or_404(Doctor_Information, doctor_id=pk, register_status='Accepted')
+    days = int_param(request, 'days')
+    if days is not None and not 1 <= days <= settings.APPOINTMENT_BOOKING_DAYS:
+        raise ValidationError({'days': 'Must be between 1 and %d.' % settings.APPOINTMENT_BOOKING_DAYS})
+    dates = [{'date': date, 'places_left': left} for date, left in open_dates(doctor, days)]
+    return Response({'doctor_id': doctor.doctor_id, 'dates': dates})
+
+
+@api_view(['POST'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+def postBatch(request):
+    if not request.user.is_patient:
+        raise PermissionDenied('Only patients can use the batch endpoint.')
+    entries = request.data.get('requests') if isinstance(request.data, dict) else None
+    if not isinstance(entries, list) or not 1 <= len(entries) <= MAX_SUB_REQUESTS:
+        raise ValidationError({'requests': 'Send a list of 1 to %d requests.' % MAX_SUB_REQUESTS})
+
+    patient = request.user.patient
+    loaders = make_loaders(request)
+    loaders['patients'].prime(patient)
+    responses = run_batch(patient, entries, loaders)
+    included = {name: loader.resolve() for name, loader in loaders.items()}
+    return Response({'responses': responses, 'included': included})
+
+
+@gzip_page
+@api_view(['GET'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+def getSync(request):
+    since = None
+    token = request.query_params.get('since')
+    if token:
+        try:
+            since = read_token(token)
+        except signing.BadSignature:
+            raise ValidationError({'since': 'Not a sync token.'})
+        except TokenExpired:
+            return Response({'detail': 'The sync token has expired, sync again without it.'}, status=410)
+    return StreamingHttpResponse(ndjson(changes(request.user, since, request)), content_type='application/x-ndjson')
+
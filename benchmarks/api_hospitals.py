@@ -0,0 +1,104 @@
+"""
+Rows/second of GET /api/hospital/: the old endpoint (every row through
+HospitalSerializer in one response) against the paginated one (values() rows,
+walked page by page along the cursor), with all fields and with a sparse
+fieldset. Also prints the size of the first response, plain and gzipped.
+
+Runs on a throwaway in-memory SQLite database holding only the hospital
+table, with a local-memory cache.
+
+    python benchmarks/api_hospitals.py [--hospitals 5000] [--runs 5]
+"""
+
+import argparse
+import gzip
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lifeaid.settings')
+os.environ['DATABASE_URL'] = 'sqlite://:memory:'
+os.environ['CACHE_URL'] = 'locmemcache://'
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from rest_framework.decorators import api_view  # noqa: E402
+from rest_framework.response import Response  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from api.serializers import HospitalSerializer  # noqa: E402
+from api.views import getHospitals  # noqa: E402
+from hospital.models import Hospital_Information  # noqa: E402
+
+
+@api_view(['GET'])
+def old_getHospitals(request):
+    # The endpoint as it was before pagination
+    return Response(HospitalSerializer(Hospital_Information.objects.all(), many=True, context={'request': request}).data)
+
+
+def create_hospitals(count):
+    with connection.schema_editor() as editor:
+        editor.create_model(Hospital_Information)
+    Hospital_Information.objects.bulk_create(
+        Hospital_Information(
+            name='Hospital %d' % i, address='House %d, Road 5, Dhanmondi, Dhaka' % i, hospital_type='private',
+            description='General and emergency care. ' * 10, email='info%d@example.com' % i, phone_number=1711000000 + i,
+            general_bed_no=200, available_icu_no=i % 30, regular_cabin_no=40, emergency_cabin_no=10, vip_cabin_no=5,
+        )
+        for i in range(count)
+    )
+
+
+def walk(view, url):
+    # GET url and follow "next" links; returns (rows, first response)
+    factory = APIRequestFactory()
+    rows, first = 0, None
+    while url:
+        response = view(factory.get(url))
+        response.render()
+        first = first or response
+        data = response.data
+        if isinstance(data, list):
+            return len(data), first
+        rows += len(data['results'])
+        url = data['next']
+    return rows, first
+
+
+def measure(label, view, url, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        rows, first = walk(view, url)
+        times.append(time.perf_counter() - start)
+    seconds = statistics.median(times)
+    size = len(first.content)
+    print(f'{label:38} {rows / seconds:>10.0f} rows/s {size / 1024:>9.1f}KB {len(gzip.compress(first.content)) / 1024:>8.1f}KB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hospitals', type=int, default=5000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    create_hospitals(args.hospitals)
+
+    print(f'{"endpoint":38} {"throughput":>17} {"1st page":>11} {"gzipped":>10}')
+    measure('old: all rows, ModelSerializer', old_getHospitals, '/api/hospital/', args.runs)
+    measure('new: all fields, page_size=50', getHospitals, '/api/hospital/', args.runs)
+    measure('new: all fields, page_size=500', getHospitals, '/api/hospital/?page_size=500', args.runs)
+    measure('new: 3 fields, page_size=500', getHospitals, '/api/hospital/?page_size=500&fields=name,address,available_icu_no', args.runs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Render time of the pages that include the cached navbar and sidebar
+fragments, with the fragment cache off (DummyCache) and warm (LocMemCache).
+Prints the mean time per render for each page and the saving.
+
+No database is needed; the pages are rendered with unsaved objects.
+
+    python benchmarks/fragment_render.py [--renders 500]
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lifeaid.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.template.loader import render_to_string  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from doctor.models import Doctor_Information  # noqa: E402
+from hospital.models import Patient, User  # noqa: E402
+from hospital_admin.models import Admin_Information, specialization  # noqa: E402
+
+
+def pages():
+    doctor_user = User(pk=1, username='doctor', is_doctor=True)
+    doctor = Doctor_Information(
+        doctor_id=1, user=doctor_user, name='Rahim', phone_number='1711000000',
+        specialization=specialization(specialization_id=1, specialization_name='Cardiology'),
+    )
+    patient_user = User(pk=2, username='patient', is_patient=True)
+    patient = Patient(patient_id=1, user=patient_user, name='Karim', address='Dhaka', phone_number='1711000001')
+    admin_user = User(pk=3, username='admin', is_hospital_admin=True)
+    admin = Admin_Information(admin_id=1, user=admin_user, name='Anika')
+
+    return [
+        ('doctor-navbar + doctor-sidebar', 'doctor-profile-settings.html', {'user': doctor_user, 'doctor': doctor}),
+        ('patient_navbar + patient-sidebar', 'profile-settings.html', {'user': patient_user, 'patient': patient}),
+        ('admin navbar + sidebar', 'hospital_admin/hospital-list.html', {'user': admin_user, 'admin': admin}),
+    ]
+
+
+def mean_render_ms(template, context, renders):
+    render_to_string(template, context)  # warm the template loader (and the fragments)
+    start = time.perf_counter()
+    for _ in range(renders):
+        render_to_string(template, context)
+    return (time.perf_counter() - start) / renders * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--renders', type=int, default=500)
+    args = parser.parse_args()
+
+    off = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+    on = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+    print(f'{"fragments":34} {"page":34} {"uncached":>10} {"cached":>10} {"saving":>8}')
+    for label, template, context in pages():
+        with override_settings(CACHES=off):
+            before = mean_render_ms(template, context, args.renders)
+        with override_settings(CACHES=on):
+            after = mean_render_ms(template, context, args.renders)
+        print(f'{label:34} {template:34} {before:8.3f}ms {after:8.3f}ms {1 - after / before:7.0%}')
+
+
+if __name__ == '__main__':
+    main()
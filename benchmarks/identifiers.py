@@ -0,0 +1,100 @@
+"""
+Identifiers/second from hospital/identifiers.py: one at a time, in blocks
+(next_identifiers), and from several threads at once, next to the random
+codes they replaced. Also counts how many of that many random codes repeat.
+
+Runs on a throwaway SQLite file (threads need a shared database) with the
+lifeaid SQLite profile, holding only the sequence table.
+
+    python benchmarks/identifiers.py [--count 5000] [--threads 8] [--block 100]
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+DB_FD, DB_PATH = tempfile.mkstemp(suffix='.sqlite3')
+os.close(DB_FD)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lifeaid.settings')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DB_PATH
+os.environ['CACHE_URL'] = 'locmemcache://'
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+from hospital.identifiers import next_identifier, next_identifiers  # noqa: E402
+from hospital.models import IdentifierSequence  # noqa: E402
+
+
+def old_invoice():
+    # sslcommerz/views.py before: '#INV-' + 4 random digits
+    return '#INV-' + ''.join(random.choices(string.digits, k=4))
+
+
+def old_transaction():
+    return 'SSLCZ_TEST_' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+
+
+def rate(label, count, allocate):
+    start = time.perf_counter()
+    made = allocate()
+    seconds = time.perf_counter() - start
+    repeats = len(made) - len(set(made))
+    print(f'{label:36} {count / seconds:>12.0f} ids/s {repeats:>8} repeated')
+
+
+def threaded(count, threads):
+    made = []
+
+    def worker():
+        try:
+            made.extend(next_identifier('invoice') for _ in range(count // threads))
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return made
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--block', type=int, default=100)
+    args = parser.parse_args()
+
+    try:
+        with connection.schema_editor() as editor:
+            editor.create_model(IdentifierSequence)
+
+        count = args.count
+        print(f'{"allocator":36} {"throughput":>18} {"repeats":>9}')
+        rate('old: random #INV-NNNN', count, lambda: [old_invoice() for _ in range(count)])
+        rate('old: random SSLCZ_TEST_XXXXXXXX', count, lambda: [old_transaction() for _ in range(count)])
+        rate('new: next_identifier', count, lambda: [next_identifier('invoice') for _ in range(count)])
+        rate(f'new: next_identifiers, blocks of {args.block}', count,
+             lambda: [ident for _ in range(count // args.block) for ident in next_identifiers('invoice', args.block)])
+        rate(f'new: next_identifier, {args.threads} threads', count, lambda: threaded(count, args.threads))
+    finally:
+        connection.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(DB_PATH + suffix):
+                os.remove(DB_PATH + suffix)
+
+
+if __name__ == '__main__':
+    main()
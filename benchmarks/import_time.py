@@ -0,0 +1,89 @@
+"""
+Cold-start cost of a worker: wall time of `manage.py check` and of importing
+the WSGI app (settings, apps, URLconf and every view module), plus the
+slowest imports from `python -X importtime`. Exits non-zero if either time
+is over its target, so it can run in CI.
+
+Runs against the environment the site uses (.env or exported variables).
+Template warm-up is turned off so only imports are measured.
+
+    python benchmarks/import_time.py [--runs 5] [--top 15]
+        [--check-target-ms 1200] [--wsgi-target-ms 1200]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+LOAD_WSGI_APP = (
+    'from django.core.servers.basehttp import get_internal_wsgi_application; '
+    'get_internal_wsgi_application(); '
+    'import django.urls; django.urls.get_resolver().url_patterns'
+)
+
+
+def environment():
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'lifeaid.settings')
+    env['TEMPLATE_WARMUP'] = 'off'
+    return env
+
+
+def wall_ms(args, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, cwd=BASE_DIR, env=environment(), check=True, capture_output=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def slowest_imports(top):
+    # Only top-level entries: each one's cumulative time includes what it pulled in
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import django; django.setup(); ' + LOAD_WSGI_APP],
+        cwd=BASE_DIR, env=environment(), check=True, capture_output=True, text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--check-target-ms', type=float, default=1200)
+    parser.add_argument('--wsgi-target-ms', type=float, default=1200)
+    args = parser.parse_args()
+
+    baseline = wall_ms([sys.executable, '-c', 'pass'], args.runs)
+    check = wall_ms([sys.executable, 'manage.py', 'check'], args.runs)
+    wsgi = wall_ms([sys.executable, '-c', 'import django; django.setup(); ' + LOAD_WSGI_APP], args.runs)
+
+    print(f'python startup      {baseline:8.0f}ms')
+    print(f'manage.py check     {check:8.0f}ms  (target {args.check_target_ms:.0f}ms)')
+    print(f'WSGI app + URLconf  {wsgi:8.0f}ms  (target {args.wsgi_target_ms:.0f}ms)')
+    print()
+    print('Slowest top-level imports (cumulative):')
+    for ms, name in slowest_imports(args.top):
+        print(f'  {ms:8.1f}ms  {name}')
+
+    if check > args.check_target_ms or wsgi > args.wsgi_target_ms:
+        sys.exit('Cold start is over target')
+
+
+if __name__ == '__main__':
+    main()
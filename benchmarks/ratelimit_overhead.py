@@ -0,0 +1,80 @@
+"""
+Cost of the token-bucket rate limiter per request: a trivial view called
+through RequestFactory with and without @ratelimit, on the local-memory
+cache, the file cache and (if CACHE_URL is set) the configured cache.
+Each request checks two buckets, the client IP and the username.
+
+No database is needed.
+
+    python benchmarks/ratelimit_overhead.py [--requests 20000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lifeaid.settings')
+CONFIGURED_CACHE = os.environ.get('CACHE_URL')
+
+import django  # noqa: E402
+
+django.setup()
+
+import environ  # noqa: E402
+from django.contrib.auth.models import AnonymousUser  # noqa: E402
+from django.core.cache import caches  # noqa: E402
+from django.http import HttpResponse  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from lifeaid.ratelimit import ratelimit  # noqa: E402
+
+
+def view(request):
+    return HttpResponse('ok')
+
+
+def mean_us(handler, requests):
+    factory = RequestFactory()
+    request = factory.post('/login/', {'username': 'karim', 'password': 'secret'})
+    request.user = AnonymousUser()
+    request.POST  # parse once, like a view that reads the form anyway
+    handler(request)
+    start = time.perf_counter()
+    for _ in range(requests):
+        handler(request)
+    return (time.perf_counter() - start) / requests * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    backends = [
+        ('locmem', {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}),
+        ('filecache', {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp()}),
+    ]
+    if CONFIGURED_CACHE:
+        backends.append(('CACHE_URL', environ.Env.cache_url_config(CONFIGURED_CACHE)))
+
+    # Never refused, and the buckets never fill up again: get_many + incr
+    # per bucket, the usual path
+    limits = {'login': '%d/d' % (args.requests * 10), 'api': '1/s', 'chat': '1/s'}
+    limited = ratelimit('login')(view)
+
+    print(f'{"cache":10} {"plain":>10} {"limited":>10} {"overhead":>10}')
+    for label, config in backends:
+        with override_settings(CACHES={'default': config}, RATE_LIMITS=limits, RATE_LIMIT_ENABLED=True):
+            caches['default'].clear()
+            plain = mean_us(view, args.requests)
+            with_limit = mean_us(limited, args.requests)
+        print(f'{label:10} {plain:8.1f}us {with_limit:8.1f}us {with_limit - plain:8.1f}us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Concurrent write throughput of SQLite, stock settings vs the lifeaid profile.
+
+Each worker thread opens its own connection and runs short transactions the
+way the site does (read a row, then write one) - like a chat send or a
+session save. Prints writes/second and how many transactions failed with
+"database is locked".
+
+    python benchmarks/sqlite_writes.py [--threads 8] [--seconds 5]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+
+# Same values as SQLITE_PRAGMAS in lifeaid/settings.py
+PROFILE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,
+    'temp_store': 'memory',
+}
+
+
+def connect(path, pragmas):
+    # isolation_level=None: transactions are started explicitly, like Django does
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+    for name, value in pragmas.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+def run(label, pragmas, begin, threads, seconds):
+    fd, path = tempfile.mkstemp(suffix='.sqlite3')
+    os.close(fd)
+    setup = connect(path, pragmas)
+    setup.execute('CREATE TABLE message (id INTEGER PRIMARY KEY, room INTEGER, body TEXT, created REAL)')
+    setup.execute('CREATE INDEX message_room ON message (room)')
+    setup.close()
+
+    writes = [0] * threads
+    locked = [0] * threads
+    stop = time.monotonic() + seconds
+
+    def worker(n):
+        conn = connect(path, pragmas)
+        while time.monotonic() < stop:
+            try:
+                conn.execute(begin)
+                conn.execute('SELECT count(*) FROM message WHERE room = ?', (n,)).fetchone()
+                conn.execute('INSERT INTO message (room, body, created) VALUES (?, ?, ?)',
+                             (n, 'hello' * 20, time.time()))
+                conn.execute('COMMIT')
+                writes[n] += 1
+            except sqlite3.OperationalError:
+                locked[n] += 1
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+        conn.close()
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.monotonic()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    print(f'{label:<10} {sum(writes) / elapsed:>10.0f} writes/s {sum(locked):>8} locked')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args(argv)
+
+    print(f'{args.threads} threads, {args.seconds:g}s each')
+    run('before', {}, 'BEGIN', args.threads, args.seconds)
+    run('after', PROFILE_PRAGMAS, 'BEGIN IMMEDIATE', args.threads, args.seconds)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
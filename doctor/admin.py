@@ -3,7 +3,7 @@ from django.contrib import admin
 # Register your models here.
 # # we are in same file path --> .models
 
-from .models import Doctor_Information, Appointment, Report, Prescription, Education, Experience, Specimen, Test,Prescription_medicine,Prescription_test,testCart,testOrder, Doctor_review
+from .models import Doctor_Information, Appointment, Report, Prescription, Education, Experience, Specimen, Test,Prescription_medicine,Prescription_test,testCart,testOrder, Doctor_review, DoctorSchedule, ScheduleException
 
 
 admin.site.register(Doctor_Information)
@@ -19,3 +19,5 @@ admin.site.register(Prescription_test)
 admin.site.register(testCart)
 admin.site.register(testOrder)
 admin.site.register(Doctor_review)
+admin.site.register(DoctorSchedule)
+admin.site.register(ScheduleException)
@@ -0,0 +1,50 @@
+"""
+Dates a doctor can still be booked on, for the mobile API. For doctors who
+have set their hours these are the dates with free slots (doctor/slots.py).
+The others only have visiting_hour as free text, so a day counts as open
+while it has fewer than DOCTOR_DAILY_APPOINTMENTS pending or confirmed
+appointments.
+"""
+
+import datetime
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from . import slots
+from .models import Appointment
+
+
+BOOKED_STATUSES = ('pending', 'confirmed')
+
+
+def open_dates(doctor, days=None, today=None):
+    """
+    Return [(date, places left)] for the open days among the next `days`
+    (APPOINTMENT_BOOKING_DAYS by default), starting today. One query, on
+    the (doctor, date, appointment_status) index, besides loading the
+    doctor's schedule when it isn't cached.
+    """
+    today = today or timezone.localdate()
+    days = days or settings.APPOINTMENT_BOOKING_DAYS
+    last = today + datetime.timedelta(days=days - 1)
+    if slots.has_schedule(doctor):
+        return [(date, len(times)) for date, times in slots.free_slots(doctor, today, last).items()]
+
+    booked = dict(
+        Appointment.objects
+        .filter(doctor=doctor, date__range=(today, last), appointment_status__in=BOOKED_STATUSES)
+        .values_list('date')
+        .annotate(Count('id'))
+        .order_by()
+    )
+
+    capacity = settings.DOCTOR_DAILY_APPOINTMENTS
+    dates = []
+    for offset in range(days):
+        date = today + datetime.timedelta(days=offset)
+        left = capacity - booked.get(date, 0)
+        if left > 0:
+            dates.append((date, left))
+    return dates
@@ -7,7 +7,7 @@ from django.core.exceptions import ValidationError
 import re
 
 from hospital.models import User  # Ensure correct import based on your project structure
-from .models import Doctor_Information  # Ensure correct import based on your project structure
+from .models import Doctor_Information, DoctorSchedule  # Ensure correct import based on your project structure
 
 
 class DoctorUserCreationForm(UserCreationForm):
@@ -101,3 +101,36 @@ class DoctorForm(ModelForm):
 
         for name, field in self.fields.items():
             field.widget.attrs.update({'class': 'form-control'})
+
+
+class DoctorScheduleForm(ModelForm):
+    """
+    Form for adding weekly hours on the schedule timings page.
+    The doctor is set by the view.
+    """
+
+    class Meta:
+        model = DoctorSchedule
+        fields = ['weekday', 'start_time', 'end_time', 'slot_minutes']
+        widgets = {
+            'start_time': forms.TimeInput(attrs={'type': 'time'}),
+            'end_time': forms.TimeInput(attrs={'type': 'time'}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super(DoctorScheduleForm, self).__init__(*args, **kwargs)
+
+        for name, field in self.fields.items():
+            field.widget.attrs.update({'class': 'form-control'})
+
+    def clean(self):
+        """
+        The hours must fit at least one slot.
+        """
+        cleaned_data = super().clean()
+        start, end, slot_minutes = (cleaned_data.get(name) for name in ('start_time', 'end_time', 'slot_minutes'))
+        if start and end and slot_minutes:
+            length = (end.hour * 60 + end.minute) - (start.hour * 60 + start.minute)
+            if length < slot_minutes:
+                raise ValidationError('The end time must be at least one slot after the start time.')
+        return cleaned_data
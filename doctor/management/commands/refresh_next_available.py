@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from doctor.slots import refresh_stale
+
+
+class Command(BaseCommand):
+    help = "Recompute doctors' next free slot once it has passed (run it from cron every few minutes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute every doctor with a schedule')
+
+    def handle(self, *args, **options):
+        checked, changed = refresh_stale(everyone=options['all'])
+        self.stdout.write(f'Checked {checked} doctor(s), {changed} changed')
@@ -1,12 +1,16 @@
-import datetime
-from django.core.cache import cache
-from django.conf import settings
-from django.utils.deprecation import MiddlewareMixin
-class ActiveUserMiddleware(MiddlewareMixin):
-
-    def process_request(self, request):
-        current_user = request.user
+from hospital import presence
+
+
+class ActiveUserMiddleware:
+    # Records request.user as seen (hospital/presence.py); after AuthenticationMiddleware
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
         if request.user.is_authenticated:
-            now = datetime.datetime.now()
-            cache.set('seen_%s' % (current_user.username), now, 
-                           settings.USER_LASTSEEN_TIMEOUT)
\ No newline at end of file
+            presence.record_seen(request.user.pk)
+        response = self.get_response(request)
+        if presence.flush_due():
+            presence.flush()
+        return response
@@ -9,10 +9,15 @@ class Migration(migrations.Migration):
         ('doctor', '0008_doctor_information_nid_and_more'),
     ]
 
+    # 0009_prescription_extra_information_and_more adds the same column on the
+    # other branch (merged in 0012), so on a new database this one only
+    # records the field; databases that ran both already have the column.
     operations = [
-        migrations.AddField(
-            model_name='prescription',
-            name='extra_information',
-            field=models.TextField(blank=True, null=True),
-        ),
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AddField(
+                model_name='prescription',
+                name='extra_information',
+                field=models.TextField(blank=True, null=True),
+            ),
+        ]),
     ]
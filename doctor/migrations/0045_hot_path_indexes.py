@@ -0,0 +1,45 @@
+# Generated by Django 4.1.13 on 2026-10-19 15:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0044_appointment_message'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'date', 'appointment_status'], name='appointment_doc_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['transaction_id'], name='appointment_transaction_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor_information',
+            index=models.Index(fields=['register_status'], name='doctor_register_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['patient', '-prescription_id'], name='prescription_patient_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['doctor', 'patient'], name='prescription_doc_patient_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['patient', 'doctor'], name='report_patient_doctor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testcart',
+            index=models.Index(fields=['user', 'purchased'], name='testcart_user_purchased_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testorder',
+            index=models.Index(fields=['trans_ID'], name='testorder_trans_id_idx'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Rewrites the free-text date columns to ISO dates so that the following
+# migration can turn them into DateFields. Values that can't be parsed are
+# cleared rather than failing the migration.
+
+import datetime
+
+from dateutil import parser as dateutil_parser
+from django.db import migrations
+
+
+BATCH_SIZE = 500
+
+# Written out here rather than imported from hospital/utils.py, so this
+# migration can't change with the app
+LEGACY_DATE_FORMATS = (
+    '%Y-%m-%d',
+    '%d/%m/%Y',
+    '%d-%m-%Y',
+    '%Y/%m/%d',
+    '%d.%m.%Y',
+    '%m/%d/%Y',
+    '%B %d, %Y',
+    '%b. %d, %Y',
+    '%b %d, %Y',
+)
+
+
+def parse_legacy_date(value):
+    value = (value or '').strip()
+    if not value:
+        return None
+
+    for date_format in LEGACY_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+
+    try:
+        return dateutil_parser.parse(value, dayfirst=True).date()
+    except (ValueError, OverflowError):
+        return None
+
+
+DATE_COLUMNS = {
+    'Report': ['collection_date', 'receiving_date', 'delivery_date'],
+    'Specimen': ['collection_date', 'receiving_date'],
+    'Prescription': ['create_date'],
+}
+
+
+def normalize_dates(apps, schema_editor):
+    for model_name, fields in DATE_COLUMNS.items():
+        model = apps.get_model('doctor', model_name)
+        rows = model.objects.only('pk', *fields).order_by('pk')
+        
+        changed = []
+        for row in rows.iterator(chunk_size=BATCH_SIZE):
+            dirty = False
+            for field in fields:
+                value = getattr(row, field)
+                parsed = parse_legacy_date(value)
+                normalized = parsed.isoformat() if parsed else None
+                if value != normalized:
+                    setattr(row, field, normalized)
+                    dirty = True
+            if dirty:
+                changed.append(row)
+            
+            if len(changed) >= BATCH_SIZE:
+                model.objects.bulk_update(changed, fields)
+                changed = []
+        
+        if changed:
+            model.objects.bulk_update(changed, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0045_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_dates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.1.13 on 2026-10-19 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0046_normalize_legacy_dates'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='prescription',
+            name='create_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='report',
+            name='collection_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='report',
+            name='delivery_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='report',
+            name='receiving_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='specimen',
+            name='collection_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='specimen',
+            name='receiving_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-19 15:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0049_decimal_test_prices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor_information',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
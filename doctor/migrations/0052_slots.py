@@ -0,0 +1,65 @@
+# Generated by Django 4.1.13 on 2026-10-19 16:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0051_sync_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorSchedule',
+            fields=[
+                ('schedule_id', models.AutoField(primary_key=True, serialize=False)),
+                ('weekday', models.IntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('slot_minutes', models.IntegerField(choices=[(15, '15 mins'), (30, '30 mins'), (45, '45 mins'), (60, '1 Hour')], default=30)),
+            ],
+            options={
+                'ordering': ['weekday', 'start_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScheduleException',
+            fields=[
+                ('exception_id', models.AutoField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField(blank=True, null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('available', models.BooleanField(default=False)),
+                ('slot_minutes', models.IntegerField(choices=[(15, '15 mins'), (30, '30 mins'), (45, '45 mins'), (60, '1 Hour')], default=30)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='slot',
+            field=models.TimeField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('slot__isnull', False), models.Q(('appointment_status', 'cancelled'), _negated=True)), fields=('doctor', 'date', 'slot'), name='appointment_unique_slot'),
+        ),
+        migrations.AddField(
+            model_name='scheduleexception',
+            name='doctor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_exceptions', to='doctor.doctor_information'),
+        ),
+        migrations.AddField(
+            model_name='doctorschedule',
+            name='doctor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedules', to='doctor.doctor_information'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduleexception',
+            index=models.Index(fields=['doctor', 'date'], name='schedule_exception_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctorschedule',
+            index=models.Index(fields=['doctor', 'weekday'], name='schedule_doctor_weekday_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.1.13 on 2026-10-19 16:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0052_slots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor_information',
+            name='next_available_slot',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='doctor_information',
+            index=models.Index(fields=['next_available_slot'], name='doctor_next_slot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor_information',
+            index=models.Index(fields=['department_name', 'next_available_slot'], name='doctor_dept_next_slot_idx'),
+        ),
+    ]
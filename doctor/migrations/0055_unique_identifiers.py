@@ -0,0 +1,33 @@
+# Generated by Django 4.1.13 on 2026-10-19 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0054_dedupe_identifiers'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appointment_transaction_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='testorder',
+            name='testorder_trans_id_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(fields=('transaction_id',), name='appointment_transaction_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(fields=('serial_number',), name='appointment_serial_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='testorder',
+            constraint=models.UniqueConstraint(fields=('trans_ID',), name='testorder_trans_id_unique'),
+        ),
+    ]
@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+from decimal import Decimal
 
 import uuid
 
@@ -71,6 +74,23 @@ class Doctor_Information(models.Model):
     # ForeignKey --> one to one relationship with Hospital_Information model.
     hospital_name = models.ForeignKey(Hospital_Information, on_delete=models.SET_NULL, null=True, blank=True)
 
+    # Also bumped when its education, experience or reviews change (doctor/signals.py)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Earliest free slot (doctor/slots.py), kept up to date by the receivers
+    # in hospital/signals.py and `manage.py refresh_next_available`. None
+    # without a schedule or with nothing free in APPOINTMENT_BOOKING_DAYS.
+    next_available_slot = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # hospital_home, search and admin lists filter on register_status
+            models.Index(fields=['register_status'], name='doctor_register_status_idx'),
+            # Listings sorted or filtered by availability, overall and per department
+            models.Index(fields=['next_available_slot'], name='doctor_next_slot_idx'),
+            models.Index(fields=['department_name', 'next_available_slot'], name='doctor_dept_next_slot_idx'),
+        ]
+
     def __str__(self):
         return str(self.user.username)
 
@@ -90,6 +110,9 @@ class Appointment(models.Model):
     id = models.AutoField(primary_key=True)
     date = models.DateField(null=True, blank=True)
     time = models.CharField(max_length=200, null=True, blank=True)
+    # Start of the schedule slot booked (doctor/slots.py). Empty for doctors
+    # without a schedule, who are still booked by free-text time.
+    slot = models.TimeField(null=True, blank=True)
     doctor = models.ForeignKey(Doctor_Information, on_delete=models.CASCADE, null=True, blank=True)
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, null=True, blank=True)
     appointment_type = models.CharField(max_length=200, choices=APPOINTMENT_TYPE)
@@ -98,11 +121,88 @@ class Appointment(models.Model):
     payment_status = models.CharField(max_length=200, null=True, blank=True, default='pending')
     transaction_id = models.CharField(max_length=255, null=True, blank=True)
     message = models.CharField(max_length=255, null=True, blank=True)
-    
+    # Delta sync (api/sync.py): rows changed since a client's last sync
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # doctor dashboard / appointment lists --> filter(doctor=..., date=..., appointment_status=...)
+            models.Index(fields=['doctor', 'date', 'appointment_status'], name='appointment_doc_date_idx'),
+        ]
+        constraints = [
+            # From hospital/identifiers.py. The unique index also serves
+            # ssl_payment_success --> Appointment.objects.get(transaction_id=...)
+            models.UniqueConstraint(fields=['transaction_id'], name='appointment_transaction_unique'),
+            models.UniqueConstraint(fields=['serial_number'], name='appointment_serial_unique'),
+            # One live appointment per slot: concurrent bookings of the same
+            # slot can't both commit. Cancelling frees the slot.
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'slot'],
+                condition=models.Q(slot__isnull=False) & ~models.Q(appointment_status='cancelled'),
+                name='appointment_unique_slot',
+            ),
+        ]
 
     def __str__(self):
         return str(self.patient.username)
 
+
+class DoctorSchedule(models.Model):
+    # Weekly hours: every <weekday> from start_time to end_time, in slots of
+    # slot_minutes. A day can have several (morning and evening chambers).
+    WEEKDAYS = (
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    )
+    SLOT_MINUTES = (
+        (15, '15 mins'),
+        (30, '30 mins'),
+        (45, '45 mins'),
+        (60, '1 Hour'),
+    )
+
+    schedule_id = models.AutoField(primary_key=True)
+    doctor = models.ForeignKey(Doctor_Information, on_delete=models.CASCADE, related_name='schedules')
+    weekday = models.IntegerField(choices=WEEKDAYS)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.IntegerField(choices=SLOT_MINUTES, default=30)
+
+    class Meta:
+        ordering = ['weekday', 'start_time']
+        indexes = [
+            models.Index(fields=['doctor', 'weekday'], name='schedule_doctor_weekday_idx'),
+        ]
+
+    def __str__(self):
+        return '%s %s %s-%s' % (self.doctor, self.get_weekday_display(), self.start_time, self.end_time)
+
+
+class ScheduleException(models.Model):
+    # A change to the weekly hours on one date: a day off (available=False,
+    # no times), a blocked period (available=False with times), or extra
+    # hours (available=True with times).
+    exception_id = models.AutoField(primary_key=True)
+    doctor = models.ForeignKey(Doctor_Information, on_delete=models.CASCADE, related_name='schedule_exceptions')
+    date = models.DateField()
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    available = models.BooleanField(default=False)
+    slot_minutes = models.IntegerField(choices=DoctorSchedule.SLOT_MINUTES, default=30)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor', 'date'], name='schedule_exception_date_idx'),
+        ]
+
+    def __str__(self):
+        return '%s %s' % (self.doctor, self.date)
+
 class Education(models.Model):
     education_id = models.AutoField(primary_key=True)
     doctor = models.ForeignKey(Doctor_Information, on_delete=models.CASCADE, null=True, blank=True)
@@ -131,14 +231,21 @@ class Report(models.Model):
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, null=True, blank=True)
     specimen_id = models.CharField(max_length=200, null=True, blank=True)
     specimen_type = models.CharField(max_length=200, null=True, blank=True)
-    collection_date = models.CharField(max_length=200, null=True, blank=True)
-    receiving_date = models.CharField(max_length=200, null=True, blank=True)
+    collection_date = models.DateField(null=True, blank=True, db_index=True)
+    receiving_date = models.DateField(null=True, blank=True, db_index=True)
     test_name = models.CharField(max_length=200, null=True, blank=True)
     result = models.CharField(max_length=200, null=True, blank=True)
     unit = models.CharField(max_length=200, null=True, blank=True)
     referred_value = models.CharField(max_length=200, null=True, blank=True)
-    delivery_date = models.CharField(max_length=200, null=True, blank=True)
+    delivery_date = models.DateField(null=True, blank=True, db_index=True)
     other_information = models.CharField(max_length=200, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # api/sync.py
+
+    class Meta:
+        indexes = [
+            # patient dashboard / patient_profile --> filter(patient=...) (and doctor=...)
+            models.Index(fields=['patient', 'doctor'], name='report_patient_doctor_idx'),
+        ]
 
     def __str__(self):
         return str(self.patient.username)
@@ -147,8 +254,8 @@ class Specimen(models.Model):
     report = models.ForeignKey(Report, on_delete=models.CASCADE, null=True, blank=True)
     specimen_id = models.AutoField(primary_key=True)
     specimen_type = models.CharField(max_length=200, null=True, blank=True)
-    collection_date = models.CharField(max_length=200, null=True, blank=True)
-    receiving_date = models.CharField(max_length=200, null=True, blank=True)
+    collection_date = models.DateField(null=True, blank=True, db_index=True)
+    receiving_date = models.DateField(null=True, blank=True, db_index=True)
     
     def __str__(self):
         return str(self.report.report_id)
@@ -170,7 +277,7 @@ class Prescription(models.Model):
     prescription_id = models.AutoField(primary_key=True)
     doctor = models.ForeignKey(Doctor_Information, on_delete=models.CASCADE, null=True, blank=True)
     patient = models.ForeignKey(Patient, on_delete=models.SET_NULL, null=True, blank=True)
-    create_date = models.CharField(max_length=200, null=True, blank=True)
+    create_date = models.DateField(null=True, blank=True, db_index=True)
     medicine_name = models.CharField(max_length=200, null=True, blank=True)
     quantity = models.CharField(max_length=200, null=True, blank=True)
     days = models.CharField(max_length=200, null=True, blank=True)
@@ -180,6 +287,15 @@ class Prescription(models.Model):
     test_name = models.CharField(max_length=200, null=True, blank=True)
     test_description = models.TextField(null=True, blank=True)
     extra_information = models.TextField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # api/sync.py
+
+    class Meta:
+        indexes = [
+            # patient dashboard --> filter(patient=...).order_by('-prescription_id')
+            models.Index(fields=['patient', '-prescription_id'], name='prescription_patient_idx'),
+            # patient_profile --> filter(doctor=...).filter(patient=...)
+            models.Index(fields=['doctor', 'patient'], name='prescription_doc_patient_idx'),
+        ]
 
     def __str__(self):
         return str(self.patient.username)
@@ -203,7 +319,7 @@ class Prescription_test(models.Model):
     test_name = models.CharField(max_length=200, null=True, blank=True)
     test_description = models.TextField(null=True, blank=True)
     test_info_id = models.CharField(max_length=200, null=True, blank=True)
-    test_info_price = models.CharField(max_length=200, null=True, blank=True)
+    test_info_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     test_info_pay_status = models.CharField(max_length=200, null=True, blank=True)
     
     """
@@ -225,6 +341,11 @@ class testCart(models.Model):
     purchased = models.BooleanField(default=False)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'purchased'], name='testcart_user_purchased_idx'),
+        ]
     
     def __str__(self):
         return f'{self.item.test_info_id} X {self.item.test_name}'
@@ -234,6 +355,15 @@ class testCart(models.Model):
         
         return total
 
+class testOrderQuerySet(models.QuerySet):
+    
+    # Subtotal and item count computed in SQL, one query for a whole list of orders
+    def with_totals(self):
+        return self.annotate(
+            subtotal=Coalesce(Sum('orderitems__item__test_info_price'), Decimal('0.00')),
+            item_count=Count('orderitems'),
+        )
+
 class testOrder(models.Model):
     # id
     orderitems = models.ManyToManyField(testCart)
@@ -243,17 +373,26 @@ class testOrder(models.Model):
     payment_status = models.CharField(max_length=200, blank=True, null=True)
     trans_ID = models.CharField(max_length=200, blank=True, null=True)
 
-    # Subtotal
+    class Meta:
+        constraints = [
+            # From hospital/identifiers.py; the index also serves
+            # ssl_payment_success --> testOrder.objects.get(trans_ID=...)
+            models.UniqueConstraint(fields=['trans_ID'], name='testorder_trans_id_unique'),
+        ]
+
+    objects = testOrderQuerySet.as_manager()
+
+    # Subtotal (annotated by with_totals() or aggregated once and kept on the instance)
     def get_totals(self):
-        total = 0 
-        for order_item in self.orderitems.all():
-            total += float(order_item.get_total())
-        return total
+        if not hasattr(self, 'subtotal'):
+            self.subtotal = self.orderitems.aggregate(
+                subtotal=Coalesce(Sum('item__test_info_price'), Decimal('0.00')))['subtotal']
+        return self.subtotal
     
     # TOTAL
     def final_bill(self):
-        vat= 20.00
-        Bill = self.get_totals()+ vat
+        vat = Decimal('20.00')
+        Bill = self.get_totals() + vat
         float_Bill = format(Bill, '0.2f')
         return float_Bill
 
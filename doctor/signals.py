@@ -1,8 +1,9 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 # from django.contrib.auth.models import User
 
-from .models import Doctor_Information
+from .models import Doctor_Information, Doctor_review, Education, Experience
 from hospital.models import User
 
 
@@ -21,3 +22,15 @@ def updateUser(sender, instance, created, **kwargs):
         user.username = doctor.username
         user.email = doctor.email
         user.save()
+
+
+# The doctor profile page shows these, so they move the doctor's updated_at
+# (its ETag and Last-Modified). update() skips the Doctor_Information
+# receivers above.
+
+@receiver([post_save, post_delete], sender=Education)
+@receiver([post_save, post_delete], sender=Experience)
+@receiver([post_save, post_delete], sender=Doctor_review)
+def touchDoctor(sender, instance, **kwargs):
+    if instance.doctor_id is not None:
+        Doctor_Information.objects.filter(pk=instance.doctor_id).update(updated_at=timezone.now())
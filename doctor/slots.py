@@ -0,0 +1,212 @@
+"""
+Appointment slots: the weekly hours in DoctorSchedule, changed on single
+dates by ScheduleException, cut into slot_minutes pieces, less the slots
+already booked.
+
+A doctor's schedule is cached through the reference cache (the receivers
+in hospital/signals.py drop it when a schedule or exception is saved), so
+free_slots() for any date range costs one query: the booked slots, read
+from the appointment_unique_slot index.
+
+Doctor_Information.next_available_slot keeps each doctor's earliest free
+slot so listings can sort and filter on it; refresh_next_available()
+recomputes it whenever a booking or the schedule changes.
+
+book() doesn't lock anything. Two patients can both see a slot as free;
+the unique constraint on (doctor, date, slot) lets only one of them commit,
+and the other gets SlotUnavailable.
+"""
+
+import datetime
+from bisect import bisect_right
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from hospital.middleware import invalidate_profile
+from lifeaid.refcache import reference_cache
+from .models import Appointment, Doctor_Information, DoctorSchedule, ScheduleException
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+def minutes(time):
+    return time.hour * 60 + time.minute
+
+
+def as_time(minute):
+    return datetime.time(minute // 60, minute % 60)
+
+
+class IntervalIndex:
+    """
+    Blocked [start, end) periods of a day in minutes, merged and sorted so
+    overlaps() is a binary search.
+    """
+
+    def __init__(self, intervals):
+        self.starts, self.ends = [], []
+        for start, end in sorted(intervals):
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def overlaps(self, start, end):
+        # The last blocked period starting before `end` is the only one that can overlap
+        i = bisect_right(self.starts, end - 1) - 1
+        return i >= 0 and self.ends[i] > start
+
+
+def schedule(doctor_id):
+    """
+    (weekly, exceptions) for a doctor: weekly is {weekday: [(start, end,
+    slot minutes)]}, exceptions {date: [(start, end, available, slot
+    minutes)]}, with times in minutes and None for a whole day.
+    """
+    def load():
+        weekly = {}
+        for row in DoctorSchedule.objects.filter(doctor_id=doctor_id).order_by('weekday', 'start_time'):
+            weekly.setdefault(row.weekday, []).append((minutes(row.start_time), minutes(row.end_time), row.slot_minutes))
+        exceptions = {}
+        for row in ScheduleException.objects.filter(doctor_id=doctor_id, date__gte=timezone.localdate() - datetime.timedelta(days=1)):
+            start = minutes(row.start_time) if row.start_time else None
+            end = minutes(row.end_time) if row.end_time else None
+            exceptions.setdefault(row.date, []).append((start, end, row.available, row.slot_minutes))
+        return weekly, exceptions
+
+    return reference_cache.get('schedule:%s' % doctor_id, load, [DoctorSchedule, ScheduleException])
+
+
+def has_schedule(doctor):
+    return bool(schedule(doctor.pk)[0])
+
+
+def day_slots(weekly, exceptions, date):
+    """The slot start times (in minutes) of a date, before bookings."""
+    hours = list(weekly.get(date.weekday(), []))
+    blocked = []
+    for start, end, available, slot_minutes in exceptions.get(date, []):
+        if available and start is not None and end is not None:
+            hours.append((start, end, slot_minutes))
+        elif not available:
+            if start is None or end is None:
+                return []  # day off
+            blocked.append((start, end))
+
+    index = IntervalIndex(blocked)
+    slots = set()
+    for start, end, slot_minutes in hours:
+        for slot in range(start, end - slot_minutes + 1, slot_minutes):
+            if not index.overlaps(slot, slot + slot_minutes):
+                slots.add(slot)
+    return sorted(slots)
+
+
+def booked_slots(doctor, start, end):
+    return set(
+        Appointment.objects
+        .filter(doctor=doctor, date__range=(start, end), slot__isnull=False)
+        .exclude(appointment_status='cancelled')
+        .values_list('date', 'slot')
+    )
+
+
+def free_slots(doctor, start, end, now=None):
+    """
+    {date: [time, ...]} of the free slots from start to end (inclusive),
+    leaving out dates without any and slots that have already begun.
+    """
+    weekly, exceptions = schedule(doctor.pk)
+    if not weekly and not exceptions:
+        return OrderedDict()
+
+    now = timezone.localtime(now)
+    start = max(start, now.date())
+    booked = booked_slots(doctor, start, end)
+
+    free = OrderedDict()
+    date = start
+    while date <= end:
+        times = [as_time(slot) for slot in day_slots(weekly, exceptions, date)]
+        times = [time for time in times if (date, time) not in booked and (date > now.date() or time > now.time())]
+        if times:
+            free[date] = times
+        date += datetime.timedelta(days=1)
+    return free
+
+
+def next_free(doctor, now=None):
+    """The first free slot in the booking window as an aware datetime, or None."""
+    now = timezone.localtime(now)
+    today = now.date()
+    free = free_slots(doctor, today, today + datetime.timedelta(days=settings.APPOINTMENT_BOOKING_DAYS - 1), now)
+    for date, times in free.items():
+        return timezone.make_aware(datetime.datetime.combine(date, times[0]))
+    return None
+
+
+def refresh_next_available(doctor_id, now=None):
+    """
+    Store a doctor's next free slot. Returns True if it changed, and then
+    drops the cached doctor lists, which show it, and the doctor's cached
+    profile (hospital/middleware.py).
+    """
+    doctor = Doctor_Information(pk=doctor_id)
+    value = next_free(doctor, now)
+    # update() rather than save(): it doesn't move updated_at or fire the profile receivers
+    changed = Doctor_Information.objects.filter(pk=doctor_id).exclude(next_available_slot=value).update(next_available_slot=value)
+    if changed:
+        reference_cache.invalidate(Doctor_Information)
+        drop_profiles(Doctor_Information.objects.filter(pk=doctor_id))
+    return bool(changed)
+
+
+def drop_profiles(doctors):
+    for user_id in doctors.exclude(user_id=None).values_list('user_id', flat=True):
+        invalidate_profile(user_id)
+
+
+def refresh_stale(now=None, everyone=False):
+    """
+    Refresh the doctors whose next free slot has begun, or who had none
+    (the booking window has moved on a day since); every doctor with a
+    schedule when everyone is set. Returns (checked, changed).
+    """
+    now = now or timezone.now()
+    doctors = Doctor_Information.objects.filter(schedules__isnull=False)
+    if not everyone:
+        doctors = doctors.filter(Q(next_available_slot__isnull=True) | Q(next_available_slot__lte=now))
+    doctor_ids = list(doctors.values_list('pk', flat=True).distinct().order_by())
+    # Doctors whose schedule was removed keep no stale value either
+    unscheduled = Doctor_Information.objects.filter(schedules__isnull=True, next_available_slot__isnull=False)
+    unscheduled_ids = list(unscheduled.values_list('pk', flat=True))
+    cleared = Doctor_Information.objects.filter(pk__in=unscheduled_ids).update(next_available_slot=None)
+    if cleared:
+        reference_cache.invalidate(Doctor_Information)
+        drop_profiles(Doctor_Information.objects.filter(pk__in=unscheduled_ids))
+    changed = sum(refresh_next_available(doctor_id, now) for doctor_id in doctor_ids)
+    return len(doctor_ids), changed + cleared
+
+
+def book(doctor, patient, date, slot, **fields):
+    """
+    Create a pending appointment in a free slot, or raise SlotUnavailable if
+    it isn't one or someone else got it first.
+    """
+    if slot not in free_slots(doctor, date, date).get(date, []):
+        raise SlotUnavailable('That time is not available, please choose another.')
+    try:
+        with transaction.atomic():
+            return Appointment.objects.create(
+                doctor=doctor, patient=patient, date=date, slot=slot, time=slot.strftime('%H:%M'),
+                appointment_status='pending', **fields,
+            )
+    except IntegrityError:
+        raise SlotUnavailable('Someone has just booked that time, please choose another.')
@@ -1,3 +1,305 @@
-from django.test import TestCase
+import datetime
+import threading
+import time
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from hospital.middleware import get_profile
+from hospital.models import Hospital_Information, Patient, User
+from hospital_admin.models import hospital_department, specialization
+
+from lifeaid.testing import QueryBudgetMixin, QueryPlanMixin
+from . import slots
+from .availability import open_dates
+from .models import (Appointment, Doctor_Information, Doctor_review, DoctorSchedule, Education, Experience, Prescription,
+                     Prescription_test, Report, ScheduleException, testCart, testOrder)
 
 # Create your tests here.
+
+
+class HotQueryIndexTests(QueryPlanMixin, TestCase):
+    # hot predicates from the doctor / patient dashboards and payment callbacks
+
+    def test_doctor_appointments_by_date_and_status(self):
+        self.assertUsesIndex(Appointment.objects.filter(date='2024-01-01').filter(doctor=1).filter(appointment_status='confirmed'))
+        self.assertUsesIndex(Appointment.objects.filter(doctor=1, date='2024-01-01').filter(Q(appointment_status='pending') | Q(appointment_status='confirmed')))
+
+    def test_appointment_by_transaction_id(self):
+        self.assertUsesIndex(Appointment.objects.filter(transaction_id='SSLCZ_TEST_ABCDEFGH'))
+
+    def test_accepted_doctors(self):
+        self.assertUsesIndex(Doctor_Information.objects.filter(register_status='Accepted'))
+
+    def test_patient_prescriptions_and_reports(self):
+        self.assertUsesIndex(Prescription.objects.filter(patient=1).order_by('-prescription_id'))
+        self.assertUsesIndex(Prescription.objects.filter(doctor=1).filter(patient=1))
+        self.assertUsesIndex(Report.objects.filter(patient=1))
+        self.assertUsesIndex(Report.objects.filter(doctor=1).filter(patient=1))
+
+    def test_test_cart_and_order(self):
+        self.assertUsesIndex(testCart.objects.filter(user=1, purchased=False))
+        self.assertUsesIndex(testOrder.objects.filter(trans_ID='SSLCZ_TEST_ABCDEFGH'))
+
+    def test_doctors_by_next_available_slot(self):
+        now = timezone.now()
+        self.assertUsesIndex(Doctor_Information.objects.filter(next_available_slot__gte=now).order_by('next_available_slot'))
+        self.assertUsesIndex(Doctor_Information.objects.filter(department_name=1, next_available_slot__gte=now))
+
+    def test_booked_slots(self):
+        self.assertUsesIndex(
+            Appointment.objects.filter(doctor=1, date__range=('2024-01-01', '2024-01-31'), slot__isnull=False)
+            .exclude(appointment_status='cancelled'))
+
+
+class TestOrderTotalsTests(TestCase):
+
+    def test_totals_use_decimal_prices(self):
+        user = User.objects.create(username='patient')
+        order = testOrder.objects.create(user=user)
+        for price in ['500.00', '233.50']:
+            test = Prescription_test.objects.create(test_name='CBC', test_info_price=Decimal(price))
+            order.orderitems.add(testCart.objects.create(user=user, item=test))
+
+        order = testOrder.objects.with_totals().get(pk=order.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(order.get_totals(), Decimal('733.50'))
+            self.assertEqual(order.final_bill(), '753.50')
+
+
+class DoctorProfileQueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    def test_doctor_profile(self):
+        # Reviews are listed when the doctor looks at their own profile
+        user = User.objects.create(username='doctor', is_doctor=True)
+        hospital = Hospital_Information.objects.create(name='Popular', hospital_type='private')
+        doctor = user.profile  # created by hospital.signals
+        Doctor_Information.objects.filter(pk=doctor.pk).update(
+            name='Karim', hospital_name=hospital,
+            department_name=hospital_department.objects.create(hospital=hospital, hospital_department_name='Cardiology'),
+            specialization=specialization.objects.create(hospital=hospital, specialization_name='Cardiologist'))
+        for n in range(6):
+            Education.objects.create(doctor=doctor, degree=f'Degree {n}')
+            Experience.objects.create(doctor=doctor, designation=f'Designation {n}')
+            reviewer = Patient.objects.create(name=f'Reviewer {n}')
+            Doctor_review.objects.create(doctor=doctor, patient=reviewer, title=f'Review {n}')
+
+        self.client.force_login(user)
+        with self.assertQueryBudget('doctor-profile'):
+            response = self.client.get(reverse('doctor-profile', args=[doctor.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Reviewer 5')
+
+
+class DoctorProfileConditionalTests(TestCase):
+
+    def test_education_changes_make_a_new_etag(self):
+        user = User.objects.create(username='doctor', is_doctor=True)
+        doctor = user.profile  # created by hospital.signals
+        self.client.force_login(user)
+        url = reverse('doctor-profile', args=[doctor.pk])
+
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Education.objects.create(doctor=doctor, degree='MBBS')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+def next_monday():
+    today = timezone.localdate()
+    return today + datetime.timedelta(days=7 - today.weekday())
+
+
+class SlotTests(TestCase):
+
+    def setUp(self):
+        self.doctor = User.objects.create(username='doctor', is_doctor=True).profile
+        self.patient = User.objects.create(username='patient', is_patient=True).patient
+        self.monday = next_monday()
+        # Mondays 9:00-11:00 in half hours, Tuesdays 14:00-15:00 in hours
+        DoctorSchedule.objects.create(doctor=self.doctor, weekday=0, start_time=datetime.time(9), end_time=datetime.time(11))
+        DoctorSchedule.objects.create(doctor=self.doctor, weekday=1, start_time=datetime.time(14), end_time=datetime.time(15), slot_minutes=60)
+
+    def free(self, start, end=None):
+        return slots.free_slots(self.doctor, start, end or start)
+
+    def times(self, *hours_minutes):
+        return [datetime.time(*hm) for hm in hours_minutes]
+
+    def test_weekly_hours(self):
+        tuesday = self.monday + datetime.timedelta(days=1)
+        free = self.free(self.monday, self.monday + datetime.timedelta(days=6))
+        self.assertEqual(list(free), [self.monday, tuesday])
+        self.assertEqual(free[self.monday], self.times((9, 0), (9, 30), (10, 0), (10, 30)))
+        self.assertEqual(free[tuesday], self.times((14, 0)))
+
+    def test_exceptions(self):
+        tuesday = self.monday + datetime.timedelta(days=1)
+        wednesday = self.monday + datetime.timedelta(days=2)
+        ScheduleException.objects.create(doctor=self.doctor, date=self.monday, start_time=datetime.time(9, 15), end_time=datetime.time(10))
+        ScheduleException.objects.create(doctor=self.doctor, date=tuesday)
+        ScheduleException.objects.create(doctor=self.doctor, date=wednesday, start_time=datetime.time(18), end_time=datetime.time(19), available=True)
+
+        free = self.free(self.monday, wednesday)
+        self.assertEqual(free[self.monday], self.times((10, 0), (10, 30)))
+        self.assertNotIn(tuesday, free)
+        self.assertEqual(free[wednesday], self.times((18, 0), (18, 30)))
+
+    def test_past_slots_are_left_out(self):
+        now = timezone.make_aware(datetime.datetime.combine(self.monday, datetime.time(9, 45)))
+        free = slots.free_slots(self.doctor, self.monday - datetime.timedelta(days=7), self.monday, now=now)
+        self.assertEqual(list(free), [self.monday])
+        self.assertEqual(free[self.monday], self.times((10, 0), (10, 30)))
+
+    def test_booking_takes_the_slot(self):
+        appointment = slots.book(self.doctor, self.patient, self.monday, datetime.time(9, 30), appointment_type='checkup')
+        self.assertEqual(appointment.time, '09:30')
+        self.assertEqual(self.free(self.monday)[self.monday], self.times((9, 0), (10, 0), (10, 30)))
+
+        with self.assertRaises(slots.SlotUnavailable):
+            slots.book(self.doctor, self.patient, self.monday, datetime.time(9, 30))
+        with self.assertRaises(slots.SlotUnavailable):
+            slots.book(self.doctor, self.patient, self.monday, datetime.time(9, 15))
+
+        appointment.appointment_status = 'cancelled'
+        appointment.save()
+        slots.book(self.doctor, self.patient, self.monday, datetime.time(9, 30))
+
+    def test_open_dates_count_free_slots(self):
+        slots.book(self.doctor, self.patient, self.monday, datetime.time(9))
+        dates = dict(open_dates(self.doctor, days=7, today=self.monday))
+        self.assertEqual(dates, {self.monday: 3, self.monday + datetime.timedelta(days=1): 1})
+
+    def test_booking_page(self):
+        self.client.force_login(self.patient.user)
+        url = reverse('booking', args=[self.doctor.pk])
+        self.assertContains(self.client.get(url), '%s 09:30' % self.monday.isoformat())
+
+        response = self.client.post(url, {'appoint_slot': '%s 09:30' % self.monday.isoformat(), 'appointment_type': 'checkup', 'message': ''})
+        self.assertRedirects(response, reverse('patient-dashboard'), fetch_redirect_response=False)
+        self.assertTrue(Appointment.objects.filter(doctor=self.doctor, date=self.monday, slot=datetime.time(9, 30)).exists())
+
+        response = self.client.post(url, {'appoint_slot': '%s 09:30' % self.monday.isoformat(), 'appointment_type': 'checkup', 'message': ''})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor).count(), 1)
+
+    def test_schedule_timings_page(self):
+        self.client.force_login(self.doctor.user)
+        url = reverse('schedule-timings')
+        self.client.post(url, {'weekday': 4, 'start_time': '16:00', 'end_time': '17:00', 'slot_minutes': 15})
+        friday = self.monday + datetime.timedelta(days=4)
+        self.assertEqual(len(self.free(friday)[friday]), 4)
+
+        # Shorter than a slot
+        self.client.post(url, {'weekday': 5, 'start_time': '16:00', 'end_time': '16:10', 'slot_minutes': 15})
+        self.assertFalse(DoctorSchedule.objects.filter(weekday=5).exists())
+
+        schedule = DoctorSchedule.objects.get(weekday=4)
+        self.client.post(url, {'delete_schedule': schedule.pk})
+        self.assertNotIn(friday, self.free(friday))
+
+
+class NextAvailableSlotTests(TestCase):
+
+    def setUp(self):
+        self.doctor = User.objects.create(username='doctor', is_doctor=True).profile
+        self.patient = User.objects.create(username='patient', is_patient=True).patient
+        DoctorSchedule.objects.create(doctor=self.doctor, weekday=0, start_time=datetime.time(9), end_time=datetime.time(10))
+
+    def stored(self):
+        return Doctor_Information.objects.get(pk=self.doctor.pk).next_available_slot
+
+    def test_follows_bookings_and_schedule(self):
+        first = slots.next_free(self.doctor)
+        self.assertEqual(self.stored(), first)
+
+        first_local = timezone.localtime(first)
+        appointment = slots.book(self.doctor, self.patient, first_local.date(), first_local.time())
+        self.assertEqual(self.stored(), first + datetime.timedelta(minutes=30))
+
+        appointment.delete()
+        self.assertEqual(self.stored(), first)
+
+        DoctorSchedule.objects.filter(doctor=self.doctor).get().delete()
+        self.assertIsNone(self.stored())
+
+    def test_refresh_drops_the_cached_profile(self):
+        user = self.doctor.user
+        get_profile(user).pk  # cached
+        first = self.stored()
+        first_local = timezone.localtime(first)
+        slots.book(self.doctor, self.patient, first_local.date(), first_local.time())
+
+        profile = get_profile(user)
+        profile.name = 'Karim'
+        profile.save()
+        self.assertEqual(self.stored(), first + datetime.timedelta(minutes=30))
+
+    def test_command_refreshes_passed_slots(self):
+        first = self.stored()
+        Doctor_Information.objects.filter(pk=self.doctor.pk).update(next_available_slot=timezone.now() - datetime.timedelta(hours=1))
+        other = User.objects.create(username='other', is_doctor=True).profile
+        Doctor_Information.objects.filter(pk=other.pk).update(next_available_slot=timezone.now())  # no schedule any more
+
+        call_command('refresh_next_available', stdout=StringIO())
+        self.assertEqual(self.stored(), first)
+        self.assertIsNone(Doctor_Information.objects.get(pk=other.pk).next_available_slot)
+
+    def test_search_sorts_by_availability(self):
+        later = User.objects.create(username='later', is_doctor=True).profile
+        none = User.objects.create(username='none', is_doctor=True).profile
+        Doctor_Information.objects.filter(pk__in=[self.doctor.pk, later.pk, none.pk]).update(register_status='Accepted', name='Dr')
+        Doctor_Information.objects.filter(pk=later.pk).update(next_available_slot=self.stored() + datetime.timedelta(days=1))
+
+        self.client.force_login(self.patient.user)
+        response = self.client.get(reverse('search'), {'sort': 'available'})
+        self.assertEqual(list(response.context['doctors']), [self.doctor, later, none])
+
+        response = self.client.get(reverse('search'), {'available_by': timezone.localtime(self.stored()).date().isoformat()})
+        self.assertEqual(list(response.context['doctors']), [self.doctor])
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+
+    def test_only_one_patient_gets_a_slot(self):
+        doctor = User.objects.create(username='doctor', is_doctor=True).profile
+        DoctorSchedule.objects.create(doctor=doctor, weekday=0, start_time=datetime.time(9), end_time=datetime.time(10))
+        patients = [User.objects.create(username=f'patient{n}', is_patient=True).patient for n in range(12)]
+        monday = next_monday()
+
+        results = []
+        start = threading.Barrier(len(patients))
+
+        def book(patient):
+            start.wait()
+            try:
+                while True:
+                    try:
+                        slots.book(doctor, patient, monday, datetime.time(9, 30))
+                        results.append(True)
+                        return
+                    except slots.SlotUnavailable:
+                        results.append(False)
+                        return
+                    except OperationalError:
+                        # SQLite only has one writer, the losers are told the database is locked
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(patient,)) for patient in patients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(len(results), len(patients))
+        self.assertEqual(Appointment.objects.filter(doctor=doctor, date=monday, slot=datetime.time(9, 30)).count(), 1)
@@ -1,26 +1,26 @@
-import email
-from email import message
-from multiprocessing import context
-from turtle import title
 from django.shortcuts import render, redirect
 # from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 from hospital_admin.views import prescription_list
-from .forms import DoctorUserCreationForm, DoctorForm
+from .forms import DoctorUserCreationForm, DoctorForm, DoctorScheduleForm
+from . import slots
+from hospital.utils import filterDateRange
+from hospital import reference
+from hospital.conditional import conditional_page
+from hospital.identifiers import next_identifier
+from lifeaid.ratelimit import ratelimit
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.views.decorators.cache import cache_control
 from hospital.models import User, Patient
 from hospital_admin.models import Admin_Information,Clinical_Laboratory_Technician
-from .models import Doctor_Information, Appointment, Education, Experience, Prescription_medicine, Report,Specimen,Test, Prescription_test, Prescription, Doctor_review
+from .models import Doctor_Information, Appointment, Education, Experience, Prescription_medicine, Report,Specimen,Test, Prescription_test, Prescription, Doctor_review, DoctorSchedule
 from hospital_admin.models import Admin_Information,Clinical_Laboratory_Technician, Test_Information
 from .models import Doctor_Information, Appointment, Education, Experience, Prescription_medicine, Report,Specimen,Test, Prescription_test, Prescription
 from django.db.models import Q, Count
-from django.contrib.auth.signals import user_logged_in, user_logged_out
-from django.dispatch import receiver
-import random
-import string
+from django.conf import settings
+from django.utils import timezone
 from datetime import datetime, timedelta
 import datetime
 import re
@@ -29,29 +29,19 @@ from django.template.loader import render_to_string
 from django.http import HttpResponse
 from django.utils.html import strip_tags
 from io import BytesIO
-from urllib import response
 from django.shortcuts import render
 from django.template.loader import get_template
 from django.http import HttpResponse
-from xhtml2pdf import pisa
 from .models import Report
 from django.views.decorators.csrf import csrf_exempt
 
 
-from PIL import Image
 from django.core.files.uploadedfile import UploadedFile
 from django.shortcuts import render, redirect
 from django.contrib import messages
 
 # Create your views here.
 
-def generate_random_string():
-    N = 8
-    string_var = ""
-    string_var = ''.join(random.choices(
-        string.ascii_uppercase + string.digits, k=N))
-    return string_var
-
 @csrf_exempt
 @login_required(login_url="doctor-login")
 def doctor_change_password(request,pk):
@@ -77,8 +67,26 @@ def doctor_change_password(request,pk):
 @login_required(login_url="doctor-login")
 def schedule_timings(request):
     doctor = Doctor_Information.objects.get(user=request.user)
-    context = {'doctor': doctor}
-    
+    form = DoctorScheduleForm()
+
+    if request.method == 'POST':
+        if 'delete_schedule' in request.POST:
+            DoctorSchedule.objects.filter(doctor=doctor, schedule_id=request.POST['delete_schedule']).delete()
+            messages.success(request, 'Time slot removed')
+            return redirect('schedule-timings')
+
+        form = DoctorScheduleForm(request.POST)
+        if form.is_valid():
+            schedule = form.save(commit=False)
+            schedule.doctor = doctor
+            schedule.save()
+            messages.success(request, 'Time slot added')
+            return redirect('schedule-timings')
+        messages.error(request, 'Could not add the time slot, please check the times')
+
+    schedules = list(doctor.schedules.all())
+    days = [(number, name, [schedule for schedule in schedules if schedule.weekday == number]) for number, name in DoctorSchedule.WEEKDAYS]
+    context = {'doctor': doctor, 'form': form, 'days': days}
     return render(request, 'schedule-timings.html', context)
 
 @csrf_exempt
@@ -89,10 +97,8 @@ def patient_id(request):
 @csrf_exempt
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 def logoutDoctor(request):
-    user = User.objects.get(id=request.user.id)
-    if user.is_doctor:
-        user.login_status == "offline"
-        user.save()
+    if request.user.is_doctor:
+        # user_logged_out marks them offline (hospital/signals.py)
         logout(request)
     
     messages.success(request, 'User Logged out')
@@ -126,6 +132,7 @@ def doctor_register(request):
     return render(request, 'doctor-register.html', context)
 
 @csrf_exempt
+@ratelimit('login')
 def doctor_login(request):
     # page = 'patient_login'
     if request.method == 'GET':
@@ -164,7 +171,7 @@ def doctor_dashboard(request):
         if request.user.is_authenticated:    
             if request.user.is_doctor:
                 # doctor = Doctor_Information.objects.get(user_id=pk)
-                doctor = Doctor_Information.objects.get(user=request.user)
+                doctor = request.profile
                 # appointments = Appointment.objects.filter(doctor=doctor).filter(Q(appointment_status='pending') | Q(appointment_status='confirmed'))
                 current_date = datetime.date.today()
                 current_date_str = str(current_date)  
@@ -280,8 +287,15 @@ def reject_appointment(request, pk):
 #         end_year_array = end_year.split()       
 #         experience = zip(work_place_array, designation_array, start_year_array, end_year_array)
 
+def doctor_validators(request, pk):
+    # Bumped by education, experience and review changes too; the hospital's
+    # covers its department and specialization names
+    return Doctor_Information.objects.filter(doctor_id=pk).values_list('updated_at', 'hospital_name__updated_at').first() or ()
+
+
 @csrf_exempt
 @login_required(login_url="doctor-login")
+@conditional_page(doctor_validators)
 def doctor_profile(request, pk):
     # request.user --> get logged in user
     if request.user.is_patient:
@@ -289,12 +303,12 @@ def doctor_profile(request, pk):
     else:
         patient = None
     
-    doctor = Doctor_Information.objects.get(doctor_id=pk)
+    doctor = Doctor_Information.objects.select_related('department_name', 'specialization', 'hospital_name').get(doctor_id=pk)
     # doctor = Doctor_Information.objects.filter(doctor_id=pk).order_by('-doctor_id')
     
     educations = Education.objects.filter(doctor=doctor).order_by('-year_of_completion')
     experiences = Experience.objects.filter(doctor=doctor).order_by('-from_year','-to_year')
-    doctor_review = Doctor_review.objects.filter(doctor=doctor)
+    doctor_review = Doctor_review.objects.filter(doctor=doctor).select_related('patient')
             
     context = {'doctor': doctor, 'patient': patient, 'educations': educations, 'experiences': experiences, 'doctor_review': doctor_review}
     return render(request, 'doctor-profile.html', context)
@@ -303,7 +317,7 @@ def doctor_profile(request, pk):
 @login_required(login_url="doctor-login")
 def delete_education(request, pk):
     if request.user.is_doctor:
-        doctor = Doctor_Information.objects.get(user=request.user)
+        doctor = request.profile
         
         educations = Education.objects.get(education_id=pk)
         educations.delete()
@@ -315,7 +329,7 @@ def delete_education(request, pk):
 @login_required(login_url="doctor-login")
 def delete_experience(request, pk):
     if request.user.is_doctor:
-        doctor = Doctor_Information.objects.get(user=request.user)
+        doctor = request.profile
         
         experiences = Experience.objects.get(experience_id=pk)
         experiences.delete()
@@ -325,6 +339,8 @@ def delete_experience(request, pk):
       
 def is_valid_image(file: UploadedFile) -> bool:
     """Check if the uploaded file is a valid image."""
+    from PIL import Image  # only needed for uploads, slow to import
+
     try:
         img = Image.open(file)
         img.verify()  # Ensure the image is valid
@@ -338,7 +354,7 @@ def is_valid_image(file: UploadedFile) -> bool:
 @login_required(login_url="doctor-login")
 def doctor_profile_settings(request):
     if request.user.is_doctor:
-        doctor = Doctor_Information.objects.get(user=request.user)
+        doctor = request.profile
         old_featured_image = doctor.featured_image
 
         if request.method == 'GET':
@@ -371,7 +387,11 @@ def doctor_profile_settings(request):
             doctor.nid = request.POST.get('nid')
             doctor.visiting_hour = request.POST.get('visit_hour')
             doctor.featured_image = featured_image
-            doctor.save()
+            # Only what the form edits: the profile may be a cached copy (hospital/middleware.py)
+            doctor.save(update_fields=[
+                'name', 'phone_number', 'gender', 'dob', 'description', 'consultation_fee', 'report_fee',
+                'nid', 'visiting_hour', 'featured_image', 'updated_at',
+            ])
             
             print(f"✅ Doctor profile updated successfully for user: {request.user.username}")
 
@@ -426,24 +446,42 @@ def booking(request, pk):
     patient = request.user.patient
     doctor = Doctor_Information.objects.get(doctor_id=pk)
 
+    # Doctors who have set their hours (schedule timings) are booked by slot;
+    # the others still take a free-text date and time
+    use_slots = slots.has_schedule(doctor)
+
     if request.method == 'POST':
-        appointment = Appointment(patient=patient, doctor=doctor)
-        date = request.POST['appoint_date']
-        time = request.POST['appoint_time']
         appointment_type = request.POST['appointment_type']
         message = request.POST['message']
 
-    
-        transformed_date = datetime.datetime.strptime(date, '%m/%d/%Y').strftime('%Y-%m-%d')
-        transformed_date = str(transformed_date)
-         
-        appointment.date = transformed_date
-        appointment.time = time
-        appointment.appointment_status = 'pending'
-        appointment.serial_number = generate_random_string()
-        appointment.appointment_type = appointment_type
-        appointment.message = message
-        appointment.save()
+        if use_slots:
+            try:
+                slot = datetime.datetime.strptime(request.POST.get('appoint_slot', ''), '%Y-%m-%d %H:%M')
+                appointment = slots.book(
+                    doctor, patient, slot.date(), slot.time(),
+                    appointment_type=appointment_type, message=message, serial_number=next_identifier('appointment'),
+                )
+            except ValueError:
+                messages.error(request, 'Please choose a time')
+                return redirect('booking', pk=pk)
+            except slots.SlotUnavailable as e:
+                messages.error(request, str(e))
+                return redirect('booking', pk=pk)
+        else:
+            appointment = Appointment(patient=patient, doctor=doctor)
+            date = request.POST['appoint_date']
+            time = request.POST['appoint_time']
+
+            transformed_date = datetime.datetime.strptime(date, '%m/%d/%Y').strftime('%Y-%m-%d')
+            transformed_date = str(transformed_date)
+
+            appointment.date = transformed_date
+            appointment.time = time
+            appointment.appointment_status = 'pending'
+            appointment.serial_number = next_identifier('appointment')
+            appointment.appointment_type = appointment_type
+            appointment.message = message
+            appointment.save()
         
         if message:
             # Mailtrap
@@ -476,14 +514,19 @@ def booking(request, pk):
         messages.success(request, 'Appointment Booked')
         return redirect('patient-dashboard')
 
-    context = {'patient': patient, 'doctor': doctor}
+    free = None
+    if use_slots:
+        today = timezone.localdate()
+        free = slots.free_slots(doctor, today, today + datetime.timedelta(days=settings.APPOINTMENT_BOOKING_DAYS - 1))
+
+    context = {'patient': patient, 'doctor': doctor, 'use_slots': use_slots, 'slots': free}
     return render(request, 'booking.html', context)
 
 @csrf_exempt
 @login_required(login_url="doctor-login")
 def my_patients(request):
     if request.user.is_doctor:
-        doctor = Doctor_Information.objects.get(user=request.user)
+        doctor = request.profile
         appointments = Appointment.objects.filter(doctor=doctor).filter(appointment_status='confirmed')
         # patients = Patient.objects.all()
     else:
@@ -502,14 +545,18 @@ def my_patients(request):
 def patient_profile(request, pk):
     if request.user.is_doctor:
         # doctor = Doctor_Information.objects.get(user_id=pk)
-        doctor = Doctor_Information.objects.get(user=request.user)
+        doctor = request.profile
         patient = Patient.objects.get(patient_id=pk)
         appointments = Appointment.objects.filter(doctor=doctor).filter(patient=patient)
-        prescription = Prescription.objects.filter(doctor=doctor).filter(patient=patient)
-        report = Report.objects.filter(doctor=doctor).filter(patient=patient) 
+        prescription = Prescription.objects.filter(doctor=doctor).filter(patient=patient).order_by('-create_date')
+        report = Report.objects.filter(doctor=doctor).filter(patient=patient).order_by('-delivery_date')
+        
+        # ?date_from=&date_to= --> prescriptions written / reports delivered in that range
+        prescription, date_from, date_to = filterDateRange(request, prescription, 'create_date')
+        report, date_from, date_to = filterDateRange(request, report, 'delivery_date')
     else:
         redirect('doctor-logout')
-    context = {'doctor': doctor, 'appointments': appointments, 'patient': patient, 'prescription': prescription, 'report': report}  
+    context = {'doctor': doctor, 'appointments': appointments, 'patient': patient, 'prescription': prescription, 'report': report, 'date_from': date_from, 'date_to': date_to}  
     return render(request, 'patient-profile.html', context)
 
 
@@ -518,7 +565,7 @@ def patient_profile(request, pk):
 def create_prescription(request, pk):
     if request.user.is_doctor:
         try:
-            doctor = Doctor_Information.objects.get(user=request.user)
+            doctor = request.profile
             print("👨‍⚕️ Doctor retrieved:", doctor)
         except Doctor_Information.DoesNotExist:
             print("❌ Error: Doctor profile not found for user:", request.user)
@@ -618,7 +665,8 @@ def create_prescription(request, pk):
         
 @csrf_exempt      
 def render_to_pdf(template_src, context_dict={}):
-    
+    from xhtml2pdf import pisa  # takes ~0.5s to import; only the PDF views need it
+
     template=get_template(template_src)
     html=template.render(context_dict)
     result=BytesIO()
@@ -631,7 +679,7 @@ def render_to_pdf(template_src, context_dict={}):
 @csrf_exempt
 def report_pdf(request, pk):
  if request.user.is_patient:
-    patient = Patient.objects.get(user=request.user)
+    patient = request.profile
     report = Report.objects.get(report_id=pk)
     specimen = Specimen.objects.filter(report=report)
     test = Test.objects.filter(report=report)
@@ -682,14 +730,14 @@ def patient_search(request, pk):
 @login_required(login_url="login")
 def doctor_test_list(request):
     if request.user.is_authenticated and request.user.is_doctor:
-        doctor = Doctor_Information.objects.get(user=request.user)
-        tests = Test_Information.objects.all
+        doctor = request.profile
+        tests = reference.tests()
         context = {'doctor': doctor, 'tests': tests}
         return render(request, 'doctor-test-list.html', context)
     
     elif request.user.is_authenticated and request.user.is_patient:
-        patient = Patient.objects.get(user=request.user)
-        tests = Test_Information.objects.all
+        patient = request.profile
+        tests = reference.tests()
         context = {'patient': patient, 'tests': tests}
         return render(request, 'doctor-test-list.html', context)
         
@@ -703,7 +751,7 @@ def doctor_test_list(request):
 @login_required(login_url="login")
 def doctor_view_prescription(request, pk):
     if request.user.is_authenticated and request.user.is_doctor:
-        doctor = Doctor_Information.objects.get(user=request.user)
+        doctor = request.profile
         prescriptions = Prescription.objects.get(prescription_id=pk)
         medicines = Prescription_medicine.objects.filter(prescription=prescriptions)
         tests = Prescription_test.objects.filter(prescription=prescriptions)
@@ -714,7 +762,7 @@ def doctor_view_prescription(request, pk):
 @login_required(login_url="login")
 def doctor_view_report(request, pk):
     if request.user.is_authenticated and request.user.is_doctor:
-        doctor = Doctor_Information.objects.get(user=request.user)
+        doctor = request.profile
         report = Report.objects.get(report_id=pk)
         specimen = Specimen.objects.filter(report=report)
         test = Test.objects.filter(report=report)
@@ -726,24 +774,13 @@ def doctor_view_report(request, pk):
         return render(request, 'doctor-login.html')
 
 
-@csrf_exempt
-@receiver(user_logged_in)
-def got_online(sender, user, request, **kwargs):    
-    user.login_status = True
-    user.save()
-
-@csrf_exempt
-@receiver(user_logged_out)
-def got_offline(sender, user, request, **kwargs):   
-    user.login_status = False
-    user.save()
 
 @csrf_exempt
 @login_required(login_url="login")
 def doctor_review(request, pk):
     if request.user.is_doctor:
         # doctor = Doctor_Information.objects.get(user_id=pk)
-        doctor = Doctor_Information.objects.get(user=request.user)
+        doctor = request.profile
             
         doctor_review = Doctor_review.objects.filter(doctor=doctor)
         
@@ -752,7 +789,7 @@ def doctor_review(request, pk):
 
     if request.user.is_patient:
         doctor = Doctor_Information.objects.get(doctor_id=pk)
-        patient = Patient.objects.get(user=request.user)
+        patient = request.profile
 
         if request.method == 'POST':
             title = request.POST.get('title')
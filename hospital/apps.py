@@ -5,6 +5,7 @@ class HospitalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'hospital'
 
-    # register signals
+    # register signals, and the rate limiter's cache check
     def ready(self):
         import hospital.signals
+        import lifeaid.ratelimit
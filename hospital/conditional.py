@@ -0,0 +1,61 @@
+"""
+Conditional GET (ETag / Last-Modified, 304 Not Modified) for pages that show
+hospitals and doctors, driven by their updated_at timestamps.
+
+    @conditional_page(hospital_timestamps)
+    def hospital_profile(request, pk): ...
+
+The validators function gets the view's arguments and returns what the page
+depends on: updated_at values, plus counts where rows can be deleted. It runs
+once per request. The ETag also covers who is looking (the navbars show the
+user's profile, see fragment_version) and the templates on disk, so a deploy
+or a profile edit isn't answered with a stale 304. Last-Modified is only sent
+to anonymous visitors, whose pages don't depend on a profile. Pages with
+flash messages waiting are always rendered so the messages are shown.
+"""
+
+import datetime
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.views.decorators.http import condition
+
+from .middleware import fragment_version
+
+
+@lru_cache(maxsize=None)
+def templates_modified():
+    newest = max((path.stat().st_mtime for path in Path(settings.BASE_DIR, 'templates').rglob('*.html')), default=0)
+    return datetime.datetime.fromtimestamp(int(newest), tz=datetime.timezone.utc)
+
+
+def conditional_page(validators):
+
+    def page_validators(request, *args, **kwargs):
+        if not hasattr(request, '_page_validators'):
+            request._page_validators = tuple(validators(request, *args, **kwargs))
+        return request._page_validators
+
+    def messages_waiting(request):
+        return len(get_messages(request)) > 0
+
+    def etag(request, *args, **kwargs):
+        if messages_waiting(request):
+            return None
+        user = request.user
+        viewer = (user.pk, fragment_version(user.pk)) if user.is_authenticated else None
+        key = repr((page_validators(request, *args, **kwargs), viewer, templates_modified()))
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        if request.user.is_authenticated or messages_waiting(request):
+            return None
+        timestamps = [value for value in page_validators(request, *args, **kwargs) if isinstance(value, datetime.datetime)]
+        if not timestamps:
+            return None
+        return max(timestamps + [templates_modified()])
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
@@ -0,0 +1,64 @@
+"""
+Serial numbers, invoice numbers and payment transaction ids, numbered from a
+counter per kind (IdentifierSequence) instead of drawn at random, so two of
+them can never be the same:
+
+    Patient.objects.create(..., serial_number=next_identifier('patient'))
+
+A number is taken by incrementing the kind's row inside a transaction, which
+holds that row's write lock until the caller's transaction commits; workers
+asking at the same time queue on it and get consecutive numbers. If the
+caller's transaction rolls back, so does the counter and the number is
+handed out again, never twice.
+
+The numbers are zero-padded one digit wider than the random codes they
+replace, so they can't clash with identifiers already stored. The unique
+constraints on the columns back this up.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import IdentifierSequence
+
+
+# kind --> (prefix, digits)
+KINDS = {
+    'patient': ('#PT', 7),  # Patient.serial_number, was '#PT' + 6 random letters/digits
+    'appointment': ('', 9),  # Appointment.serial_number, was 8 random letters/digits
+    'invoice': ('#INV-', 6),  # Payment.invoice_number, was '#INV-' + 4 random digits
+    'transaction': ('SSLCZ_TEST_', 9),  # SSLCommerz tran_id, was 'SSLCZ_TEST_' + 8 random letters/digits
+    'medicine': ('#M-', 6),  # Medicine.medicine_id, was '#M-' + 4 random digits
+}
+
+
+def take_numbers(name, count=1):
+    """Reserve the next count numbers of a sequence; returns the last one."""
+    with transaction.atomic():
+        if not IdentifierSequence.objects.filter(name=name).update(last=F('last') + count):
+            # First use of this sequence. Another worker may be creating it
+            # too: the loser's insert fails on the primary key and it takes
+            # its numbers from the winner's row.
+            try:
+                with transaction.atomic():
+                    IdentifierSequence.objects.create(name=name, last=count)
+                return count
+            except IntegrityError:
+                IdentifierSequence.objects.filter(name=name).update(last=F('last') + count)
+        return IdentifierSequence.objects.filter(name=name).values_list('last', flat=True).get()
+
+
+def format_identifier(kind, number):
+    prefix, digits = KINDS[kind]
+    return prefix + str(number).zfill(digits)
+
+
+def next_identifier(kind):
+    return format_identifier(kind, take_numbers(kind))
+
+
+def next_identifiers(kind, count):
+    """count consecutive identifiers for one kind, in a single round trip."""
+    last = take_numbers(kind, count)
+    return [format_identifier(kind, number) for number in range(last - count + 1, last + 1)]
+
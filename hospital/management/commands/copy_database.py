@@ -0,0 +1,200 @@
+"""
+Copy every table of one database into another, e.g. the SQLite file into a
+freshly migrated PostgreSQL database:
+
+    DATABASE_URL=postgres://... python manage.py migrate
+    DATABASE_URL=postgres://... python manage.py copy_database sqlite:///db.sqlite3
+
+Rows are copied in primary key order, one transaction per batch. The copy is
+resumable: run it again after an interruption and each table carries on
+after the highest primary key already in the target.
+
+Tables are copied after the tables their foreign keys point to. Where keys
+form a cycle, one table's keys into the cycle (which must be nullable) are
+copied empty and filled in once every table is copied, and so are nullable
+keys into a row's own table, so no batch commits a row whose target isn't
+there yet.
+"""
+
+from contextlib import contextmanager
+
+import environ
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max, Q
+
+
+SOURCE_ALIAS = 'copy_source'
+
+SEEDED_BY_MIGRATE = ('contenttypes.ContentType', 'auth.Permission')
+
+
+def foreign_keys(model):
+    return [field for field in model._meta.concrete_fields if field.is_relation]
+
+
+def on_cycle(model, needs):
+    # needs: {model: models it points to that aren't copied yet}
+    seen = set()
+    stack = list(needs[model])
+    while stack:
+        other = stack.pop()
+        if other is model:
+            return True
+        if other not in seen:
+            seen.add(other)
+            stack.extend(needs[other])
+    return False
+
+
+def copy_order(models):
+    """
+    Order models so that tables referenced by a foreign key come first and
+    every batch can commit on its own. Returns (ordered models, {model:
+    fields to fill in after the copy}).
+    """
+    remaining = {model: {field.related_model for field in foreign_keys(model)
+                         if field.related_model is not model} for model in models}
+    deferred = {}
+    for model in models:
+        # Rows can point at rows of their own table that come later
+        own = [field for field in foreign_keys(model) if field.related_model is model and field.null]
+        if own:
+            deferred[model] = own
+
+    ordered = []
+    while remaining:
+        needs = {model: related & remaining.keys() for model, related in remaining.items()}
+        ready = [model for model in remaining if not needs[model]]
+        if not ready:
+            # A cycle: break it at a table whose keys into it can be left empty for now
+            for model in remaining:
+                cyclic = [field for field in foreign_keys(model) if field.related_model in needs[model]]
+                if on_cycle(model, needs) and all(field.null for field in cyclic):
+                    deferred[model] = deferred.get(model, []) + cyclic
+                    ready = [model]
+                    break
+            else:
+                raise CommandError('Foreign keys form a cycle without a nullable key: %s' % ', '.join(
+                    model._meta.label for model in remaining))
+        for model in ready:
+            ordered.append(model)
+            del remaining[model]
+    return ordered, deferred
+
+
+@contextmanager
+def raw_timestamps(model):
+    # bulk_create would stamp auto_now / auto_now_add fields with the current time
+    fields = [field for field in model._meta.concrete_fields if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = 'Copy all data from SOURCE_URL (e.g. sqlite:///db.sqlite3) into a migrated database, in resumable batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source_url', help='database URL to copy from')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='database alias to copy into (default: "default")')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        target = options['database']
+        batch_size = options['batch_size']
+        source = environ.Env.db_url_config(options['source_url'])
+        connections.settings[SOURCE_ALIAS] = connections.configure_settings(
+            {**connections.settings, SOURCE_ALIAS: source})[SOURCE_ALIAS]
+        if connections[SOURCE_ALIAS].vendor == connections[target].vendor and \
+                connections[SOURCE_ALIAS].settings_dict['NAME'] == connections[target].settings_dict['NAME']:
+            raise CommandError('Source and target are the same database')
+
+        models = [model for model in apps.get_models(include_auto_created=True)
+                  if model._meta.managed and not model._meta.proxy]
+        ordered, deferred = copy_order(models)
+        for model in ordered:
+            self.replace_stale_rows(model, target)
+            copied = self.copy_table(model, target, batch_size, deferred.get(model, []))
+            self.stdout.write(f'{model._meta.label}: {copied} row(s) copied')
+        for model, fields in deferred.items():
+            filled = self.fill_deferred(model, fields, target, batch_size)
+            self.stdout.write(f'{model._meta.label}: {", ".join(field.name for field in fields)} filled in on {filled} row(s)')
+
+        # Point the target's id sequences past the copied rows (Postgres)
+        with connections[target].cursor() as cursor:
+            for sql in connections[target].ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+        self.stdout.write(self.style.SUCCESS('Done'))
+
+    def replace_stale_rows(self, model, target):
+        """
+        migrate fills the content type and permission tables by itself, with
+        its own ids. Drop those rows if they disagree with the source so the
+        source rows can be copied with their ids (rows left by an earlier run
+        match and are kept).
+        """
+        if model._meta.label not in SEEDED_BY_MIGRATE:
+            return
+        fields = [field.attname for field in model._meta.concrete_fields]
+        target_rows = set(model._base_manager.using(target).values_list(*fields))
+        source_rows = set(model._base_manager.using(SOURCE_ALIAS).values_list(*fields))
+        if not target_rows <= source_rows:
+            model._base_manager.using(target).all().delete()
+
+    def copy_table(self, model, target, batch_size, deferred):
+        manager = model._base_manager
+        last = manager.using(target).aggregate(last=Max('pk'))['last']
+        rows = manager.using(SOURCE_ALIAS).order_by('pk')
+        if last is not None:
+            rows = rows.filter(pk__gt=last)
+
+        copied = 0
+        batch = []
+        with raw_timestamps(model):
+            # iterator() streams from the source (a server-side cursor on Postgres)
+            for obj in rows.iterator(chunk_size=batch_size):
+                for field in deferred:
+                    setattr(obj, field.attname, None)
+                batch.append(obj)
+                if len(batch) == batch_size:
+                    copied += self.write_batch(model, target, batch)
+                    batch = []
+            if batch:
+                copied += self.write_batch(model, target, batch)
+        return copied
+
+    def write_batch(self, model, target, batch):
+        with transaction.atomic(using=target):
+            model._base_manager.using(target).bulk_create(batch)
+        return len(batch)
+
+    def fill_deferred(self, model, fields, target, batch_size):
+        # Every row, not just this run's, so an interrupted run is finished off too
+        has_value = Q()
+        for field in fields:
+            has_value |= Q(**{field.attname + '__isnull': False})
+        rows = model._base_manager.using(SOURCE_ALIAS).filter(has_value).only('pk', *[field.attname for field in fields]).order_by('pk')
+
+        filled = 0
+        batch = []
+        for obj in rows.iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) == batch_size:
+                filled += self.update_batch(model, target, batch, fields)
+                batch = []
+        if batch:
+            filled += self.update_batch(model, target, batch, fields)
+        return filled
+
+    def update_batch(self, model, target, batch, fields):
+        with transaction.atomic(using=target):
+            model._base_manager.using(target).bulk_update(batch, [field.name for field in fields])
+        return len(batch)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from hospital import presence
+
+
+class Command(BaseCommand):
+    help = 'Bring User.login_status in line with who was seen recently (run it from cron every minute)'
+
+    def handle(self, *args, **options):
+        online, offline = presence.flush()
+        self.stdout.write(f'{online} user(s) came online, {offline} went offline')
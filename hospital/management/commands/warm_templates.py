@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from lifeaid.warmup import warm_templates
+
+
+class Command(BaseCommand):
+    help = 'Compile every template, report how long it took and fail if any template is broken'
+
+    def handle(self, *args, **options):
+        compiled, seconds, errors = warm_templates()
+        self.stdout.write(f'Compiled {compiled} templates in {seconds:.2f}s')
+        for name, error in errors.items():
+            self.stderr.write(f'{name}: {error}')
+        if errors:
+            raise CommandError(f'{len(errors)} template(s) failed to compile')
@@ -0,0 +1,102 @@
+"""
+request.profile: the logged in user's role profile (Patient,
+Doctor_Information, Admin_Information, Pharmacist or
+Clinical_Laboratory_Technician), loaded once with the relations the pages
+follow and kept in the cache between requests.
+
+It behaves like the Model.objects.get(user=request.user) it replaces: it
+raises DoesNotExist if the user has no profile for their role. The cached
+copies are dropped by the receivers in hospital/signals.py.
+
+Views save the profile, so columns that are written with update() (which
+sends no signal to drop the cached copy) are left out of it: Django treats
+them as deferred, loads them on first use and leaves them out of save(),
+which can't write back a stale value.
+
+The navbar and sidebar includes are cached per user with {% cache %}, keyed
+on fragment_version() of the profile they show (the profile_version filter
+in hospital/templatetags/profile_fragments.py), which changes along with it.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils.functional import SimpleLazyObject
+
+
+GENERATION_KEY = 'profile:generation'
+FRAGMENT_VERSION_KEY = 'profile:fragments:%s'
+
+
+def role_profiles():
+    # (role flag on User, profile model, relations to load with it,
+    #  columns written with update() that aren't cached)
+    from doctor.models import Doctor_Information
+    from hospital_admin.models import Admin_Information, Clinical_Laboratory_Technician
+    from pharmacy.models import Pharmacist
+    from .models import Patient
+
+    return [
+        ('is_patient', Patient, (), ()),
+        # next_available_slot: doctor/slots.py
+        ('is_doctor', Doctor_Information, ('hospital_name', 'department_name', 'specialization'), ('next_available_slot',)),
+        ('is_hospital_admin', Admin_Information, ('hospital',), ()),
+        ('is_pharmacist', Pharmacist, (), ()),
+        ('is_labworker', Clinical_Laboratory_Technician, ('hospital',), ()),
+    ]
+
+
+def profile_cache_key(user_id):
+    # The generation changes when a hospital, department or specialization does
+    generation = cache.get_or_set(GENERATION_KEY, 1, None)
+    return f'profile:{generation}:{user_id}'
+
+
+def get_profile(user):
+    if not user.is_authenticated:
+        raise ObjectDoesNotExist('Anonymous users have no profile')
+
+    key = profile_cache_key(user.pk)
+    profile = cache.get(key)
+    if profile is None:
+        for flag, model, related, uncached in role_profiles():
+            if getattr(user, flag):
+                profile = model.objects.select_related(*related).defer(*uncached).get(user_id=user.pk)
+                break
+        else:
+            raise ObjectDoesNotExist(f'{user} has no role profile')
+        cache.set(key, profile, settings.PROFILE_CACHE_SECONDS)
+
+    # Reuse the request's user instead of loading it again
+    profile.user = user
+    return profile
+
+
+def fragment_version(user_id):
+    generation = cache.get_or_set(GENERATION_KEY, 1, None)
+    version = cache.get_or_set(FRAGMENT_VERSION_KEY % user_id, time.time_ns, None)
+    return f'{generation}.{version}'
+
+
+def invalidate_profile(user_id):
+    cache.delete_many([profile_cache_key(user_id), FRAGMENT_VERSION_KEY % user_id])
+
+
+def invalidate_all_profiles():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+
+class ProfileMiddleware:
+    # Must come after AuthenticationMiddleware
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(lambda: get_profile(request.user))
+        return self.get_response(request)
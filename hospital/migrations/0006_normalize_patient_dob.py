@@ -0,0 +1,73 @@
+# Rewrites Patient.dob (typed as DD/MM/YYYY by the profile form) to ISO dates
+# so that the following migration can turn it into a DateField. Values that
+# can't be parsed are cleared rather than failing the migration.
+
+import datetime
+
+from dateutil import parser as dateutil_parser
+from django.db import migrations
+
+
+BATCH_SIZE = 500
+
+# Written out here rather than imported from hospital/utils.py, so this
+# migration can't change with the app
+LEGACY_DATE_FORMATS = (
+    '%Y-%m-%d',
+    '%d/%m/%Y',
+    '%d-%m-%Y',
+    '%Y/%m/%d',
+    '%d.%m.%Y',
+    '%m/%d/%Y',
+    '%B %d, %Y',
+    '%b. %d, %Y',
+    '%b %d, %Y',
+)
+
+
+def parse_legacy_date(value):
+    value = (value or '').strip()
+    if not value:
+        return None
+
+    for date_format in LEGACY_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+
+    try:
+        return dateutil_parser.parse(value, dayfirst=True).date()
+    except (ValueError, OverflowError):
+        return None
+
+
+def normalize_dob(apps, schema_editor):
+    Patient = apps.get_model('hospital', 'Patient')
+    rows = Patient.objects.only('pk', 'dob').order_by('pk')
+    
+    changed = []
+    for patient in rows.iterator(chunk_size=BATCH_SIZE):
+        parsed = parse_legacy_date(patient.dob)
+        normalized = parsed.isoformat() if parsed else None
+        if patient.dob != normalized:
+            patient.dob = normalized
+            changed.append(patient)
+        
+        if len(changed) >= BATCH_SIZE:
+            Patient.objects.bulk_update(changed, ['dob'])
+            changed = []
+    
+    if changed:
+        Patient.objects.bulk_update(changed, ['dob'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0005_patient_weight'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_dob, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-19 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0006_normalize_patient_dob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='patient',
+            name='dob',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+    ]
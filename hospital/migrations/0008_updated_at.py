@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-19 15:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0007_typed_date_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hospital_information',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -50,6 +50,9 @@ class Hospital_Information(models.Model):
     regular_cabin_no = models.IntegerField(null=True, blank=True)
     emergency_cabin_no = models.IntegerField(null=True, blank=True)
     vip_cabin_no = models.IntegerField(null=True, blank=True)
+    # Also bumped when its departments, specializations or services change
+    # (hospital/signals.py); ETags and Last-Modified in hospital/conditional.py
+    updated_at = models.DateTimeField(auto_now=True)
 
     # String representation of object
     def __str__(self):
@@ -67,7 +70,7 @@ class Patient(models.Model):
     featured_image = models.ImageField(upload_to='patients/', default='patients/user-default.png', null=True, blank=True)
     blood_group = models.CharField(max_length=200, null=True, blank=True)
     history = models.CharField(max_length=200, null=True, blank=True)
-    dob = models.CharField(max_length=200, null=True, blank=True)
+    dob = models.DateField(null=True, blank=True, db_index=True)
     nid = models.CharField(max_length=200, null=True, blank=True)
     weight = models.IntegerField(null=True, blank=True)
     serial_number = models.CharField(max_length=200, null=True, blank=True)
@@ -75,7 +78,20 @@ class Patient(models.Model):
     # Chat
     login_status = models.CharField(max_length=200, null=True, blank=True, default="offline")
 
+    class Meta:
+        constraints = [
+            # From hospital/identifiers.py
+            models.UniqueConstraint(fields=['serial_number'], name='patient_serial_unique'),
+        ]
+
     def __str__(self):
         return str(self.user.username)
 
 
+class IdentifierSequence(models.Model):
+    # Last number handed out for each kind of identifier (hospital/identifiers.py)
+    name = models.CharField(max_length=50, primary_key=True)
+    last = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return '%s: %s' % (self.name, self.last)
@@ -0,0 +1,83 @@
+"""
+Who's online.
+
+Every request records the user as seen in the cache (at most once per
+PRESENCE_WRITE_INTERVAL seconds per user) and the key expires after
+USER_LASTSEEN_TIMEOUT of inactivity. User.login_status is brought in line in
+batches: flush() runs from the middleware every PRESENCE_FLUSH_SECONDS per
+process, and `manage.py flush_presence` can run it from cron.
+
+Use online_user_ids() for lists of contacts; it's one cache round trip.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from lifeaid.routers import unpinned
+from .models import User
+
+
+SEEN_KEY = 'presence:seen:%s'
+THROTTLE_KEY = 'presence:throttle:%s'
+
+# Users this process saw come or go since the last flush
+_pending = set()
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def record_seen(user_id, force=False):
+    # The throttle key makes all but the first call per interval a single cache.add
+    if force:
+        cache.set(THROTTLE_KEY % user_id, 1, settings.PRESENCE_WRITE_INTERVAL)
+    elif not cache.add(THROTTLE_KEY % user_id, 1, settings.PRESENCE_WRITE_INTERVAL):
+        return
+    cache.set(SEEN_KEY % user_id, time.time(), settings.USER_LASTSEEN_TIMEOUT)
+    with _lock:
+        _pending.add(user_id)
+
+
+def record_gone(user_id):
+    cache.delete_many([SEEN_KEY % user_id, THROTTLE_KEY % user_id])
+    with _lock:
+        _pending.add(user_id)
+
+
+def last_seen(user_id):
+    return cache.get(SEEN_KEY % user_id)
+
+
+def online_user_ids(user_ids):
+    user_ids = list(user_ids)
+    seen = cache.get_many([SEEN_KEY % user_id for user_id in user_ids])
+    return {user_id for user_id in user_ids if SEEN_KEY % user_id in seen}
+
+
+@unpinned()
+def flush():
+    """
+    Write login_status for everyone whose presence changed, in two UPDATEs
+    at most (plus one SELECT to find users who timed out). Returns
+    (online, offline) counts of rows changed.
+    """
+    global _last_flush
+    with _lock:
+        pending = set(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+
+    # Users marked online whose last-seen key has expired went away silently
+    candidates = pending | set(User.objects.filter(login_status=True).values_list('pk', flat=True))
+    still_online = online_user_ids(candidates)
+    gone = candidates - still_online
+
+    online = User.objects.filter(pk__in=still_online, login_status=False).update(login_status=True)
+    offline = User.objects.filter(pk__in=gone, login_status=True).update(login_status=False)
+    return online, offline
+
+
+def flush_due():
+    return time.monotonic() - _last_flush >= settings.PRESENCE_FLUSH_SECONDS
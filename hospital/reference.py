@@ -0,0 +1,61 @@
+"""
+Reference data read on most pages, through the two-level cache in
+lifeaid/refcache.py. The receivers in hospital/signals.py invalidate it when
+any of these models is saved or deleted.
+
+Results are lists (or single objects) shared between requests; don't change
+them in place.
+"""
+
+from hospital_admin.models import Test_Information, hospital_department, service, specialization
+from lifeaid.refcache import reference_cache
+from .models import Hospital_Information
+
+
+def hospitals():
+    return reference_cache.get(
+        'hospitals',
+        lambda: list(Hospital_Information.objects.order_by('hospital_id')),
+        [Hospital_Information],
+    )
+
+
+def hospital(pk):
+    # Raises Hospital_Information.DoesNotExist like objects.get() (misses aren't cached)
+    return reference_cache.get(
+        'hospital:%s' % pk,
+        lambda: Hospital_Information.objects.get(hospital_id=pk),
+        [Hospital_Information],
+    )
+
+
+def hospital_departments(hospital_id):
+    return reference_cache.get(
+        'departments:%s' % hospital_id,
+        lambda: list(hospital_department.objects.filter(hospital_id=hospital_id)),
+        [hospital_department],
+    )
+
+
+def hospital_specializations(hospital_id):
+    return reference_cache.get(
+        'specializations:%s' % hospital_id,
+        lambda: list(specialization.objects.filter(hospital_id=hospital_id)),
+        [specialization],
+    )
+
+
+def hospital_services(hospital_id):
+    return reference_cache.get(
+        'services:%s' % hospital_id,
+        lambda: list(service.objects.filter(hospital_id=hospital_id)),
+        [service],
+    )
+
+
+def tests():
+    return reference_cache.get(
+        'tests',
+        lambda: list(Test_Information.objects.order_by('test_id')),
+        [Test_Information],
+    )
@@ -1,14 +1,19 @@
+from django.contrib.auth.signals import user_logged_in, user_logged_out
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 # from django.contrib.auth.models import User
-from .models import Patient, User
-from doctor.models import Doctor_Information
+from .models import Hospital_Information, Patient, User
+from doctor.models import Appointment, Doctor_Information, DoctorSchedule, ScheduleException
+from doctor import slots
 from hospital_admin.models import Admin_Information, Clinical_Laboratory_Technician
 
 from pharmacy.models import Pharmacist
-
-import random
-import string
+from hospital_admin.models import Test_Information, hospital_department, service, specialization
+from .middleware import invalidate_all_profiles, invalidate_profile
+from lifeaid.refcache import reference_cache
+from . import presence
+from .identifiers import next_identifier
 
 
 # # from django.core.mail import send_mail
@@ -23,21 +28,13 @@ import string
 #     if created:
 #         Patient.objects.create(user=instance)
 
-def generate_random_string():
-    N = 6
-    string_var = ""
-    string_var = ''.join(random.choices(
-        string.ascii_uppercase + string.digits, k=N))
-    string_var = "#PT" + string_var
-    return string_var
-
 @receiver(post_save, sender=User)
 def createPatient(sender, instance, created, **kwargs):
     if created:
         if instance.is_patient:
             user = instance
             Patient.objects.create(
-                user=user, username=user.username, email=user.email, serial_number = generate_random_string())
+                user=user, username=user.username, email=user.email, serial_number = next_identifier('patient'))
         elif instance.is_doctor:
             user = instance
             Doctor_Information.objects.create(
@@ -72,3 +69,79 @@ def updateUser(sender, instance, created, **kwargs):
 # def createDoctor(sender, instance, created, **kwargs):
 #     if created:
 #         Doctor_Information.objects.create(user=instance)
+
+
+# Cached request.profile copies (hospital/middleware.py)
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Patient)
+@receiver([post_save, post_delete], sender=Doctor_Information)
+@receiver([post_save, post_delete], sender=Admin_Information)
+@receiver([post_save, post_delete], sender=Pharmacist)
+@receiver([post_save, post_delete], sender=Clinical_Laboratory_Technician)
+def dropCachedProfile(sender, instance, **kwargs):
+    user_id = instance.pk if sender is User else instance.user_id
+    if user_id is not None:
+        invalidate_profile(user_id)
+
+
+@receiver([post_save, post_delete], sender=Hospital_Information)
+@receiver([post_save, post_delete], sender=hospital_department)
+@receiver([post_save, post_delete], sender=specialization)
+def dropCachedProfiles(sender, instance, **kwargs):
+    invalidate_all_profiles()
+
+
+# Reference data cached by hospital/reference.py (and the API's doctor lists,
+# and doctor schedules in doctor/slots.py)
+
+@receiver([post_save, post_delete], sender=Hospital_Information)
+@receiver([post_save, post_delete], sender=Doctor_Information)
+@receiver([post_save, post_delete], sender=hospital_department)
+@receiver([post_save, post_delete], sender=specialization)
+@receiver([post_save, post_delete], sender=service)
+@receiver([post_save, post_delete], sender=Test_Information)
+@receiver([post_save, post_delete], sender=DoctorSchedule)
+@receiver([post_save, post_delete], sender=ScheduleException)
+def dropReferenceData(sender, instance, **kwargs):
+    reference_cache.invalidate(sender)
+
+
+# A doctor's next free slot (Doctor_Information.next_available_slot) moves
+# when a slot is booked or freed, or the schedule changes. Registered after
+# dropReferenceData so the schedule it reads isn't the cached one.
+
+@receiver([post_save, post_delete], sender=Appointment)
+@receiver([post_save, post_delete], sender=DoctorSchedule)
+@receiver([post_save, post_delete], sender=ScheduleException)
+def refreshNextAvailable(sender, instance, **kwargs):
+    if sender is Appointment and instance.slot is None:
+        return  # booked the old way, outside the schedule
+    if instance.doctor_id is not None:
+        slots.refresh_next_available(instance.doctor_id)
+
+
+# Hospital pages list these, so they move the hospital's updated_at (its
+# ETag and Last-Modified, hospital/conditional.py). update() sends no
+# post_save, so the cached hospitals (and the API's ETag) are dropped here.
+
+@receiver([post_save, post_delete], sender=hospital_department)
+@receiver([post_save, post_delete], sender=specialization)
+@receiver([post_save, post_delete], sender=service)
+def touchHospital(sender, instance, **kwargs):
+    if instance.hospital_id is not None:
+        Hospital_Information.objects.filter(pk=instance.hospital_id).update(updated_at=timezone.now())
+        reference_cache.invalidate(Hospital_Information)
+
+
+# Online status (hospital/presence.py), written to User.login_status in batches
+
+@receiver(user_logged_in)
+def got_online(sender, user, request, **kwargs):
+    presence.record_seen(user.pk, force=True)
+
+
+@receiver(user_logged_out)
+def got_offline(sender, user, request, **kwargs):
+    if user is not None:
+        presence.record_gone(user.pk)
@@ -0,0 +1,15 @@
+from django import template
+
+from hospital.middleware import fragment_version
+
+
+register = template.Library()
+
+
+@register.filter
+def profile_version(profile):
+    # For {% cache %} keys: changes whenever the profile (or its user) is saved
+    user_id = getattr(profile, 'user_id', None)
+    if user_id is None:
+        return ''
+    return fragment_version(user_id)
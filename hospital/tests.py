@@ -1,3 +1,681 @@
-from django.test import TestCase
+import datetime
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+import environ
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.template import engines
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from doctor.models import Doctor_Information, Prescription, Prescription_test, Report, testCart, testOrder
+from hospital_admin.models import hospital_department, service, specialization
+from lifeaid.ratelimit import TokenBucket, check_cache_backend
+from lifeaid.refcache import reference_cache, version_key
+from lifeaid.routers import PIN_COOKIE, ReplicaMiddleware, use_replica
+from lifeaid.warmup import warm_templates
+from lifeaid.testing import QueryBudgetMixin
+from pharmacy.models import Cart, Order
+from sslcommerz.models import Payment
+from . import presence, reference
+from .identifiers import next_identifier, next_identifiers
+from .management.commands.copy_database import SOURCE_ALIAS, copy_order
+from .middleware import GENERATION_KEY, ProfileMiddleware
+from .models import Hospital_Information, Patient, User
+from .utils import filterDateRange, parse_legacy_date, parse_legacy_price
 
 # Create your tests here.
+
+
+class LegacyDateTests(TestCase):
+
+    def test_parses_stored_formats(self):
+        expected = datetime.date(1999, 11, 19)
+        for value in ['1999-11-19', '19/11/1999', '19-11-1999', 'Nov. 19, 1999', 'November 19, 1999', ' 1999-11-19 ']:
+            self.assertEqual(parse_legacy_date(value), expected, value)
+
+    def test_blank_and_garbage_become_none(self):
+        for value in [None, '', '   ', 'not a date']:
+            self.assertIsNone(parse_legacy_date(value))
+
+    def test_date_range_filter(self):
+        Report.objects.create(delivery_date=datetime.date(2024, 1, 1))
+        inside = Report.objects.create(delivery_date=datetime.date(2024, 1, 15))
+        Report.objects.create(delivery_date=datetime.date(2024, 2, 1))
+
+        request = RequestFactory().get('/', {'date_from': '2024-01-10', 'date_to': '2024-01-31'})
+        reports, date_from, date_to = filterDateRange(request, Report.objects.all(), 'delivery_date')
+
+        self.assertEqual(list(reports), [inside])
+        self.assertEqual(date_from, datetime.date(2024, 1, 10))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite backend only')
+class LegacyPriceTests(TestCase):
+
+    def parsers(self):
+        # The app's parser and the copies in the data migrations
+        yield parse_legacy_price
+        for module in ('doctor.migrations.0048_normalize_test_info_price', 'hospital_admin.migrations.0006_normalize_test_price'):
+            yield import_module(module).parse_legacy_price
+
+    def test_reads_the_one_number(self):
+        for parse in self.parsers():
+            for value, expected in [('500', '500.00'), ('500 tk', '500.00'), ('1,200.50', '1200.50'),
+                                    ('Tk. 500', '500.00'), ('Rs.1200', '1200.00'), ('500/-', '500.00')]:
+                self.assertEqual(parse(value), Decimal(expected), value)
+
+    def test_unreadable_prices_become_none(self):
+        for parse in self.parsers():
+            for value in [None, '', 'free', '500-700', '2 x 500', '123456789']:
+                self.assertIsNone(parse(value), value)
+
+
+class SQLiteProfileTests(TestCase):
+
+    def test_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+
+    def test_transactions_take_the_write_lock_up_front(self):
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+class FakeModel:
+
+    def __init__(self, label):
+        self._meta = SimpleNamespace(label=label, concrete_fields=[])
+
+    def key(self, name, to, null=True):
+        field = SimpleNamespace(name=name, is_relation=True, related_model=to, null=null)
+        self._meta.concrete_fields.append(field)
+        return field
+
+
+class CopyDatabaseOrderTests(TestCase):
+
+    def test_referenced_tables_come_first(self):
+        order, deferred = copy_order(apps.get_models(include_auto_created=True))
+        self.assertLess(order.index(User), order.index(Patient))
+        self.assertLess(order.index(ContentType), order.index(Permission))
+        self.assertLess(order.index(Cart), order.index(Order.orderitems.through))
+        self.assertEqual(deferred, {})
+
+    def test_cycles_are_broken_at_a_nullable_key(self):
+        hospital, admin, note = FakeModel('hospital'), FakeModel('admin'), FakeModel('note')
+        admin.key('hospital', hospital, null=False)
+        owner = hospital.key('owner', admin)
+        note.key('admin', admin)
+        reply_to = note.key('reply_to', note)
+
+        order, deferred = copy_order([note, admin, hospital])
+        self.assertEqual(order, [hospital, admin, note])
+        self.assertEqual(deferred, {hospital: [owner], note: [reply_to]})
+
+        owner.null = False
+        with self.assertRaises(CommandError):
+            copy_order([note, admin, hospital])
+
+
+class CopyDatabaseTests(TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+        # The alias the command opens, set up here first to give it a schema and rows
+        connections.settings[SOURCE_ALIAS] = connections.configure_settings(
+            {**connections.settings, SOURCE_ALIAS: environ.Env.db_url_config('sqlite:///' + self.path)})[SOURCE_ALIAS]
+        self.addCleanup(self.drop_source)
+
+        with connections[SOURCE_ALIAS].schema_editor() as editor:
+            # Many-to-many tables come with their models
+            for model in apps.get_models():
+                if model._meta.managed and not model._meta.proxy:
+                    editor.create_model(model)
+        for model in (ContentType, Permission):
+            model.objects.using(SOURCE_ALIAS).bulk_create(model.objects.all())
+
+    def drop_source(self):
+        connections[SOURCE_ALIAS].close()
+        del connections[SOURCE_ALIAS]
+        del connections.settings[SOURCE_ALIAS]
+
+    def test_copies_every_table_with_its_ids(self):
+        source = SOURCE_ALIAS
+        hospital = Hospital_Information.objects.using(source).create(name='Popular', hospital_type='private')
+        # bulk_create sends no post_save, so hospital.signals doesn't add profiles on the target
+        User.objects.using(source).bulk_create([User(pk=7, username='karim', is_patient=True)])
+        Patient.objects.using(source).bulk_create([Patient(pk=3, user_id=7, name='Karim')])
+        Doctor_Information.objects.using(source).bulk_create([Doctor_Information(pk=5, name='Rahim', hospital_name=hospital)])
+
+        out = StringIO()
+        call_command('copy_database', 'sqlite:///' + self.path, batch_size=1, stdout=out)
+        self.assertIn('Done', out.getvalue())
+        self.assertEqual(Patient.objects.get(pk=3).user.username, 'karim')
+        self.assertEqual(Doctor_Information.objects.get(pk=5).hospital_name.name, 'Popular')
+
+        # Running it again copies nothing twice
+        call_command('copy_database', 'sqlite:///' + self.path, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 1)
+
+
+@override_settings(DATABASE_REPLICA_VIEWS=['patient-list'])
+class ReplicaRouterTests(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        patcher = mock.patch('lifeaid.routers.replica_configured', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, method, url_name, cookies=None):
+        request = getattr(self.factory, method)('/')
+        request.COOKIES.update(cookies or {})
+        request.session = {}
+        request.resolver_match = type('Match', (), {'url_name': url_name})
+        return request
+
+    def run_view(self, request, view):
+        middleware = ReplicaMiddleware(lambda request: middleware.process_view(request, view, (), {}) or view(request))
+        return middleware(request)
+
+    def read_db(self, request):
+        return Patient.objects.all().db
+
+    def test_listed_views_read_from_the_replica(self):
+        self.assertEqual(self.run_view(self.request('get', 'patient-list'), self.read_db), 'replica')
+        self.assertEqual(self.run_view(self.request('get', 'patient-dashboard'), self.read_db), 'default')
+        self.assertEqual(self.run_view(self.request('post', 'patient-list'), self.read_db), 'default')
+        self.assertEqual(Patient.objects.all().db, 'default')
+
+    def test_sessions_always_read_from_the_primary(self):
+        with use_replica():
+            self.assertEqual(Patient.objects.all().db, 'replica')
+            self.assertEqual(Session.objects.all().db, 'default')
+
+    def test_writes_pin_the_user_to_the_primary(self):
+        def write(request):
+            Patient.objects.create(name='Rahim')
+            return HttpResponse('written')
+
+        request = self.request('post', 'patient-profile')
+        cookie = self.run_view(request, write).cookies[PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+        self.assertEqual(request.session, {})  # the session isn't touched
+        self.assertEqual(self.run_view(self.request('get', 'patient-list', {PIN_COOKIE: cookie.value}), self.read_db), 'default')
+        # A cookie that wasn't set by us doesn't pin
+        self.assertEqual(self.run_view(self.request('get', 'patient-list', {PIN_COOKIE: '1'}), self.read_db), 'replica')
+
+    def test_presence_flush_does_not_pin(self):
+        def seen(request):
+            presence.record_seen(self.user.pk, force=True)
+            presence.flush()
+            return HttpResponse('seen')
+
+        self.user = User.objects.create(username='rahim')
+        response = self.run_view(self.request('get', 'patient-dashboard'), seen)
+        self.assertTrue(User.objects.get(pk=self.user.pk).login_status)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+class PatientPageQueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='patient', is_patient=True)
+        self.patient = self.user.patient  # created by hospital.signals
+        self.client.force_login(self.user)
+
+    def test_hospital_profile(self):
+        hospital = Hospital_Information.objects.create(name='Popular', hospital_type='private')
+        for n in range(6):
+            hospital_department.objects.create(hospital=hospital, hospital_department_name=f'Department {n}')
+            specialization.objects.create(hospital=hospital, specialization_name=f'Specialization {n}')
+            service.objects.create(hospital=hospital, service_name=f'Service {n}')
+            Doctor_Information.objects.create(name=f'Doctor {n}', hospital_name=hospital)
+
+        with self.assertQueryBudget('hospital-profile'):
+            response = self.client.get(reverse('hospital-profile', args=[hospital.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_test_cart(self):
+        prescription = Prescription.objects.create(patient=self.patient)
+        order = testOrder.objects.create(user=self.user)
+        for n in range(6):
+            test = Prescription_test.objects.create(prescription=prescription, test_name=f'Test {n}', test_info_price=Decimal('100.00'))
+            order.orderitems.add(testCart.objects.create(user=self.user, item=test))
+
+        with self.assertQueryBudget('test-cart'):
+            response = self.client.get(reverse('test-cart', args=[prescription.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Test 5')
+
+
+class RequestProfileTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create(username='doctor', is_doctor=True)
+        self.hospital = Hospital_Information.objects.create(name='Popular', hospital_type='private')
+        Doctor_Information.objects.filter(user=self.user).update(hospital_name=self.hospital)
+
+    def profile(self):
+        request = self.factory.get('/')
+        request.user = self.user
+        ProfileMiddleware(lambda request: None)(request)
+        return request.profile
+
+    def test_profile_is_loaded_once_with_its_relations(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.profile().hospital_name.name, 'Popular')
+        with self.assertNumQueries(0):
+            profile = self.profile()
+            self.assertEqual(profile.hospital_name.name, 'Popular')
+            self.assertIs(profile.user, self.user)
+
+    def test_saves_drop_the_cached_profile(self):
+        profile = self.profile()
+        profile.name = 'Karim'
+        profile.save()
+        self.assertEqual(self.profile().name, 'Karim')
+
+        self.hospital.name = 'Square'
+        self.hospital.save()
+        self.assertEqual(self.profile().hospital_name.name, 'Square')
+
+    def test_doctor_saves_only_drop_that_doctors_profile(self):
+        other = User.objects.create(username='other', is_doctor=True)
+        generation = cache.get_or_set(GENERATION_KEY, 1, None)
+        doctor = Doctor_Information.objects.get(user=other)
+        doctor.name = 'Rahim'
+        doctor.save()
+        self.assertEqual(cache.get(GENERATION_KEY), generation)
+
+    def test_saving_a_cached_profile_keeps_columns_written_with_update(self):
+        self.profile().pk  # cached
+        slot = timezone.now() + datetime.timedelta(hours=1)
+        Doctor_Information.objects.filter(user=self.user).update(next_available_slot=slot)
+
+        profile = self.profile()
+        profile.name = 'Karim'
+        profile.save()
+        doctor = Doctor_Information.objects.get(user=self.user)
+        self.assertEqual((doctor.name, doctor.next_available_slot), ('Karim', slot))
+
+    def test_users_without_a_role_have_no_profile(self):
+        self.user = User.objects.create(username='nobody')
+        with self.assertRaises(ObjectDoesNotExist):
+            self.profile().pk
+
+
+class ThrottledSessionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='patient', is_patient=True)
+        self.client.force_login(self.user)
+
+    def session_writes(self, url='/about-us/'):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return [query['sql'] for query in queries if 'django_session' in query['sql'] and not query['sql'].startswith('SELECT')]
+
+    def test_unchanged_sessions_are_not_rewritten(self):
+        self.session_writes()
+        for _ in range(5):
+            self.assertEqual(self.session_writes(), [])
+        self.assertEqual(self.client.session.get_expiry_age(), settings.SESSION_COOKIE_AGE)
+
+    def test_stored_expiry_is_refreshed_when_it_runs_low(self):
+        self.session_writes()
+        with mock.patch('lifeaid.sessions.time.time', return_value=time.time() + settings.SESSION_COOKIE_AGE * 0.6):
+            self.assertEqual(len(self.session_writes()), 1)
+
+    def test_idle_timeout_still_applies(self):
+        self.session_writes()
+        stored = Session.objects.get(pk=self.client.session.session_key)
+        self.assertLessEqual(stored.expire_date, timezone.now() + datetime.timedelta(seconds=settings.SESSION_COOKIE_AGE))
+
+
+class PresenceTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        presence.flush()
+        self.user = User.objects.create(username='patient', is_patient=True)
+
+    def test_requests_are_recorded_at_most_once_per_interval(self):
+        self.client.force_login(self.user)
+        with mock.patch.object(presence.cache, 'set', wraps=presence.cache.set) as cache_set:
+            for _ in range(5):
+                self.client.get('/about-us/')
+        self.assertEqual([c for c in cache_set.call_args_list if presence.SEEN_KEY % self.user.pk in c.args], [])
+        self.assertIsNotNone(presence.last_seen(self.user.pk))
+
+    def test_login_status_is_written_in_batches(self):
+        self.client.force_login(self.user)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.login_status)
+
+        with self.assertNumQueries(2):  # who's marked online, then one UPDATE
+            self.assertEqual(presence.flush(), (1, 0))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.login_status)
+
+        self.client.logout()
+        self.assertEqual(presence.flush(), (0, 1))
+        self.assertEqual(presence.online_user_ids([self.user.pk]), set())
+
+    def test_users_who_stop_making_requests_go_offline(self):
+        presence.record_seen(self.user.pk, force=True)
+        presence.flush()
+        cache.delete(presence.SEEN_KEY % self.user.pk)  # as if USER_LASTSEEN_TIMEOUT passed
+        self.assertEqual(presence.flush(), (0, 1))
+
+
+class ReferenceCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.hospital = Hospital_Information.objects.create(name='Popular', hospital_type='private')
+        hospital_department.objects.create(hospital=self.hospital, hospital_department_name='Cardiology')
+        reference_cache.clear_local()
+        reference_cache.reset_stats()
+
+    def departments(self):
+        return [d.hospital_department_name for d in reference.hospital_departments(self.hospital.pk)]
+
+    def test_repeat_reads_are_served_from_memory(self):
+        self.assertEqual(self.departments(), ['Cardiology'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.departments(), ['Cardiology'])
+        self.assertEqual(reference_cache.stats()['misses'], 1)
+        self.assertEqual(reference_cache.stats()['local_hits'], 1)
+
+    def test_other_processes_share_the_cached_copy(self):
+        self.departments()
+        reference_cache.clear_local()  # as if in another worker
+        with self.assertNumQueries(0):
+            self.assertEqual(self.departments(), ['Cardiology'])
+        self.assertEqual(reference_cache.stats()['shared_hits'], 1)
+
+    def test_saving_invalidates(self):
+        self.departments()
+        hospital_department.objects.create(hospital=self.hospital, hospital_department_name='Neurology')
+        self.assertEqual(self.departments(), ['Cardiology', 'Neurology'])
+
+    def test_saving_keeps_other_models_local_copies(self):
+        self.departments()
+        reference.hospital_services(self.hospital.pk)
+        service.objects.create(hospital=self.hospital, service_name='X-ray')
+        self.assertEqual(reference_cache.stats()['local_entries'], 1)
+
+        reference_cache.reset_stats()
+        self.assertEqual(self.departments(), ['Cardiology'])
+        self.assertEqual(reference_cache.stats()['local_hits'], 1)
+
+    def test_changes_made_elsewhere_show_after_the_local_ttl(self):
+        self.departments()
+        hospital_department.objects.filter(hospital=self.hospital).update(hospital_department_name='Neurology')
+        cache.incr(version_key(hospital_department))  # another worker's invalidate()
+        self.assertEqual(self.departments(), ['Cardiology'])
+
+        later = time.monotonic() + settings.REFERENCE_CACHE_LOCAL_SECONDS
+        with mock.patch('lifeaid.refcache.time.monotonic', return_value=later):
+            self.assertEqual(self.departments(), ['Neurology'])
+
+    def test_unchanged_versions_keep_the_local_copy(self):
+        self.departments()
+        later = time.monotonic() + settings.REFERENCE_CACHE_LOCAL_SECONDS
+        with mock.patch('lifeaid.refcache.time.monotonic', return_value=later), self.assertNumQueries(0):
+            self.departments()
+        self.assertEqual(reference_cache.stats()['local_hits'], 1)
+
+
+class ProfileFragmentCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='doctor', is_doctor=True)
+        self.doctor = self.user.profile  # created by hospital.signals
+        self.doctor.name = 'Rahim'
+        self.doctor.save()
+
+    def sidebar(self, search_query=''):
+        return render_to_string('doctor-sidebar.html', {'user': self.user, 'doctor': self.doctor, 'search_query': search_query})
+
+    def test_sidebar_is_rendered_once(self):
+        self.assertIn('Rahim', self.sidebar())
+        self.doctor.name = 'Karim'  # not saved, so the cached copy is still current
+        self.assertIn('Rahim', self.sidebar())
+
+    def test_saving_the_profile_renders_it_again(self):
+        self.sidebar()
+        self.doctor.name = 'Karim'
+        self.doctor.featured_image = 'doctors/karim.png'
+        self.doctor.save()
+        html = self.sidebar()
+        self.assertIn('Karim', html)
+        self.assertIn('doctors/karim.png', html)
+
+    def test_search_box_is_not_cached(self):
+        self.sidebar('Anika')
+        self.assertIn('value="Rupa"', self.sidebar('Rupa'))
+
+    def test_fragments_are_per_profile(self):
+        other = User.objects.create(username='other', is_doctor=True).profile
+        Doctor_Information.objects.filter(pk=other.pk).update(name='Karim')
+        self.sidebar()
+        other.refresh_from_db()
+        html = render_to_string('doctor-sidebar.html', {'user': other.user, 'doctor': other})
+        self.assertIn('Karim', html)
+
+
+class TemplateWarmupTests(TestCase):
+
+    def test_every_template_compiles(self):
+        compiled, seconds, errors = warm_templates()
+        self.assertEqual(errors, {})
+        self.assertGreater(compiled, 0)
+
+    def test_compiled_templates_stay_in_the_cached_loader(self):
+        warm_templates()
+        loader = engines['django'].engine.template_loaders[0]
+        self.assertEqual(type(loader).__module__, 'django.template.loaders.cached')
+        self.assertIn('doctor-sidebar.html', loader.get_template_cache)
+
+
+class ConditionalPageTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='patient', is_patient=True)
+        self.hospital = Hospital_Information.objects.create(name='Popular', hospital_type='private')
+        self.url = reverse('hospital-profile', args=[self.hospital.pk])
+        self.client.force_login(self.user)
+
+    def revalidate(self, response, url=None):
+        return self.client.get(url or self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_are_not_rendered_again(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)  # logged in: ETag only
+
+        with mock.patch('hospital.views.render') as render:
+            self.assertEqual(self.revalidate(response).status_code, 304)
+        render.assert_not_called()
+
+    def test_department_changes_make_a_new_etag(self):
+        response = self.client.get(self.url)
+        hospital_department.objects.create(hospital=self.hospital, hospital_department_name='Cardiology')
+        self.assertEqual(self.revalidate(response).status_code, 200)
+
+    def test_profile_changes_make_a_new_etag(self):
+        response = self.client.get(self.url)
+        self.user.patient.name = 'Karim'
+        self.user.patient.save()
+        self.assertEqual(self.revalidate(response).status_code, 200)
+
+    def test_pages_with_messages_waiting_are_rendered(self):
+        response = self.client.get(self.url)
+        with mock.patch('hospital.conditional.get_messages', return_value=['Saved']):
+            self.assertEqual(self.revalidate(response).status_code, 200)
+
+    def test_anonymous_visitors_get_last_modified(self):
+        self.client.logout()
+        url = reverse('hospital_home')
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        # Last-Modified has whole seconds
+        Hospital_Information.objects.filter(pk=self.hospital.pk).update(updated_at=timezone.now() + datetime.timedelta(seconds=2))
+        later = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(later.status_code, 200)
+
+
+
+@override_settings(RATE_LIMITS={'login': '3/m', 'api': '3/m', 'chat': '3/m'})
+class RateLimitTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_token_bucket_refills_at_the_rate(self):
+        bucket = TokenBucket('login')
+        self.assertEqual([bucket.take('ip:1', now=1000) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(bucket.take('ip:1', now=1000), 20)  # one token every 20s
+        self.assertEqual(bucket.take('ip:2', now=1000), 0)  # other buckets are untouched
+
+        self.assertEqual(bucket.take('ip:1', now=1020), 0)
+        self.assertGreater(bucket.take('ip:1', now=1020), 0)
+        # Idle for longer than it takes to fill: a full burst again, not more
+        self.assertEqual([bucket.take('ip:1', now=2000) for _ in range(4)], [0, 0, 0, 20])
+
+    def test_login_posts_are_limited_per_ip_and_username(self):
+        url = reverse('login')
+        for _ in range(3):
+            self.assertEqual(self.client.post(url, {'username': 'karim', 'password': 'wrong'}).status_code, 200)
+        response = self.client.post(url, {'username': 'karim', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20')
+        self.assertEqual(self.client.get(url).status_code, 200)  # the page still shows
+
+        # Same username from another address
+        response = self.client.post(url, {'username': 'Karim', 'password': 'wrong'}, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 429)
+
+    def test_jwt_token_endpoint_is_limited(self):
+        url = reverse('token_obtain_pair')
+        statuses = [self.client.post(url, {'username': 'karim', 'password': 'wrong'}).status_code for _ in range(4)]
+        self.assertEqual(statuses, [401, 401, 401, 429])
+
+    @override_settings(RATE_LIMIT_ENABLED=False)
+    def test_can_be_turned_off(self):
+        for _ in range(4):
+            self.assertEqual(self.client.post(reverse('login'), {'username': 'karim', 'password': 'wrong'}).status_code, 200)
+
+    def test_buckets_are_only_changed_with_add_and_incr(self):
+        bucket = TokenBucket('login')
+        with mock.patch.object(cache, 'set', side_effect=AssertionError), \
+                mock.patch.object(cache, 'set_many', side_effect=AssertionError):
+            self.assertEqual([bucket.take('ip:1', now=1000) for _ in range(4)], [0, 0, 0, 20])
+            self.assertEqual(bucket.take('ip:1', now=2000), 0)
+
+    def test_check_warns_about_caches_without_atomic_incr(self):
+        file_cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp'}}
+        with override_settings(CACHES=file_cache):
+            self.assertEqual([warning.id for warning in check_cache_backend(None)], ['lifeaid.W001'])
+        with override_settings(CACHES=file_cache, RATE_LIMIT_ENABLED=False):
+            self.assertEqual(check_cache_backend(None), [])
+        self.assertEqual(check_cache_backend(None), [])  # locmem
+
+
+class IdentifierTests(TestCase):
+
+    def test_sequences(self):
+        self.assertEqual(next_identifier('invoice'), '#INV-000001')
+        self.assertEqual(next_identifier('invoice'), '#INV-000002')
+        self.assertEqual(next_identifier('transaction'), 'SSLCZ_TEST_000000001')
+        self.assertEqual(next_identifiers('invoice', 3), ['#INV-000003', '#INV-000004', '#INV-000005'])
+
+    def test_new_patients_get_serials(self):
+        first = User.objects.create(username='first', is_patient=True).patient
+        second = User.objects.create(username='second', is_patient=True).patient
+        self.assertEqual([first.serial_number, second.serial_number], ['#PT0000001', '#PT0000002'])
+
+    def test_transaction_ids_are_unique(self):
+        Payment.objects.create(transaction_id='SSLCZ_TEST_000000001')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Payment.objects.create(transaction_id='SSLCZ_TEST_000000001')
+        # Rows without one don't clash
+        Payment.objects.create()
+        Payment.objects.create()
+
+    def test_dedupe(self):
+        # On a column without a unique constraint, as before the migrations add them
+        Patient.objects.create(username='PT1')
+        Patient.objects.create(username='')
+        second = Patient.objects.create(username='PT1')
+        Patient.objects.create(username='PT2')
+
+        dedupe_identifiers = import_module('hospital.migrations.0009_dedupe_identifiers').dedupe_identifiers
+        dedupe_identifiers(Patient, 'username')
+        self.assertEqual(
+            list(Patient.objects.order_by('pk').values_list('username', flat=True)),
+            ['PT1', None, 'PT1-%s' % second.pk, 'PT2'])
+
+
+class ConcurrentIdentifierTests(TransactionTestCase):
+
+    def test_workers_never_get_the_same_number(self):
+        workers = 8
+        numbers = []
+        start = threading.Barrier(workers)
+
+        def allocate():
+            start.wait()
+            try:
+                for _ in range(10):
+                    while True:
+                        try:
+                            numbers.append(next_identifier('invoice'))
+                            break
+                        except OperationalError:
+                            # SQLite only has one writer, the losers are told the database is locked
+                            time.sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=allocate) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(numbers), workers * 10)
+        self.assertEqual(sorted(numbers), ['#INV-%06d' % n for n in range(1, workers * 10 + 1)])
@@ -1,8 +1,15 @@
-from django.db.models import Q
+from django.db.models import F, Q
+from django.utils import timezone
 from .models import Patient, User, Hospital_Information
 from doctor.models import Doctor_Information, Appointment
 from hospital_admin.models import hospital_department, specialization, service
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
+from dateutil import parser as dateutil_parser
+import datetime
+import re
+from decimal import Decimal, InvalidOperation
+
+from . import reference
 
 
 def searchDoctors(request):
@@ -18,6 +25,7 @@ def searchDoctors(request):
         Q(name__icontains=search_query) |
         Q(hospital_name__name__icontains=search_query) |  
         Q(department__icontains=search_query))
+    doctors = filterAvailability(request, doctors)
     
     return doctors, search_query
 
@@ -31,7 +39,10 @@ def searchHospitals(request):
         search_query = request.GET.get('search_query')
         
     
-    hospitals = Hospital_Information.objects.distinct().filter(Q(name__icontains=search_query))
+    if search_query:
+        hospitals = Hospital_Information.objects.distinct().filter(Q(name__icontains=search_query))
+    else:
+        hospitals = reference.hospitals()
     
     return hospitals, search_query
 
@@ -93,6 +104,7 @@ def searchDepartmentDoctors(request, pk):
     
     doctors = Doctor_Information.objects.filter(department_name=departments).filter(
         Q(name__icontains=search_query))
+    doctors = filterAvailability(request, doctors)
     
     # doctors = Doctor_Information.objects.filter(department_name=departments).filter(
     #     Q(name__icontains=search_query) |
@@ -103,3 +115,104 @@ def searchDepartmentDoctors(request, pk):
 
 
 # products = Products.objects.filter(price__range=[10, 100])
+
+
+# Date formats seen in the old CharField date columns and in the forms
+# (html date inputs send ISO dates, the datetimepicker sends DD/MM/YYYY)
+LEGACY_DATE_FORMATS = (
+    '%Y-%m-%d',
+    '%d/%m/%Y',
+    '%d-%m-%Y',
+    '%Y/%m/%d',
+    '%d.%m.%Y',
+    '%m/%d/%Y',
+    '%B %d, %Y',
+    '%b. %d, %Y',
+    '%b %d, %Y',
+)
+
+
+def parse_legacy_date(value):
+    """Parse a date typed in any of the formats we have stored, None if it can't be read."""
+    
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    
+    value = str(value).strip()
+    if not value:
+        return None
+    
+    for date_format in LEGACY_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    
+    try:
+        return dateutil_parser.parse(value, dayfirst=True).date()
+    except (ValueError, OverflowError):
+        return None
+
+
+def filterDateRange(request, queryset, field):
+    
+    # ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD --> inclusive range on a DateField
+    date_from = parse_legacy_date(request.GET.get('date_from'))
+    date_to = parse_legacy_date(request.GET.get('date_to'))
+    
+    if date_from:
+        queryset = queryset.filter(**{field + '__gte': date_from})
+    if date_to:
+        queryset = queryset.filter(**{field + '__lte': date_to})
+    
+    return queryset, date_from, date_to
+
+
+def filterAvailability(request, doctors):
+    
+    # ?available_by=YYYY-MM-DD --> doctors with a free slot from now until the end of that day
+    # ?sort=available --> soonest free slot first, doctors without one last
+    # (both on the next_available_slot indexes)
+    available_by = parse_legacy_date(request.GET.get('available_by'))
+    if available_by:
+        end = timezone.make_aware(datetime.datetime.combine(available_by + datetime.timedelta(days=1), datetime.time.min))
+        doctors = doctors.filter(next_available_slot__gte=timezone.now(), next_available_slot__lt=end)
+    if request.GET.get('sort') == 'available':
+        doctors = doctors.order_by(F('next_available_slot').asc(nulls_last=True), 'doctor_id')
+    
+    return doctors
+
+
+
+# One number, with optional thousands separators; a currency around it
+# ("Tk. 500", "Rs.1200", "500/-") is skipped
+PRICE_NUMBER = re.compile(r'\d[\d,]*(?:\.\d+)?')
+
+
+def parse_legacy_price(value, max_digits=10):
+    """
+    Read a price typed as free text ("500", "500 tk", "Tk. 1,200.50"). None if
+    it can't be read: no number, more than one ("500-700"), or more than
+    max_digits digits (the price columns' DecimalField).
+    """
+    
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        return value
+    
+    numbers = PRICE_NUMBER.findall(str(value))
+    if len(numbers) != 1:
+        return None
+    
+    try:
+        price = Decimal(numbers[0].replace(',', '')).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+    if len(price.as_tuple().digits) > max_digits:
+        return None
+    return price
@@ -1,5 +1,3 @@
-import email
-from multiprocessing import context
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import HttpResponse, HttpResponseRedirect
 # from django.contrib.auth.models import User
@@ -14,18 +12,17 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from datetime import datetime
 import datetime
-from django.contrib.auth.signals import user_logged_in, user_logged_out
-from django.dispatch import receiver
 from django.template.loader import get_template
-from xhtml2pdf import pisa
-from .utils import searchDoctors, searchHospitals, searchDepartmentDoctors, paginateHospitals
+from .utils import searchDoctors, searchHospitals, searchDepartmentDoctors, paginateHospitals, parse_legacy_date
+from . import reference
+from .conditional import conditional_page
+from lifeaid.ratelimit import ratelimit
 from .models import Patient, User
 from doctor.models import Doctor_Information, Appointment,Report, Specimen, Test, Prescription, Prescription_medicine, Prescription_test
 from sslcommerz.models import Payment
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Max
 import re
 from io import BytesIO
-from urllib import response
 from django.core.mail import BadHeaderError, send_mail
 from django.utils.http import urlsafe_base64_encode
 from django.contrib.auth.tokens import default_token_generator
@@ -35,18 +32,29 @@ from django.utils.html import strip_tags
 from django.views.decorators.csrf import csrf_exempt
 
 
-from PIL import Image
 from django.core.files.uploadedfile import UploadedFile
 from django.core.exceptions import ValidationError
 from django.shortcuts import render, redirect
 from django.contrib import messages
 
 # Create your views here.
+def home_validators(request):
+    doctors = Doctor_Information.objects.filter(register_status='Accepted').aggregate(Max('updated_at'), Count('pk'))
+    hospitals = Hospital_Information.objects.aggregate(Max('updated_at'), Count('pk'))
+    return [*doctors.values(), *hospitals.values()]
+
+
+def hospital_validators(request, pk):
+    # Bumped by department, specialization and service changes too
+    return Hospital_Information.objects.filter(hospital_id=pk).values_list('updated_at', flat=True)
+
+
 @csrf_exempt
+@conditional_page(home_validators)
 def hospital_home(request):
     # .order_by('-created_at')[:6]
     doctors = Doctor_Information.objects.filter(register_status='Accepted')
-    hospitals = Hospital_Information.objects.all()
+    hospitals = reference.hospitals()
     context = {'doctors': doctors, 'hospitals': hospitals} 
     return render(request, 'index-2.html', context)
 
@@ -139,7 +147,7 @@ def chat(request, pk):
 @login_required(login_url="login")
 def chat_doctor(request):
     if request.user.is_doctor:
-        doctor = Doctor_Information.objects.get(user=request.user)
+        doctor = request.profile
         patients = Patient.objects.all()
         
     context = {'patients': patients, 'doctor': doctor}
@@ -151,6 +159,7 @@ def pharmacy_shop(request):
     return render(request, 'pharmacy/shop.html')
 
 @csrf_exempt
+@ratelimit('login')
 def login_user(request):
     page = 'patient_login'
     if request.method == 'GET':
@@ -216,7 +225,7 @@ def patient_register(request):
 def patient_dashboard(request):
     if request.user.is_patient:
         # patient = Patient.objects.get(user_id=pk)
-        patient = Patient.objects.get(user=request.user)
+        patient = request.profile
         report = Report.objects.filter(patient=patient)
         prescription = Prescription.objects.filter(patient=patient).order_by('-prescription_id')
         appointments = Appointment.objects.filter(patient=patient).filter(Q(appointment_status='pending') | Q(appointment_status='confirmed'))
@@ -250,6 +259,8 @@ def patient_dashboard(request):
 
 def is_valid_image(file: UploadedFile) -> bool:
     """Check if the uploaded file is a valid image."""
+    from PIL import Image  # only needed for uploads, slow to import
+
     try:
         # Try to open the image to verify it's valid
         img = Image.open(file)
@@ -264,7 +275,7 @@ def is_valid_image(file: UploadedFile) -> bool:
 @login_required(login_url="login")
 def profile_settings(request):
     if request.user.is_patient:
-        patient = Patient.objects.get(user=request.user)
+        patient = request.profile
         old_featured_image = patient.featured_image
 
         if request.method == 'GET':
@@ -286,7 +297,7 @@ def profile_settings(request):
 
             # Update patient details with POST data
             patient.name = request.POST.get('name')
-            patient.dob = request.POST.get('dob')
+            patient.dob = parse_legacy_date(request.POST.get('dob'))
             patient.age = request.POST.get('age')
             patient.blood_group = request.POST.get('blood_group')
             patient.phone_number = request.POST.get('phone_number')
@@ -296,8 +307,11 @@ def profile_settings(request):
             patient.history = request.POST.get('history')
             patient.featured_image = featured_image
 
-            # Save updated patient data
-            patient.save()
+            # Save updated patient data (only what the form edits: the
+            # profile may be a cached copy, hospital/middleware.py)
+            patient.save(update_fields=[
+                'name', 'dob', 'age', 'blood_group', 'phone_number', 'address', 'weight', 'nid', 'history', 'featured_image',
+            ])
             messages.success(request, 'Profile Settings Changed! 🎉')
             print(f"✅ Profile updated successfully for user: {request.user.username}")
             return redirect('patient-dashboard')
@@ -310,7 +324,7 @@ def profile_settings(request):
 def search(request):
     if request.user.is_authenticated and request.user.is_patient:
         # patient = Patient.objects.get(user_id=pk)
-        patient = Patient.objects.get(user=request.user)
+        patient = request.profile
         doctors = Doctor_Information.objects.filter(register_status='Accepted')
         
         doctors, search_query = searchDoctors(request)
@@ -333,9 +347,8 @@ def multiple_hospital(request):
         
         if request.user.is_patient:
             # patient = Patient.objects.get(user_id=pk)
-            patient = Patient.objects.get(user=request.user)
+            patient = request.profile
             doctors = Doctor_Information.objects.all()
-            hospitals = Hospital_Information.objects.all()
             
             hospitals, search_query = searchHospitals(request)
             
@@ -346,8 +359,7 @@ def multiple_hospital(request):
             return render(request, 'multiple-hospital.html', context)
         
         elif request.user.is_doctor:
-            doctor = Doctor_Information.objects.get(user=request.user)
-            hospitals = Hospital_Information.objects.all()
+            doctor = request.profile
             
             hospitals, search_query = searchHospitals(request)
             
@@ -360,18 +372,18 @@ def multiple_hospital(request):
     
 @csrf_exempt    
 @login_required(login_url="login")
+@conditional_page(hospital_validators)
 def hospital_profile(request, pk):
     
     if request.user.is_authenticated: 
         
         if request.user.is_patient:
-            patient = Patient.objects.get(user=request.user)
-            doctors = Doctor_Information.objects.all()
-            hospitals = Hospital_Information.objects.get(hospital_id=pk)
+            patient = request.profile
+            hospitals = reference.hospital(pk)
         
-            departments = hospital_department.objects.filter(hospital=hospitals)
-            specializations = specialization.objects.filter(hospital=hospitals)
-            services = service.objects.filter(hospital=hospitals)
+            departments = reference.hospital_departments(pk)
+            specializations = reference.hospital_specializations(pk)
+            services = reference.hospital_services(pk)
             
             # department_list = None
             # for d in departments:
@@ -382,17 +394,17 @@ def hospital_profile(request, pk):
             #     vald = vald.replace(",", "")
             #     department_list = vald.split()
             
-            context = {'patient': patient, 'doctors': doctors, 'hospitals': hospitals, 'departments': departments, 'specializations': specializations, 'services': services}
+            context = {'patient': patient, 'hospitals': hospitals, 'departments': departments, 'specializations': specializations, 'services': services}
             return render(request, 'hospital-profile.html', context)
         
         elif request.user.is_doctor:
            
-            doctor = Doctor_Information.objects.get(user=request.user)
-            hospitals = Hospital_Information.objects.get(hospital_id=pk)
+            doctor = request.profile
+            hospitals = reference.hospital(pk)
             
-            departments = hospital_department.objects.filter(hospital=hospitals)
-            specializations = specialization.objects.filter(hospital=hospitals)
-            services = service.objects.filter(hospital=hospitals)
+            departments = reference.hospital_departments(pk)
+            specializations = reference.hospital_specializations(pk)
+            services = reference.hospital_services(pk)
             
             context = {'doctor': doctor, 'hospitals': hospitals, 'departments': departments, 'specializations': specializations, 'services': services}
             return render(request, 'hospital-profile.html', context)
@@ -407,24 +419,25 @@ def data_table(request):
 
 @csrf_exempt
 @login_required(login_url="login")
+@conditional_page(hospital_validators)
 def hospital_department_list(request, pk):
     if request.user.is_authenticated: 
         
         if request.user.is_patient:
             # patient = Patient.objects.get(user_id=pk)
-            patient = Patient.objects.get(user=request.user)
+            patient = request.profile
             doctors = Doctor_Information.objects.all()
             
-            hospitals = Hospital_Information.objects.get(hospital_id=pk)
-            departments = hospital_department.objects.filter(hospital=hospitals)
+            hospitals = reference.hospital(pk)
+            departments = reference.hospital_departments(pk)
         
             context = {'patient': patient, 'doctors': doctors, 'hospitals': hospitals, 'departments': departments}
             return render(request, 'hospital-department.html', context)
         
         elif request.user.is_doctor:
-            doctor = Doctor_Information.objects.get(user=request.user)
-            hospitals = Hospital_Information.objects.get(hospital_id=pk)
-            departments = hospital_department.objects.filter(hospital=hospitals)
+            doctor = request.profile
+            hospitals = reference.hospital(pk)
+            departments = reference.hospital_departments(pk)
             
             context = {'doctor': doctor, 'hospitals': hospitals, 'departments': departments}
             return render(request, 'hospital-department.html', context)
@@ -438,7 +451,7 @@ def hospital_department_list(request, pk):
 def hospital_doctor_list(request, pk):
     if request.user.is_authenticated and request.user.is_patient:
         # patient = Patient.objects.get(user_id=pk)
-        patient = Patient.objects.get(user=request.user)
+        patient = request.profile
         departments = hospital_department.objects.get(hospital_department_id=pk)
         doctors = Doctor_Information.objects.filter(department_name=departments)
         
@@ -450,7 +463,7 @@ def hospital_doctor_list(request, pk):
     elif request.user.is_authenticated and request.user.is_doctor:
         # patient = Patient.objects.get(user_id=pk)
         
-        doctor = Doctor_Information.objects.get(user=request.user)
+        doctor = request.profile
         departments = hospital_department.objects.get(hospital_department_id=pk)
         
         doctors = Doctor_Information.objects.filter(department_name=departments)
@@ -479,7 +492,7 @@ def hospital_doctor_register(request, pk):
             print("👨‍⚕️ User is identified as a doctor.")
             
             try:
-                doctor = Doctor_Information.objects.get(user=request.user)
+                doctor = request.profile
                 print(f"🔍 Retrieved Doctor Information: {doctor}")
             except Doctor_Information.DoesNotExist:
                 print("❌ Error: Doctor_Information does not exist for the authenticated user.")
@@ -579,7 +592,7 @@ def testing(request):
 @login_required(login_url="login")
 def view_report(request,pk):
     if request.user.is_patient:
-        patient = Patient.objects.get(user=request.user)
+        patient = request.profile
         report = Report.objects.filter(report_id=pk)
         specimen = Specimen.objects.filter(report__in=report)
         test = Test.objects.filter(report__in=report)
@@ -599,7 +612,7 @@ def test_cart(request):
 def test_single(request,pk):
      if request.user.is_authenticated and request.user.is_patient:
          
-        patient = Patient.objects.get(user=request.user)
+        patient = request.profile
         Perscription_test = Perscription_test.objects.get(test_id=pk)
         carts = testCart.objects.filter(user=request.user, purchased=False)
         
@@ -615,7 +628,7 @@ def test_single(request,pk):
 def test_add_to_cart(request, pk, pk2):
     if request.user.is_authenticated and request.user.is_patient:
          
-        patient = Patient.objects.get(user=request.user)
+        patient = request.profile
         test_information = Test_Information.objects.get(test_id=pk2)
         prescription = Prescription.objects.filter(prescription_id=pk)
 
@@ -649,10 +662,10 @@ def test_cart(request, pk):
         
         prescription = Prescription.objects.filter(prescription_id=pk)
         
-        patient = Patient.objects.get(user=request.user)
+        patient = request.profile
         prescription_test = Prescription_test.objects.all()
-        test_carts = testCart.objects.filter(user=request.user, purchased=False)
-        test_orders = testOrder.objects.filter(user=request.user, ordered=False)
+        test_carts = testCart.objects.filter(user=request.user, purchased=False).select_related('item')
+        test_orders = testOrder.objects.filter(user=request.user, ordered=False).with_totals().select_related('user__patient')
         
         if test_carts.exists() and test_orders.exists():
             test_order = test_orders[0]
@@ -674,7 +687,7 @@ def test_remove_cart(request, pk):
     if request.user.is_authenticated and request.user.is_patient:
         item = Prescription_test.objects.get(test_id=pk)
 
-        patient = Patient.objects.get(user=request.user)
+        patient = request.profile
         prescription = Prescription.objects.filter(prescription_id=pk)
         prescription_medicine = Prescription_medicine.objects.filter(prescription__in=prescription)
         prescription_test = Prescription_test.objects.filter(prescription__in=prescription)
@@ -708,7 +721,7 @@ def test_remove_cart(request, pk):
 def prescription_view(request, pk):
     if request.user.is_patient:
         try:
-            patient = Patient.objects.get(user=request.user)
+            patient = request.profile
             print("👤 Patient retrieved:", patient)
         except Patient.DoesNotExist:
             print("❌ Error: Patient profile not found for user:", request.user)
@@ -743,6 +756,8 @@ def prescription_view(request, pk):
     
 @csrf_exempt
 def render_to_pdf(template_src, context_dict={}):
+    from xhtml2pdf import pisa  # takes ~0.5s to import; only the PDF views need it
+
     template=get_template(template_src)
     html=template.render(context_dict)
     result=BytesIO()
@@ -771,7 +786,7 @@ def render_to_pdf(template_src, context_dict={}):
 @csrf_exempt
 def prescription_pdf(request,pk):
  if request.user.is_patient:
-    patient = Patient.objects.get(user=request.user)
+    patient = request.profile
     prescription = Prescription.objects.get(prescription_id=pk)
     prescription_medicine = Prescription_medicine.objects.filter(prescription=prescription)
     prescription_test = Prescription_test.objects.filter(prescription=prescription)
@@ -811,17 +826,6 @@ def delete_report(request,pk):
         messages.error(request, 'Not Authorized')
         return render(request, 'patient-login.html')
 
-@csrf_exempt
-@receiver(user_logged_in)
-def got_online(sender, user, request, **kwargs):    
-    user.login_status = True
-    user.save()
-
-@csrf_exempt
-@receiver(user_logged_out)
-def got_offline(sender, user, request, **kwargs):   
-    user.login_status = False
-    user.save()
     
 
 
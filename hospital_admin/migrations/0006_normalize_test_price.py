@@ -0,0 +1,62 @@
+# Rewrites Test_Information.test_price (free text) to plain decimal strings so
+# that the following migration can turn it into a DecimalField. Values that
+# can't be read as a price are cleared rather than failing the migration.
+
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+
+
+BATCH_SIZE = 500
+
+# One number, with optional thousands separators; a currency around it is skipped
+PRICE_NUMBER = re.compile(r'\d[\d,]*(?:\.\d+)?')
+
+
+def parse_legacy_price(value):
+    # Written out here rather than imported from hospital/utils.py, so this
+    # migration can't change with the app. Several numbers ("500-700") or
+    # more digits than the DecimalField's max_digits=10 can't be read.
+    numbers = PRICE_NUMBER.findall(value or '')
+    if len(numbers) != 1:
+        return None
+
+    try:
+        price = Decimal(numbers[0].replace(',', '')).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+    if len(price.as_tuple().digits) > 10:
+        return None
+    return price
+
+
+def normalize_prices(apps, schema_editor):
+    Test_Information = apps.get_model('hospital_admin', 'Test_Information')
+    rows = Test_Information.objects.only('pk', 'test_price').order_by('pk')
+    
+    changed = []
+    for test in rows.iterator(chunk_size=BATCH_SIZE):
+        parsed = parse_legacy_price(test.test_price)
+        normalized = str(parsed) if parsed is not None else None
+        if test.test_price != normalized:
+            test.test_price = normalized
+            changed.append(test)
+        
+        if len(changed) >= BATCH_SIZE:
+            Test_Information.objects.bulk_update(changed, ['test_price'])
+            changed = []
+    
+    if changed:
+        Test_Information.objects.bulk_update(changed, ['test_price'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital_admin', '0005_admin_information_hospital'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-19 15:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital_admin', '0006_normalize_test_price'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='test_information',
+            name='test_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
@@ -50,6 +50,7 @@ class hospital_department(models.Model):
     # doctor = models.ForeignKey(Doctor_Information, on_delete=models.CASCADE, null=True, blank=True)
     hospital = models.ForeignKey(Hospital_Information, on_delete=models.CASCADE, null=True, blank=True)
     featured_image = models.ImageField(upload_to='departments/', default='departments/default.png', null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         val1 = str(self.hospital_department_name)
@@ -87,7 +88,7 @@ class service(models.Model):
 class Test_Information(models.Model):
     test_id = models.AutoField(primary_key=True)
     test_name = models.CharField(max_length=200, null=True, blank=True)
-    test_price = models.CharField(max_length=200, null=True, blank=True)
+    test_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
 
     def __str__(self):
@@ -1,7 +1,3 @@
-import email
-from email.mime import image
-from multiprocessing import context
-from unicodedata import name
 from django.shortcuts import render, redirect
 from django.http import HttpResponse
 from django.contrib.auth.decorators import login_required
@@ -18,8 +14,7 @@ from sslcommerz.models import Payment
 from .forms import AdminUserCreationForm, LabWorkerCreationForm, EditHospitalForm, EditEmergencyForm,AdminForm , PharmacistCreationForm 
 
 from .models import Admin_Information,specialization,service,hospital_department, Clinical_Laboratory_Technician, Test_Information
-import random,re
-import string
+import re
 from django.db.models import  Count
 from datetime import datetime
 import datetime
@@ -30,6 +25,10 @@ from django.template.loader import render_to_string
 from django.http import HttpResponse
 from django.utils.html import strip_tags
 from .utils import searchMedicines
+from hospital.utils import parse_legacy_date, parse_legacy_price, filterDateRange
+from hospital.identifiers import next_identifier
+from hospital import reference
+from lifeaid.ratelimit import ratelimit
 
 # Create your views here.
 
@@ -39,7 +38,7 @@ from .utils import searchMedicines
 def admin_dashboard(request):
     # admin = Admin_Information.objects.get(user_id=pk)
     if request.user.is_hospital_admin:
-        user = Admin_Information.objects.get(user=request.user)
+        user = request.profile
         total_patient_count = Patient.objects.annotate(count=Count('patient_id'))
         total_doctor_count = Doctor_Information.objects.annotate(count=Count('doctor_id'))
         total_pharmacist_count = Pharmacist.objects.annotate(count=Count('pharmacist_id'))
@@ -104,6 +103,7 @@ def logoutAdmin(request):
             
 @csrf_exempt
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
+@ratelimit('login')
 def admin_login(request):
     if request.method == 'GET':
         return render(request, 'hospital_admin/login.html')
@@ -187,7 +187,7 @@ def lock_screen(request):
 @login_required(login_url='admin_login')
 def patient_list(request):
     if request.user.is_hospital_admin:
-        user = Admin_Information.objects.get(user=request.user)
+        user = request.profile
     patients = Patient.objects.all()
     return render(request, 'hospital_admin/patient-list.html', {'all': patients, 'admin': user})
 
@@ -209,7 +209,7 @@ def transactions_list(request):
 @login_required(login_url='admin_login')
 def emergency_details(request):
     user = Admin_Information.objects.get(user=request.user)
-    hospitals = Hospital_Information.objects.all()
+    hospitals = reference.hospitals()
     context = { 'admin': user, 'all': hospitals}
     return render(request, 'hospital_admin/emergency.html', context)
 
@@ -217,7 +217,7 @@ def emergency_details(request):
 @login_required(login_url='admin_login')
 def hospital_list(request):
     user = Admin_Information.objects.get(user=request.user)
-    hospitals = Hospital_Information.objects.all()
+    hospitals = reference.hospitals()
     context = { 'admin': user, 'hospitals': hospitals}
     return render(request, 'hospital_admin/hospital-list.html', context)
 
@@ -257,7 +257,7 @@ def hospital_admin_profile(request, pk):
 @login_required(login_url='admin_login')
 def add_hospital(request):
     if  request.user.is_hospital_admin:
-        user = Admin_Information.objects.get(user=request.user)
+        user = request.profile
 
         if request.method == 'POST':
             hospital = Hospital_Information()
@@ -321,7 +321,7 @@ def add_hospital(request):
 @login_required(login_url='admin_login')
 def edit_hospital(request, pk):
     if  request.user.is_hospital_admin:
-        user = Admin_Information.objects.get(user=request.user)
+        user = request.profile
         hospital = Hospital_Information.objects.get(hospital_id=pk)
         old_featured_image = hospital.featured_image
 
@@ -427,19 +427,11 @@ def delete_hospital(request, pk):
 	return redirect('hospital-list')
 
 
-@login_required(login_url='admin_login')
-def generate_random_invoice():
-    N = 4
-    string_var = ""
-    string_var = ''.join(random.choices(string.digits, k=N))
-    string_var = "#INV-" + string_var
-    return string_var
-
 @csrf_exempt
 @login_required(login_url='admin_login')
 def create_invoice(request, pk):
     if  request.user.is_hospital_admin:
-        user = Admin_Information.objects.get(user=request.user)
+        user = request.profile
 
     patient = Patient.objects.get(patient_id=pk)
 
@@ -452,7 +444,7 @@ def create_invoice(request, pk):
         invoice.currency_amount = int(consulation_fee) + int(report_fee)
         invoice.consulation_fee = consulation_fee
         invoice.report_fee = report_fee
-        invoice.invoice_number = generate_random_invoice()
+        invoice.invoice_number = next_identifier('invoice')
         invoice.name = patient
         invoice.status = 'Pending'
     
@@ -463,19 +455,11 @@ def create_invoice(request, pk):
     return render(request, 'hospital_admin/create-invoice.html', context)
 
 
-@login_required(login_url='admin_login')
-def generate_random_specimen():
-    N = 4
-    string_var = ""
-    string_var = ''.join(random.choices(string.digits, k=N))
-    string_var = "#INV-" + string_var
-    return string_var
-
 @login_required(login_url='admin-login')
 @csrf_exempt
 def create_report(request, pk):
     if request.user.is_labworker:
-        lab_workers = Clinical_Laboratory_Technician.objects.get(user=request.user)
+        lab_workers = request.profile
         prescription =Prescription.objects.get(prescription_id=pk)
         patient = Patient.objects.get(patient_id=prescription.patient_id)
         doctor = Doctor_Information.objects.get(doctor_id=prescription.doctor_id)
@@ -498,7 +482,7 @@ def create_report(request, pk):
             # # Save to report table
             # report.test_name = test_name
             # report.result = result
-            report.delivery_date = delivery_date
+            report.delivery_date = parse_legacy_date(delivery_date)
             report.other_information = other_information
             # #report.specimen_id =generate_random_specimen()
             # report.specimen_type = specimen_type
@@ -512,8 +496,8 @@ def create_report(request, pk):
             for i in range(len(specimen_type)):
                 specimens = Specimen(report=report)
                 specimens.specimen_type = specimen_type[i]
-                specimens.collection_date = collection_date[i]
-                specimens.receiving_date = receiving_date[i]
+                specimens.collection_date = parse_legacy_date(collection_date[i])
+                specimens.receiving_date = parse_legacy_date(receiving_date[i])
                 specimens.save()
                 
             for i in range(len(test_name)):
@@ -559,7 +543,7 @@ def create_report(request, pk):
 @login_required(login_url='admin_login')
 def add_pharmacist(request):
     if request.user.is_hospital_admin:
-        user = Admin_Information.objects.get(user=request.user)
+        user = request.profile
         form = PharmacistCreationForm()
      
         if request.method == 'POST':
@@ -586,9 +570,9 @@ def add_pharmacist(request):
 def medicine_list(request):
     if request.user.is_authenticated:
         if request.user.is_pharmacist:
-            pharmacist = Pharmacist.objects.get(user=request.user)
+            pharmacist = request.profile
             medicine = Medicine.objects.all()
-            orders = Order.objects.filter(user=request.user, ordered=False)
+            orders = Order.objects.filter(user=request.user, ordered=False).with_totals()
             carts = Cart.objects.filter(user=request.user, purchased=False)
             
             medicine, search_query = searchMedicines(request)
@@ -610,19 +594,11 @@ def medicine_list(request):
                 return render(request, 'hospital_admin/medicine-list.html',context)
                 
 
-@login_required(login_url='admin_login')
-def generate_random_medicine_ID():
-    N = 4
-    string_var = ""
-    string_var = ''.join(random.choices(string.digits, k=N))
-    string_var = "#M-" + string_var
-    return string_var
-
 @csrf_exempt
 @login_required(login_url='admin_login')
 def add_medicine(request):
     if request.user.is_pharmacist:
-     user = Pharmacist.objects.get(user=request.user)
+     user = request.profile
      
     if request.method == 'POST':
        medicine = Medicine()
@@ -651,7 +627,7 @@ def add_medicine(request):
        medicine.price = price
        medicine.featured_image = featured_image
        medicine.stock_quantity = 80
-       #medicine.medicine_id = generate_random_medicine_ID()
+       medicine.medicine_id = next_identifier('medicine')
        
        medicine.save()
        
@@ -663,7 +639,7 @@ def add_medicine(request):
 @login_required(login_url='admin_login')
 def edit_medicine(request, pk):
     if request.user.is_pharmacist:
-        user = Pharmacist.objects.get(user=request.user)
+        user = request.profile
         
         medicine = Medicine.objects.get(serial_number=pk)
         old_medicine_image = medicine.featured_image
@@ -692,7 +668,6 @@ def edit_medicine(request, pk):
                 medicine.price = price
                 medicine.featured_image = featured_image
                 medicine.stock_quantity = 80
-                #medicine.medicine_id = generate_random_medicine_ID()
             
                 medicine.save()
             
@@ -705,7 +680,7 @@ def edit_medicine(request, pk):
 @login_required(login_url='admin_login')
 def delete_medicine(request, pk):
     if request.user.is_pharmacist:
-        user = Pharmacist.objects.get(user=request.user)
+        user = request.profile
         medicine = Medicine.objects.get(serial_number=pk)
         medicine.delete()
         return redirect('medicine-list')
@@ -714,7 +689,7 @@ def delete_medicine(request, pk):
 @login_required(login_url='admin_login')
 def add_lab_worker(request):
     if request.user.is_hospital_admin:
-        user = Admin_Information.objects.get(user=request.user)
+        user = request.profile
         
         form = LabWorkerCreationForm()
      
@@ -741,7 +716,7 @@ def add_lab_worker(request):
 @login_required(login_url='admin_login')
 def view_lab_worker(request):
     if request.user.is_hospital_admin:
-        user = Admin_Information.objects.get(user=request.user)
+        user = request.profile
         lab_workers = Clinical_Laboratory_Technician.objects.all()
         
     return render(request, 'hospital_admin/lab-worker-list.html', {'lab_workers': lab_workers, 'admin': user})
@@ -750,7 +725,7 @@ def view_lab_worker(request):
 @login_required(login_url='admin_login')
 def view_pharmacist(request):
     if request.user.is_hospital_admin:
-        user = Admin_Information.objects.get(user=request.user)
+        user = request.profile
         pharmcists = Pharmacist.objects.all()
         
     return render(request, 'hospital_admin/pharmacist-list.html', {'pharmacist': pharmcists, 'admin': user})
@@ -759,7 +734,7 @@ def view_pharmacist(request):
 @login_required(login_url='admin_login')
 def edit_lab_worker(request, pk):
     if request.user.is_hospital_admin:
-        user = Admin_Information.objects.get(user=request.user)
+        user = request.profile
         lab_worker = Clinical_Laboratory_Technician.objects.get(technician_id=pk)
         
         if request.method == 'POST':
@@ -790,7 +765,7 @@ def edit_lab_worker(request, pk):
 @login_required(login_url='admin_login')
 def edit_pharmacist(request, pk):
     if request.user.is_hospital_admin:
-        user = Admin_Information.objects.get(user=request.user)
+        user = request.profile
         pharmacist = Pharmacist.objects.get(pharmacist_id=pk)
         
         if request.method == 'POST':
@@ -828,7 +803,7 @@ def department_image_list(request,pk):
 @login_required(login_url='admin_login')
 def register_doctor_list(request):
     if request.user.is_hospital_admin:
-        user = Admin_Information.objects.get(user=request.user)
+        user = request.profile
         doctors = Doctor_Information.objects.filter(register_status='Accepted')
     return render(request, 'hospital_admin/register-doctor-list.html', {'doctors': doctors, 'admin': user})
 
@@ -836,7 +811,7 @@ def register_doctor_list(request):
 @login_required(login_url='admin_login')
 def pending_doctor_list(request):
     if request.user.is_hospital_admin:
-        user = Admin_Information.objects.get(user=request.user)
+        user = request.profile
     doctors = Doctor_Information.objects.filter(register_status='Pending')
     return render(request, 'hospital_admin/Pending-doctor-list.html', {'all': doctors, 'admin': user})
 
@@ -967,7 +942,7 @@ def labworker_dashboard(request):
     if request.user.is_authenticated:
         if request.user.is_labworker:
             
-            lab_workers = Clinical_Laboratory_Technician.objects.get(user=request.user)
+            lab_workers = request.profile
             doctor = Doctor_Information.objects.all()
             context = {'doctor': doctor,'lab_workers':lab_workers}
             return render(request, 'hospital_admin/labworker-dashboard.html',context)
@@ -977,7 +952,7 @@ def labworker_dashboard(request):
 def mypatient_list(request):
     if request.user.is_authenticated:
         if request.user.is_labworker:
-            lab_workers = Clinical_Laboratory_Technician.objects.get(user=request.user)
+            lab_workers = request.profile
             #report= Report.objects.all()
             patient = Patient.objects.all()
             context = {'patient': patient,'lab_workers':lab_workers}
@@ -988,7 +963,7 @@ def mypatient_list(request):
 def prescription_list(request,pk):
     if request.user.is_authenticated:
         if request.user.is_labworker:
-            lab_workers = Clinical_Laboratory_Technician.objects.get(user=request.user)
+            lab_workers = request.profile
             patient = Patient.objects.get(patient_id=pk)
             prescription = Prescription.objects.filter(patient=patient)
             context = {'prescription': prescription,'lab_workers':lab_workers,'patient':patient}
@@ -998,14 +973,14 @@ def prescription_list(request,pk):
 @login_required(login_url='admin-login')
 def add_test(request):
     if request.user.is_labworker:
-        lab_workers = Clinical_Laboratory_Technician.objects.get(user=request.user)
+        lab_workers = request.profile
 
     if request.method == 'POST':
         tests=Test_Information()
         test_name = request.POST['test_name']
         test_price = request.POST['test_price']
         tests.test_name = test_name
-        tests.test_price = test_price
+        tests.test_price = parse_legacy_price(test_price)
 
         tests.save()
 
@@ -1018,8 +993,8 @@ def add_test(request):
 @login_required(login_url='admin-login')
 def test_list(request):
     if request.user.is_labworker:
-        lab_workers = Clinical_Laboratory_Technician.objects.get(user=request.user)
-        test = Test_Information.objects.all()
+        lab_workers = request.profile
+        test = reference.tests()
         context = {'test':test,'lab_workers':lab_workers}
     return render(request, 'hospital_admin/test-list.html',context)
 
@@ -1037,7 +1012,7 @@ def delete_test(request,pk):
 def pharmacist_dashboard(request):
     if request.user.is_authenticated:
         if request.user.is_pharmacist:
-            pharmacist = Pharmacist.objects.get(user=request.user)
+            pharmacist = request.profile
             total_pharmacist_count = Pharmacist.objects.annotate(count=Count('pharmacist_id'))
             total_medicine_count = Medicine.objects.annotate(count=Count('serial_number'))
             total_order_count = Order.objects.annotate(count=Count('orderitems'))
@@ -1057,8 +1032,12 @@ def report_history(request):
     if request.user.is_authenticated:
         if request.user.is_labworker:
 
-            lab_workers = Clinical_Laboratory_Technician.objects.get(user=request.user)
-            report = Report.objects.all()
-            context = {'report':report,'lab_workers':lab_workers}
+            lab_workers = request.profile
+            report = Report.objects.select_related('patient__user', 'doctor__user').order_by('-delivery_date', '-report_id')
+            
+            # ?date_from=&date_to= --> reports delivered in that range
+            report, date_from, date_to = filterDateRange(request, report, 'delivery_date')
+            
+            context = {'report':report,'lab_workers':lab_workers, 'date_from': date_from, 'date_to': date_to}
             return render(request, 'hospital_admin/report-list.html',context)
 
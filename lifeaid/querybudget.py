@@ -0,0 +1,121 @@
+"""
+Query budgets: how many SQL queries each view (by URL name) may run.
+
+The budgets live in query_budgets.json at the project root:
+
+    {"doctor-profile": {"queries": 9, "time_ms": 50}, ...}
+
+QueryBudgetMiddleware (on when QUERY_BUDGETS=on, e.g. on staging) counts the
+queries and SQL time of every request, adds X-Query-Count / X-Query-Time-Ms
+headers and logs a warning when a view goes over its budget or runs the same
+SQL shape over and over (an N+1). Tests use QueryBudgetMixin from
+lifeaid.testing, which fails instead of logging.
+"""
+
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+_placeholder_lists = re.compile(r'\((?:%s|\?)(?:\s*,\s*(?:%s|\?))*\)')
+_numbers = re.compile(r'\b\d+\b')
+
+
+def sql_shape(sql):
+    # Same statement with different parameters (or IN list lengths) -> same shape
+    return _numbers.sub('N', _placeholder_lists.sub('(...)', sql))
+
+
+class QueryRecorder:
+    """
+    Records every query run on any database while the block runs:
+
+        with QueryRecorder() as recorder:
+            client.get(url)
+        recorder.count, recorder.time_ms, recorder.repeated(5)
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc):
+        self._stack.close()
+        return False
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def time_ms(self):
+        return sum(duration for sql, duration in self.queries) * 1000
+
+    def repeated(self, threshold=None):
+        # [(shape, times)] for the SQL shapes run at least threshold times
+        threshold = threshold or settings.QUERY_BUDGET_REPEAT_THRESHOLD
+        shapes = Counter(sql_shape(sql) for sql, duration in self.queries)
+        return [(shape, times) for shape, times in shapes.most_common() if times >= threshold]
+
+
+@lru_cache(maxsize=None)
+def load_budgets(path=None):
+    with open(path or settings.QUERY_BUDGET_FILE) as budget_file:
+        return json.load(budget_file)
+
+
+def budget_problems(url_name, recorder, check_time=True):
+    problems = []
+    budget = load_budgets().get(url_name)
+    if budget is not None:
+        if recorder.count > budget['queries']:
+            problems.append(f"{recorder.count} queries, budget is {budget['queries']}")
+        if check_time and 'time_ms' in budget and recorder.time_ms > budget['time_ms']:
+            problems.append(f"{recorder.time_ms:.1f} ms of SQL, budget is {budget['time_ms']} ms")
+    for shape, times in recorder.repeated():
+        problems.append(f'same query {times} times (N+1?): {shape}')
+    return problems
+
+
+class QueryBudgetMiddleware:
+    # Put it first so session and auth queries are counted too
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGETS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        response['X-Query-Count'] = recorder.count
+        response['X-Query-Time-Ms'] = f'{recorder.time_ms:.1f}'
+
+        match = request.resolver_match
+        if match is not None:
+            for problem in budget_problems(match.url_name, recorder):
+                logger.warning('%s (%s): %s', match.url_name, request.path, problem)
+        return response
@@ -0,0 +1,207 @@
+"""
+Token-bucket rate limits, kept in the shared cache so every worker sees the
+same buckets.
+
+Each scope in RATE_LIMITS ('10/m' = bursts of 10, refilled at 10 a minute)
+gets a bucket per client IP and one per user: the logged-in user, or the
+username being logged in as. Django views use the decorator, which answers
+429 with a Retry-After header:
+
+    @ratelimit('login')
+    def login_user(request): ...
+
+API views are limited by TokenBucketThrottle (REST_FRAMEWORK's
+DEFAULT_THROTTLE_CLASSES) after JWT authentication, so their user bucket
+is the token's user.
+
+A bucket is two cache keys: when it started (the epoch, written once with
+add()) and how many tokens were taken since, which is only ever changed
+with incr/decr. A bucket holds capacity + rate * (now - epoch) - taken
+tokens. When a bucket has been idle long enough to hold more than capacity,
+one request (the one holding a short add() lock) takes the surplus out
+with a single incr. Refused requests give their token back. A request
+costs a get, two add()s and an incr.
+
+So concurrent requests can't take the same token, as long as incr is
+atomic: it is on Redis, memcached and locmem (per process), but not on the
+file or database caches, where the check below warns that the limits can
+be got around. Buckets are started afresh every BUCKET_PERIODS periods,
+which can hand out at most one extra burst.
+"""
+
+import hashlib
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.throttling import BaseThrottle
+
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """'10/m' -> (10, 60): a bucket of 10 tokens, refilled over 60 seconds."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+# Buckets are started afresh (full) this many refill periods after they start
+BUCKET_PERIODS = 10
+
+# Backends whose incr is atomic across the workers that share them
+ATOMIC_INCR_BACKENDS = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+class TokenBucket:
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.capacity, per_seconds = parse_rate(settings.RATE_LIMITS[scope])
+        self.rate = self.capacity / per_seconds  # tokens per second
+        self.ttl = math.ceil(BUCKET_PERIODS * per_seconds)
+
+    def epoch(self, key, now):
+        # The first request to find no bucket starts it; the others use its epoch
+        epoch = cache.get(key)
+        if epoch is None:
+            cache.add(key, now, self.ttl)
+            epoch = cache.get(key, now)
+        return epoch
+
+    def take(self, identity, now=None):
+        """
+        Take a token from identity's bucket. Returns 0 if there was one,
+        otherwise the seconds until there will be.
+        """
+        now = time.time() if now is None else now
+        key = 'rl:%s:%s' % (self.scope, hashlib.md5(str(identity).encode()).hexdigest())
+        epoch = self.epoch(key + ':e', now)
+        # The counter belongs to this epoch, so a new bucket never inherits an old count
+        taken_key = '%s:n:%r' % (key, epoch)
+        cache.add(taken_key, 0, self.ttl)
+
+        try:
+            taken = cache.incr(taken_key)
+        except ValueError:
+            # Evicted since add(): the bucket is full again
+            cache.add(taken_key, 1, self.ttl)
+            return 0
+
+        refilled = self.rate * (now - epoch)
+        surplus = math.floor(refilled - (taken - 1))  # over capacity before this request
+        if surplus > 0 and cache.add(key + ':lock', 1, 5):
+            try:
+                taken = cache.incr(taken_key, surplus)
+            except ValueError:
+                return 0
+            finally:
+                cache.delete(key + ':lock')
+
+        excess = taken - self.capacity - refilled
+        if excess <= 0:
+            return 0
+        cache.decr(taken_key)
+        return excess / self.rate
+
+
+def client_ip(request):
+    # RATE_LIMIT_PROXIES proxies in front of us each add the address they
+    # got the request from to X-Forwarded-For; the client is that many from the end
+    proxies = settings.RATE_LIMIT_PROXIES
+    if proxies:
+        forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def identities(request, user, username=None):
+    found = ['ip:%s' % client_ip(request)]
+    if user is not None and user.is_authenticated:
+        found.append('user:%s' % user.pk)
+    elif username:
+        found.append('username:%s' % username.lower())
+    return found
+
+
+def wait_seconds(scope, found):
+    """Take a token from each bucket; the longest wait if any was empty."""
+    if not settings.RATE_LIMIT_ENABLED:
+        return 0
+    bucket = TokenBucket(scope)
+    now = time.time()
+    return max(bucket.take(identity, now) for identity in found)
+
+
+def too_many_requests(wait):
+    retry_after = max(1, math.ceil(wait))
+    response = HttpResponse('Too many requests, try again in %d seconds.' % retry_after, status=429, content_type='text/plain')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def ratelimit(scope, methods=('POST',)):
+    """
+    Limit a view to the RATE_LIMITS[scope] rate per client IP and per user.
+    Only requests with one of methods count (None for all of them), so the
+    login pages can still be shown.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if methods is None or request.method in methods:
+                wait = wait_seconds(scope, identities(request, getattr(request, 'user', None), request.POST.get('username')))
+                if wait:
+                    return too_many_requests(wait)
+            return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """DRF throttle for the 'api' scope; DRF sends the 429 and Retry-After."""
+
+    scope = 'api'
+
+    def allow_request(self, request, view):
+        self.wait_for = wait_seconds(self.scope, identities(request, request.user, self.username(request)))
+        return not self.wait_for
+
+    def username(self, request):
+        return None
+
+    def wait(self):
+        return self.wait_for
+
+
+class LoginThrottle(TokenBucketThrottle):
+    """For the JWT token endpoint: the 'login' scope, per IP and username."""
+
+    scope = 'login'
+
+    def username(self, request):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        return username if isinstance(username, str) else None
+
+
+@checks.register(checks.Tags.caches)
+def check_cache_backend(app_configs, **kwargs):
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if not settings.RATE_LIMIT_ENABLED or backend in ATOMIC_INCR_BACKENDS:
+        return []
+    return [checks.Warning(
+        "Rate limits need a cache whose incr is atomic; %s's isn't, so "
+        "concurrent requests can get past them." % backend.rsplit('.', 1)[-1],
+        hint="Set CACHE_URL to Redis or memcached (or RATE_LIMIT_ENABLED=off).",
+        id='lifeaid.W001',
+    )]
@@ -0,0 +1,123 @@
+"""
+Two-level cache for small, rarely-changing reference data (hospitals,
+departments, specializations, services, tests).
+
+Values live in the shared cache (CACHES['default']) under a key that includes
+a version number per model they were built from, and each process keeps the
+most recently used REFERENCE_CACHE_LOCAL_SIZE of them in memory. A local copy
+is used without asking the shared cache for REFERENCE_CACHE_LOCAL_SECONDS;
+after that the versions are read again (one get_many) and the copy is kept
+if none changed. invalidate(Model) bumps the model's version, so other
+processes see a change within REFERENCE_CACHE_LOCAL_SECONDS and this process
+sees it at once: its local copies built from that model are dropped, the
+others are kept.
+
+Cached values are shared between requests: treat them as read-only and load
+the object again before changing it.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+VERSION_KEY = 'ref:version:%s'
+
+
+def version_key(model):
+    return VERSION_KEY % model._meta.label_lower
+
+
+class ReferenceCache:
+
+    def __init__(self):
+        self._local = OrderedDict()  # key -> (version keys, versions, value, fresh_until)
+        self._lock = threading.Lock()
+        self._invalidations = 0
+        self.reset_stats()
+
+    def get(self, key, loader, models):
+        """
+        Return the value cached under key, calling loader() to build it if
+        neither tier has a copy that is current for every model in models.
+        """
+        now = time.monotonic()
+        with self._lock:
+            invalidations = self._invalidations
+            entry = self._local.get(key)
+            if entry is not None:
+                self._local.move_to_end(key)
+                if now < entry[3]:
+                    self.local_hits += 1
+                    return entry[2]
+
+        keys = tuple(version_key(model) for model in models)
+        versions = self.versions(models)
+        if entry is not None and entry[1] == versions:
+            value, counter = entry[2], 'local_hits'
+        else:
+            shared_key = 'ref:%s:%s' % (key, '.'.join(map(str, versions)))
+            value, counter = cache.get(shared_key), 'shared_hits'
+            if value is None:
+                value, counter = loader(), 'misses'
+                cache.set(shared_key, value, settings.REFERENCE_CACHE_SECONDS)
+
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            # Don't keep what was read before an invalidate() in this process
+            if invalidations == self._invalidations:
+                self._remember(key, (keys, versions, value, now + settings.REFERENCE_CACHE_LOCAL_SECONDS))
+        return value
+
+    def versions(self, models):
+        keys = [version_key(model) for model in models]
+        found = cache.get_many(keys)
+        for key in keys:
+            if key not in found:
+                # Start from the clock, not 1, so an evicted version never
+                # matches entries written before it was lost
+                cache.add(key, time.time_ns(), None)
+                found[key] = cache.get(key)
+        return tuple(found[key] for key in keys)
+
+    def invalidate(self, model):
+        key = version_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+        # Only this model's entries; the rest stay current
+        with self._lock:
+            self._invalidations += 1
+            for stale in [name for name, entry in self._local.items() if key in entry[0]]:
+                del self._local[stale]
+
+    def _remember(self, key, entry):
+        # Call with the lock held
+        self._local[key] = entry
+        self._local.move_to_end(key)
+        while len(self._local) > settings.REFERENCE_CACHE_LOCAL_SIZE:
+            self._local.popitem(last=False)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def reset_stats(self):
+        with self._lock:
+            self.local_hits = self.shared_hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'local_hits': self.local_hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'local_entries': len(self._local),
+            }
+
+
+reference_cache = ReferenceCache()
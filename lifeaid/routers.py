@@ -0,0 +1,121 @@
+"""
+Read replica routing for reporting workloads.
+
+Reads go to the 'replica' database only inside use_replica(): the
+ReplicaMiddleware turns it on for GET requests to the views named in
+DATABASE_REPLICA_VIEWS, and management commands can wrap their read-only
+work in it. Everything else (and every write) stays on 'default'.
+
+Read-your-writes: once a request writes through the router the browser is
+pinned to 'default' for REPLICA_PIN_SECONDS, so the user's next pages don't
+read from a replica that hasn't caught up yet. The pin is a signed cookie
+rather than a session key, so it doesn't make the session save. Background
+bookkeeping that happens to run during a request (presence.flush) writes
+inside unpinned() and doesn't pin anyone.
+"""
+
+from contextlib import ContextDecorator, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+
+REPLICA = 'replica'
+PIN_COOKIE = 'db_pinned'
+
+# Apps whose rows must never be read from a stale copy
+PRIMARY_ONLY_APPS = {'sessions'}
+
+_use_replica = ContextVar('use_replica', default=False)
+_writes = ContextVar('writes', default=None)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+class use_replica(ContextDecorator):
+    """
+    Send reads to the replica for the duration of the block:
+
+        with use_replica():
+            rows = list(Report.objects.all())
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.tokens = []
+
+    def __enter__(self):
+        self.tokens.append(_use_replica.set(self.enabled))
+        return self
+
+    def __exit__(self, *exc):
+        _use_replica.reset(self.tokens.pop())
+        return False
+
+
+@contextmanager
+def unpinned():
+    """Writes in the block (or decorated function) don't pin the request's user to the primary."""
+    token = _writes.set(None)
+    try:
+        yield
+    finally:
+        _writes.reset(token)
+
+
+def pinned(request):
+    return request.get_signed_cookie(PIN_COOKIE, None, salt=PIN_COOKIE, max_age=settings.REPLICA_PIN_SECONDS) is not None
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and model._meta.app_label not in PRIMARY_ONLY_APPS and replica_configured():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        writes = _writes.get()
+        if writes is not None and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            writes.append(model._meta.label)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary
+        return db != REPLICA
+
+
+class ReplicaMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = []
+        writes_token = _writes.set(writes)
+        request._replica_token = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if request._replica_token is not None:
+                _use_replica.reset(request._replica_token)
+            _writes.reset(writes_token)
+
+        if writes and replica_configured():
+            response.set_signed_cookie(
+                PIN_COOKIE, '1', salt=PIN_COOKIE, max_age=settings.REPLICA_PIN_SECONDS,
+                secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.method in ('GET', 'HEAD')
+                and request.resolver_match.url_name in settings.DATABASE_REPLICA_VIEWS
+                and not pinned(request)):
+            request._replica_token = _use_replica.set(True)
+        return None
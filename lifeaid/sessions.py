@@ -0,0 +1,37 @@
+"""
+Session engine (SESSION_ENGINE = 'lifeaid.sessions') for sliding sessions
+without a database write on every request.
+
+Like cached_db, sessions are read from the cache and fall back to the
+database. SESSION_SAVE_EVERY_REQUEST still refreshes the cookie and the cache
+entry on every request, which is what keeps the idle timeout sliding, but the
+django_session row is only written when the session data changed or its
+stored expiry has less than SESSION_REFRESH_FRACTION of SESSION_COOKIE_AGE
+left. If the cache entry is lost the row is never valid for longer than the
+idle timeout, only for less.
+"""
+
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+
+# When the django_session row expires, kept inside the session data
+DB_EXPIRY_KEY = '_db_expiry'
+
+
+class SessionStore(CachedDBStore):
+
+    def save(self, must_create=False):
+        if must_create or self.session_key is None or self.modified or self.db_expiry_due():
+            self._session[DB_EXPIRY_KEY] = self.get_expiry_date().timestamp()
+            super().save(must_create)
+        else:
+            self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+
+    def db_expiry_due(self):
+        stored = self._session.get(DB_EXPIRY_KEY)
+        if stored is None:
+            return True
+        return stored - time.time() < self.get_expiry_age() * settings.SESSION_REFRESH_FRACTION
@@ -0,0 +1,59 @@
+"""
+SQLite backend with the connection tuning the site needs under concurrent
+writers (chat sends, session saves, logins).
+
+Use it as the ENGINE ('lifeaid.sqlite3') and configure it from OPTIONS:
+
+    'OPTIONS': {
+        'pragmas': {'journal_mode': 'wal', 'synchronous': 'normal', ...},
+        'transaction_mode': 'IMMEDIATE',
+    }
+
+'pragmas' are run on every new connection. 'transaction_mode' is what
+atomic() blocks BEGIN with; IMMEDIATE takes the write lock up front, so two
+transactions never both read and then fail to upgrade to a writer with
+"database is locked" (busy_timeout can't help in that case).
+
+IMMEDIATE applies to every atomic() block, so a block that only reads still
+waits for the write lock. Queries outside atomic() run in autocommit and
+never take it, and every atomic() block in the site writes (the app's own,
+and Django's around saves, deletes and get_or_create). Keep read-only code
+out of atomic() so it stays that way.
+
+journal_mode=wal is recorded in the database file's header, so the first
+connection rewrites the header of the db.sqlite3 in the repository: work on
+a copy (see DATABASE_URL in .env.example) to keep it unchanged.
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        options = dict(self.settings_dict['OPTIONS'])
+        self.pragmas = options.pop('pragmas', {})
+        self.transaction_mode = (options.pop('transaction_mode', None) or 'DEFERRED').upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"settings.DATABASES transaction_mode must be one of {', '.join(TRANSACTION_MODES)}")
+
+        settings_dict = self.settings_dict
+        self.settings_dict = {**settings_dict, 'OPTIONS': options}
+        try:
+            return super().get_connection_params()
+        finally:
+            self.settings_dict = settings_dict
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
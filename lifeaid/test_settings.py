@@ -0,0 +1,11 @@
+"""
+Settings for the test suites. `manage.py test` picks them by itself; with
+another runner set DJANGO_SETTINGS_MODULE=lifeaid.test_settings (pytest-django:
+--ds=lifeaid.test_settings).
+"""
+
+from .settings import *  # noqa: F401,F403
+
+
+# A private in-memory cache, so runs never see each other's entries or the site's
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
@@ -0,0 +1,51 @@
+"""
+Shared helpers for the app test suites (tests.py in each app).
+"""
+
+import re
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+from .querybudget import QueryRecorder, budget_problems, load_budgets
+
+
+class QueryPlanMixin:
+    """
+    TestCase mixin that runs EXPLAIN QUERY PLAN on a queryset and fails if
+    SQLite has to scan the whole table instead of searching an index.
+    """
+
+    def assertUsesIndex(self, queryset):
+        if connection.vendor != 'sqlite':
+            self.skipTest('query plan assertions are written for SQLite')
+
+        table = queryset.model._meta.db_table
+        plan = queryset.explain()
+        full_scan = re.compile(r'\bSCAN (TABLE )?%s\b' % re.escape(table))
+
+        for line in plan.splitlines():
+            if full_scan.search(line):
+                self.fail('Full table scan on %s:\n%s\n\n%s' % (table, plan, queryset.query))
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin that fails when the requests made inside the block run
+    more queries than the URL name's budget in query_budgets.json, or repeat
+    the same query (an N+1). SQL time isn't checked, it's too noisy in tests.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, url_name):
+        if url_name not in load_budgets():
+            self.fail('No query budget for %s in %s' % (url_name, settings.QUERY_BUDGET_FILE))
+
+        with QueryRecorder() as recorder:
+            yield recorder
+
+        problems = budget_problems(url_name, recorder, check_time=False)
+        if problems:
+            queries = '\n'.join(sql for sql, duration in recorder.queries)
+            self.fail('%s is over its query budget:\n%s\n\n%s' % (url_name, '\n'.join(problems), queries))
@@ -0,0 +1,59 @@
+"""
+Compile every template when a worker starts (lifeaid/wsgi.py, when
+TEMPLATE_WARMUP is on) so the cached loader already holds them when the
+first requests arrive, and broken templates show up in the boot log rather
+than as a 500 on whichever page uses them. `manage.py warm_templates` runs
+the same check and fails on errors, for deploy scripts.
+"""
+
+import logging
+import time
+from pathlib import Path
+
+from django.template import TemplateSyntaxError, engines
+from django.template.utils import get_app_template_dirs
+
+logger = logging.getLogger(__name__)
+
+
+TEMPLATE_SUFFIXES = ('.html', '.txt')
+
+
+def template_names(engine):
+    dirs = list(engine.dirs)
+    if engine.app_dirs:
+        dirs += get_app_template_dirs('templates')
+
+    names = set()
+    for directory in dirs:
+        directory = Path(directory)
+        for path in directory.rglob('*'):
+            if path.suffix in TEMPLATE_SUFFIXES and path.is_file():
+                names.add(path.relative_to(directory).as_posix())
+    return sorted(names)
+
+
+def warm_templates():
+    """
+    Load every template through the Django engine. Returns (compiled count,
+    seconds taken, {name: error}).
+    """
+    engine = engines['django']
+    errors = {}
+    compiled = 0
+    start = time.perf_counter()
+    for name in template_names(engine):
+        try:
+            engine.get_template(name)
+        except (TemplateSyntaxError, UnicodeDecodeError) as exc:
+            errors[name] = exc
+        else:
+            compiled += 1
+    return compiled, time.perf_counter() - start, errors
+
+
+def warm_templates_at_startup():
+    compiled, seconds, errors = warm_templates()
+    logger.info('Compiled %d templates in %.2fs', compiled, seconds)
+    for name, error in errors.items():
+        logger.error('Template %s does not compile: %s', name, error)
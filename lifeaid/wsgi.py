@@ -11,6 +11,12 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthstack.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lifeaid.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.TEMPLATE_WARMUP:
+    from lifeaid.warmup import warm_templates_at_startup
+    warm_templates_at_startup()
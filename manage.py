@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthstack.settings')
+    # The test suites run with their own settings (an in-memory cache)
+    settings_module = 'lifeaid.test_settings' if sys.argv[1:2] == ['test'] else 'lifeaid.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -2,9 +2,10 @@ from django.contrib import admin
 
 # Register your models here.
 from .models import Medicine, Pharmacist
-from .models import Cart, Order
+from .models import Cart, Order, StockHold
 
 admin.site.register(Cart)
 admin.site.register(Order)
 admin.site.register(Medicine)
 admin.site.register(Pharmacist)
+admin.site.register(StockHold)
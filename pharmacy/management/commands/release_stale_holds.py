@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from pharmacy.stock import release_stale_holds
+
+
+class Command(BaseCommand):
+    help = 'Delete expired pharmacy cart stock holds (run it from cron every few minutes)'
+
+    def handle(self, *args, **options):
+        released = release_stale_holds()
+        self.stdout.write(f'Released {released} stale stock hold(s)')
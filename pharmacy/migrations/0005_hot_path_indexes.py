@@ -0,0 +1,21 @@
+# Generated by Django 4.1.13 on 2026-10-19 15:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0004_remove_order_paymentid_order_payment_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['user', 'purchased'], name='cart_user_purchased_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['trans_ID'], name='order_trans_id_idx'),
+        ),
+    ]
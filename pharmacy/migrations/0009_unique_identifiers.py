@@ -0,0 +1,25 @@
+# Generated by Django 4.1.13 on 2026-10-19 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0008_dedupe_identifiers'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_trans_id_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='medicine',
+            constraint=models.UniqueConstraint(fields=('medicine_id',), name='medicine_id_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(fields=('trans_ID',), name='order_trans_id_unique'),
+        ),
+    ]
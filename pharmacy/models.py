@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
 import uuid
 from doctor.models import Prescription
 
@@ -23,6 +26,15 @@ class Pharmacist(models.Model):
         return str(self.user.username)
 
 
+class MedicineQuerySet(models.QuerySet):
+
+    # Stock left to sell = stock_quantity minus the unexpired cart holds
+    def with_available(self, now=None):
+        holds = StockHold.objects.filter(medicine=OuterRef('pk'), expires_at__gt=now or timezone.now())
+        held = holds.values('medicine').annotate(total=Sum('quantity')).values('total')
+        return self.annotate(available=Coalesce('stock_quantity', 0) - Coalesce(Subquery(held), 0))
+
+
 class Medicine(models.Model):
     MEDICINE_TYPE = (
         ('tablets', 'tablets'),
@@ -67,6 +79,17 @@ class Medicine(models.Model):
     price = models.IntegerField(null=True, blank=True, default=0)
     stock_quantity = models.IntegerField(null=True, blank=True, default=0)
     Prescription_reqiuired = models.CharField(max_length=200, choices=REQUIREMENT_TYPE, null=True, blank=True)
+    # Delta sync (api/sync.py). update() doesn't set it, so pharmacy/stock.py does
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            # From hospital/identifiers.py
+            models.UniqueConstraint(fields=['medicine_id'], name='medicine_id_unique'),
+        ]
+
+    objects = MedicineQuerySet.as_manager()
+
     def __str__(self):
         return str(self.name)
     
@@ -78,6 +101,12 @@ class Cart(models.Model):
     purchased = models.BooleanField(default=False)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # shop / cart views --> filter(user=request.user, purchased=False)
+            models.Index(fields=['user', 'purchased'], name='cart_user_purchased_idx'),
+        ]
     
     def __str__(self):
         return f'{self.quantity} X {self.item}'
@@ -89,6 +118,16 @@ class Cart(models.Model):
         return float_total
     
 
+class OrderQuerySet(models.QuerySet):
+    
+    # Subtotal and item count computed in SQL, one query for a whole list of orders
+    def with_totals(self):
+        return self.annotate(
+            subtotal=Coalesce(Sum(F('orderitems__item__price') * F('orderitems__quantity')), 0),
+            item_count=Count('orderitems'),
+        )
+
+
 class Order(models.Model):
     # id
     orderitems = models.ManyToManyField(Cart)
@@ -98,24 +137,32 @@ class Order(models.Model):
     payment_status = models.CharField(max_length=200, blank=True, null=True)
     trans_ID = models.CharField(max_length=200, blank=True, null=True)
 
-    # Subtotal
+    class Meta:
+        constraints = [
+            # From hospital/identifiers.py; the index also serves
+            # ssl_payment_success --> Order.objects.get(trans_ID=...)
+            models.UniqueConstraint(fields=['trans_ID'], name='order_trans_id_unique'),
+        ]
+
+    objects = OrderQuerySet.as_manager()
+
+    # Subtotal (annotated by with_totals() or aggregated once and kept on the instance)
     def get_totals(self):
-        total = 0 
-        for order_item in self.orderitems.all():
-            total += float(order_item.get_total())
-        return total
+        if not hasattr(self, 'subtotal'):
+            self.subtotal = self.orderitems.aggregate(
+                subtotal=Coalesce(Sum(F('item__price') * F('quantity')), 0))['subtotal']
+        return self.subtotal
     
     # Count Cart Items
     def count_cart_items(self):
-        return self.orderitems.count()
+        if not hasattr(self, 'item_count'):
+            self.item_count = self.orderitems.count()
+        return self.item_count
     
-    # Stock Calculation
+    # Stock Calculation (all items in one transaction, raises pharmacy.stock.OutOfStock)
     def stock_quantity_decrease(self):
-        for order_item in self.orderitems.all():
-            decrease_stock= order_item.item.stock_quantity - order_item.quantity
-            order_item.item.stock_quantity = decrease_stock 
-            order_item.item.stock_quantity.save()
-            return decrease_stock
+        from .stock import commit_order_stock
+        return commit_order_stock(self)
     
     # TOTAL
     def final_bill(self):
@@ -123,4 +170,21 @@ class Order(models.Model):
         Bill = self.get_totals()+ delivery_price
         float_Bill = format(Bill, '0.2f')
         return float_Bill
-    
+
+
+class StockHold(models.Model):
+    # Stock set aside for a cart until it is paid for or the hold expires
+    cart = models.OneToOneField(Cart, on_delete=models.CASCADE, related_name='hold')
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='holds')
+    quantity = models.IntegerField(default=1)
+    expires_at = models.DateTimeField(db_index=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Medicine.objects.with_available() --> sum of unexpired holds per medicine
+            models.Index(fields=['medicine', 'expires_at'], name='stockhold_medicine_exp_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.quantity} X {self.medicine} until {self.expires_at}'
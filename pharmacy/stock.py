@@ -0,0 +1,121 @@
+"""
+Stock bookkeeping for pharmacy orders.
+
+hold_stock() sets stock aside for a cart while the patient shops; holds
+expire after PHARMACY_CART_HOLD_SECONDS and are cleaned up by the
+release_stale_holds command. commit_order_stock() is called once the payment
+for an order is validated. It takes every ordered quantity off
+Medicine.stock_quantity in a single transaction and consumes the order's
+holds: either the whole order is deducted or nothing is.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .models import Medicine, Order, StockHold
+
+
+class OutOfStock(Exception):
+
+    def __init__(self, medicines):
+        self.medicines = medicines
+        names = ', '.join(str(medicine) for medicine in medicines) or 'some items'
+        super().__init__('Not enough stock for %s' % names)
+
+
+def hold_expiry(now=None):
+    return (now or timezone.now()) + timedelta(seconds=settings.PHARMACY_CART_HOLD_SECONDS)
+
+
+def hold_stock(cart, quantity):
+    """
+    Set quantity cart.item aside for the cart (and save it as the cart
+    quantity). Refreshes the hold's expiry. Raises OutOfStock and leaves the
+    cart and its hold untouched if that much isn't available. Shrinking a
+    hold that hasn't expired is never refused.
+    """
+    with transaction.atomic():
+        # Write the hold before reading anything (takes the write lock on SQLite)
+        now = timezone.now()
+        expires_at = hold_expiry(now)
+        held = StockHold.objects.filter(cart=cart, expires_at__gt=now).update(quantity=quantity, expires_at=expires_at)
+        if not held:
+            # No hold, or an expired one release_stale_holds hasn't deleted
+            # yet: its stock may have gone to someone else, so check as for a new hold
+            if not StockHold.objects.filter(cart=cart).update(quantity=quantity, expires_at=expires_at):
+                StockHold.objects.create(cart=cart, medicine_id=cart.item_id, quantity=quantity, expires_at=expires_at)
+
+        if not held or quantity > cart.quantity:
+            # Lock the medicine so concurrent holds on it are checked one at a time
+            list(Medicine.objects.select_for_update().filter(pk=cart.item_id).values_list('pk'))
+            medicine = Medicine.objects.with_available().get(pk=cart.item_id)
+            if medicine.available < 0:
+                raise OutOfStock([medicine])
+
+        cart.quantity = quantity
+        cart.save(update_fields=['quantity', 'updated'])
+
+
+def release_hold(cart):
+    StockHold.objects.filter(cart=cart).delete()
+
+
+def release_stale_holds(now=None):
+    # Returns the number of holds deleted
+    deleted, _ = StockHold.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
+
+
+def order_quantities(order):
+    # {medicine_id: quantity} for the carts in the order (same medicine twice is summed)
+    rows = order.orderitems.values('item').annotate(total=Sum('quantity')).values_list('item', 'total')
+    return dict(rows)
+
+
+def commit_order_stock(order):
+    """
+    Deduct the stock for every item of the order, all or nothing.
+
+    Raises OutOfStock (and changes nothing) if any medicine doesn't have
+    enough stock left. Returns False if the order was already committed, so a
+    replayed payment callback doesn't deduct twice.
+    """
+    with transaction.atomic():
+        # Claim the order first. This is also the first write of the
+        # transaction, so on SQLite the write lock is taken before any read.
+        claimed = Order.objects.filter(pk=order.pk, ordered=False).update(ordered=True)
+        if not claimed:
+            return False
+
+        quantities = order_quantities(order)
+        if quantities:
+            # Lock the medicine rows in a fixed order (no-op on SQLite)
+            list(Medicine.objects.select_for_update().filter(pk__in=quantities).order_by('pk').values_list('pk'))
+
+            # The order's own holds count towards what it may take
+            StockHold.objects.filter(cart__order=order).delete()
+            medicines = list(Medicine.objects.with_available().filter(pk__in=quantities).order_by('pk'))
+
+            short = [medicine for medicine in medicines if medicine.available < quantities[medicine.pk]]
+            if short or len(medicines) != len(quantities):
+                raise OutOfStock(short)
+
+            # One UPDATE for all items. The stock_quantity >= needed condition
+            # makes it safe even where select_for_update isn't supported.
+            needed = Case(
+                *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+                output_field=IntegerField(),
+            )
+            updated = Medicine.objects.filter(pk__in=quantities, stock_quantity__gte=needed).update(
+                stock_quantity=F('stock_quantity') - needed, updated_at=timezone.now())
+            if updated != len(quantities):
+                raise OutOfStock([])
+
+        order.orderitems.update(purchased=True)
+
+    order.ordered = True
+    return True
@@ -1,3 +1,207 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from hospital.models import User
+from lifeaid.testing import QueryPlanMixin
+from .models import Cart, Medicine, Order, StockHold
+from .stock import OutOfStock, commit_order_stock, hold_stock
 
 # Create your tests here.
+
+
+class HotQueryIndexTests(QueryPlanMixin, TestCase):
+
+    def test_open_cart(self):
+        self.assertUsesIndex(Cart.objects.filter(user=1, purchased=False))
+
+    def test_order_by_transaction_id(self):
+        self.assertUsesIndex(Order.objects.filter(trans_ID='SSLCZ_TEST_ABCDEFGH'))
+
+
+class OrderTotalsTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='buyer')
+        napa = Medicine.objects.create(name='Napa', price=12)
+        sergel = Medicine.objects.create(name='Sergel', price=7)
+        self.order = Order.objects.create(user=self.user)
+        self.order.orderitems.add(
+            Cart.objects.create(user=self.user, item=napa, quantity=3),
+            Cart.objects.create(user=self.user, item=sergel, quantity=2),
+        )
+
+    def test_totals_are_computed_once_per_instance(self):
+        order = Order.objects.get(pk=self.order.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(order.get_totals(), 50)
+            self.assertEqual(order.get_totals(), 50)
+            self.assertEqual(order.final_bill(), '90.00')
+
+    def test_with_totals_annotates_list_querysets(self):
+        Order.objects.create(user=self.user)
+        with self.assertNumQueries(1):
+            orders = list(Order.objects.with_totals().order_by('id'))
+            self.assertEqual([o.get_totals() for o in orders], [50, 0])
+            self.assertEqual([o.count_cart_items() for o in orders], [2, 0])
+
+
+class StockCommitTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='buyer')
+        self.napa = Medicine.objects.create(name='Napa', price=12, stock_quantity=5)
+        self.sergel = Medicine.objects.create(name='Sergel', price=7, stock_quantity=1)
+
+    def make_order(self, *items):
+        order = Order.objects.create(user=self.user)
+        order.orderitems.add(*[Cart.objects.create(user=self.user, item=item, quantity=quantity)
+                               for item, quantity in items])
+        return order
+
+    def test_decrements_every_item(self):
+        order = self.make_order((self.napa, 3), (self.sergel, 1))
+        self.assertTrue(order.stock_quantity_decrease())
+
+        self.napa.refresh_from_db()
+        self.sergel.refresh_from_db()
+        self.assertEqual((self.napa.stock_quantity, self.sergel.stock_quantity), (2, 0))
+        self.assertFalse(order.orderitems.filter(purchased=False).exists())
+
+    def test_commit_is_idempotent(self):
+        order = self.make_order((self.napa, 2))
+        self.assertTrue(order.stock_quantity_decrease())
+        self.assertFalse(Order.objects.get(pk=order.pk).stock_quantity_decrease())
+
+        self.napa.refresh_from_db()
+        self.assertEqual(self.napa.stock_quantity, 3)
+
+    def test_oversell_changes_nothing(self):
+        order = self.make_order((self.napa, 3), (self.sergel, 2))
+        with self.assertRaises(OutOfStock) as raised:
+            order.stock_quantity_decrease()
+        self.assertEqual(raised.exception.medicines, [self.sergel])
+
+        self.napa.refresh_from_db()
+        self.assertEqual(self.napa.stock_quantity, 5)
+        self.assertFalse(Order.objects.get(pk=order.pk).ordered)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+
+    def test_concurrent_checkouts_never_oversell(self):
+        user = User.objects.create(username='buyer')
+        napa = Medicine.objects.create(name='Napa', price=12, stock_quantity=5)
+        orders = []
+        for _ in range(12):
+            order = Order.objects.create(user=user)
+            order.orderitems.add(Cart.objects.create(user=user, item=napa, quantity=1))
+            orders.append(order)
+
+        results = []
+        start = threading.Barrier(len(orders))
+
+        def checkout(order):
+            start.wait()
+            try:
+                while True:
+                    try:
+                        results.append(commit_order_stock(order))
+                        return
+                    except OutOfStock:
+                        results.append(False)
+                        return
+                    except OperationalError:
+                        # SQLite only has one writer, the losers are told the database is locked
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(order,)) for order in orders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        napa.refresh_from_db()
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(napa.stock_quantity, 0)
+        self.assertEqual(Order.objects.filter(ordered=True).count(), 5)
+
+
+class StockHoldTests(TestCase):
+
+    def setUp(self):
+        self.alice = User.objects.create(username='alice')
+        self.bob = User.objects.create(username='bob')
+        self.napa = Medicine.objects.create(name='Napa', price=12, stock_quantity=5)
+
+    def available(self):
+        return Medicine.objects.with_available().get(pk=self.napa.pk).available
+
+    def test_holds_reduce_available_stock(self):
+        hold_stock(Cart.objects.create(user=self.alice, item=self.napa), 3)
+        self.assertEqual(self.available(), 2)
+
+        cart = Cart.objects.create(user=self.bob, item=self.napa)
+        with self.assertRaises(OutOfStock):
+            hold_stock(cart, 3)
+        cart.refresh_from_db()
+        self.assertEqual(cart.quantity, 1)
+        self.assertFalse(StockHold.objects.filter(cart=cart).exists())
+
+    def test_expired_holds_are_ignored_and_swept(self):
+        cart = Cart.objects.create(user=self.alice, item=self.napa)
+        hold_stock(cart, 5)
+        StockHold.objects.filter(cart=cart).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.available(), 5)
+
+        out = StringIO()
+        call_command('release_stale_holds', stdout=out)
+        self.assertIn('Released 1', out.getvalue())
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_expired_holds_are_checked_again(self):
+        cart = Cart.objects.create(user=self.alice, item=self.napa)
+        hold_stock(cart, 5)
+        StockHold.objects.filter(cart=cart).update(expires_at=timezone.now() - timedelta(seconds=1))
+        hold_stock(Cart.objects.create(user=self.bob, item=self.napa), 3)
+
+        # Shrinking the expired hold would revive stock that has gone to bob
+        with self.assertRaises(OutOfStock):
+            hold_stock(cart, 4)
+        hold_stock(cart, 2)
+        self.assertEqual(self.available(), 0)
+
+    def test_shrinking_an_expired_hold_in_the_cart(self):
+        patient = User.objects.create(username='karim', is_patient=True)
+        cart = Cart.objects.create(user=patient, item=self.napa)
+        Order.objects.create(user=patient).orderitems.add(cart)
+        hold_stock(cart, 5)
+        StockHold.objects.filter(cart=cart).update(expires_at=timezone.now() - timedelta(seconds=1))
+        hold_stock(Cart.objects.create(user=self.bob, item=self.napa), 3)
+
+        self.client.force_login(patient)
+        response = self.client.post(reverse('decrease-item', args=[self.napa.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Not enough Napa left in stock')
+        cart.refresh_from_db()
+        self.assertEqual(cart.quantity, 5)
+
+    def test_commit_consumes_the_orders_holds(self):
+        order = Order.objects.create(user=self.alice)
+        cart = Cart.objects.create(user=self.alice, item=self.napa)
+        order.orderitems.add(cart)
+        hold_stock(cart, 4)
+        hold_stock(Cart.objects.create(user=self.bob, item=self.napa), 1)
+
+        self.assertTrue(commit_order_stock(order))
+        self.assertFalse(StockHold.objects.filter(cart=cart).exists())
+        self.assertEqual(self.available(), 0)
@@ -1,4 +1,3 @@
-import email
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import HttpResponse
 # from django.contrib.auth.models import User
@@ -10,6 +9,7 @@ from django.contrib import messages
 
 from hospital.models import Patient
 from pharmacy.models import Medicine, Cart, Order
+from .stock import OutOfStock, hold_stock, release_hold
 from .utils import searchMedicines
 from django.views.decorators.csrf import csrf_exempt
 
@@ -27,9 +27,9 @@ from django.views.decorators.csrf import csrf_exempt
 def pharmacy_single_product(request,pk):
      if request.user.is_authenticated and request.user.is_patient:
          
-        patient = Patient.objects.get(user=request.user)
+        patient = request.profile
         medicines = Medicine.objects.get(serial_number=pk)
-        orders = Order.objects.filter(user=request.user, ordered=False)
+        orders = Order.objects.filter(user=request.user, ordered=False).with_totals()
         carts = Cart.objects.filter(user=request.user, purchased=False)
         if carts.exists() and orders.exists():
             order = orders[0]
@@ -48,9 +48,9 @@ def pharmacy_single_product(request,pk):
 def pharmacy_shop(request):
     if request.user.is_authenticated and request.user.is_patient:
         
-        patient = Patient.objects.get(user=request.user)
+        patient = request.profile
         medicines = Medicine.objects.all()
-        orders = Order.objects.filter(user=request.user, ordered=False)
+        orders = Order.objects.filter(user=request.user, ordered=False).with_totals()
         carts = Cart.objects.filter(user=request.user, purchased=False)
         
         medicines, search_query = searchMedicines(request)
@@ -78,17 +78,27 @@ def checkout(request):
 def add_to_cart(request, pk):
     if request.user.is_authenticated and request.user.is_patient:
          
-        patient = Patient.objects.get(user=request.user)
+        patient = request.profile
         medicines = Medicine.objects.all()
         
         item = get_object_or_404(Medicine, pk=pk)
         order_item = Cart.objects.get_or_create(item=item, user=request.user, purchased=False)
         order_qs = Order.objects.filter(user=request.user, ordered=False)
+        in_order = order_qs.exists() and order_qs[0].orderitems.filter(item=item).exists()
+        
+        # Hold the stock before the item goes into the order
+        try:
+            hold_stock(order_item[0], order_item[0].quantity + 1 if in_order else order_item[0].quantity)
+        except OutOfStock:
+            if order_item[1]:
+                order_item[0].delete()
+            messages.warning(request, f"{item.name} is out of stock")
+            context = {'patient': patient,'medicines': medicines}
+            return render(request, 'pharmacy/shop.html', context)
+        
         if order_qs.exists():
             order = order_qs[0]
-            if order.orderitems.filter(item=item).exists():
-                order_item[0].quantity += 1
-                order_item[0].save()
+            if in_order:
                 # messages.warning(request, "This item quantity was updated!")
                 context = {'patient': patient,'medicines': medicines, 'order': order}
                 return render(request, 'pharmacy/shop.html', context)
@@ -115,11 +125,11 @@ def add_to_cart(request, pk):
 def cart_view(request):
     if request.user.is_authenticated and request.user.is_patient:
          
-        patient = Patient.objects.get(user=request.user)
+        patient = request.profile
         medicines = Medicine.objects.all()
         
         carts = Cart.objects.filter(user=request.user, purchased=False)
-        orders = Order.objects.filter(user=request.user, ordered=False)
+        orders = Order.objects.filter(user=request.user, ordered=False).with_totals()
         if carts.exists() and orders.exists():
             order = orders[0]
             context = {'carts': carts,'order': order}
@@ -138,7 +148,7 @@ def cart_view(request):
 def remove_from_cart(request, pk):
     if request.user.is_authenticated and request.user.is_patient:
          
-        patient = Patient.objects.get(user=request.user)
+        patient = request.profile
         medicines = Medicine.objects.all()
         carts = Cart.objects.filter(user=request.user, purchased=False)
         
@@ -149,6 +159,7 @@ def remove_from_cart(request, pk):
             if order.orderitems.filter(item=item).exists():
                 order_item = Cart.objects.filter(item=item, user=request.user, purchased=False)[0]
                 order.orderitems.remove(order_item)
+                release_hold(order_item)
                 order_item.delete()
                 messages.warning(request, "This item was remove from your cart!")
                 context = {'carts': carts,'order': order}
@@ -172,7 +183,7 @@ def remove_from_cart(request, pk):
 def increase_cart(request, pk):
     if request.user.is_authenticated and request.user.is_patient:
          
-        patient = Patient.objects.get(user=request.user)
+        patient = request.profile
         medicines = Medicine.objects.all()
         carts = Cart.objects.filter(user=request.user, purchased=False)
         item = get_object_or_404(Medicine, pk=pk)
@@ -182,8 +193,12 @@ def increase_cart(request, pk):
             if order.orderitems.filter(item=item).exists():
                 order_item = Cart.objects.filter(item=item, user=request.user, purchased=False)[0]
                 if order_item.quantity >= 1:
-                    order_item.quantity += 1
-                    order_item.save()
+                    try:
+                        hold_stock(order_item, order_item.quantity + 1)
+                    except OutOfStock:
+                        messages.warning(request, f"No more {item.name} left in stock")
+                        context = {'carts': carts,'order': order}
+                        return render(request, 'Pharmacy/cart.html', context)
                     messages.warning(request, f"{item.name} quantity has been updated")
                     context = {'carts': carts,'order': order}
                     return render(request, 'Pharmacy/cart.html', context)
@@ -206,7 +221,7 @@ def increase_cart(request, pk):
 def decrease_cart(request, pk):
     if request.user.is_authenticated and request.user.is_patient:
          
-        patient = Patient.objects.get(user=request.user)
+        patient = request.profile
         medicines = Medicine.objects.all()
         carts = Cart.objects.filter(user=request.user, purchased=False)
         item = get_object_or_404(Medicine, pk=pk)
@@ -216,13 +231,19 @@ def decrease_cart(request, pk):
             if order.orderitems.filter(item=item).exists():
                 order_item = Cart.objects.filter(item=item, user=request.user, purchased=False)[0]
                 if order_item.quantity > 1:
-                    order_item.quantity -= 1
-                    order_item.save()
+                    try:
+                        hold_stock(order_item, order_item.quantity - 1)
+                    except OutOfStock:
+                        # The hold expired and its stock went to other carts
+                        messages.warning(request, f"Not enough {item.name} left in stock to keep {order_item.quantity - 1} in your cart")
+                        context = {'carts': carts,'order': order}
+                        return render(request, 'Pharmacy/cart.html', context)
                     messages.warning(request, f"{item.name} quantity has been updated")
                     context = {'carts': carts,'order': order}
                     return render(request, 'Pharmacy/cart.html', context)
                 else:
                     order.orderitems.remove(order_item)
+                    release_hold(order_item)
                     order_item.delete()
                     messages.warning(request, f"{item.name} item has been removed from your cart")
                     context = {'carts': carts,'order': order}
@@ -0,0 +1,40 @@
+# Makes Payment.transaction_id and invoice_number unique so that the
+# following migration can add unique constraints: the random identifiers
+# they held could repeat (and Payment.objects.get(transaction_id=...) then
+# raised MultipleObjectsReturned).
+# Blanks become NULL; a repeated value stays on its oldest row and the
+# others get '-<pk>' appended.
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def dedupe_identifiers(model, field):
+    # Written out here rather than imported, so this migration can't change with the app
+    model.objects.filter(**{field: ''}).update(**{field: None})
+
+    duplicates = (
+        model.objects.exclude(**{field + '__isnull': True})
+        .values_list(field, flat=True).annotate(rows=Count('pk')).filter(rows__gt=1).order_by()
+    )
+    for value in list(duplicates):
+        rows = list(model.objects.filter(**{field: value}).order_by('pk'))
+        for row in rows[1:]:
+            setattr(row, field, '%s-%s' % (value, row.pk))
+        model.objects.bulk_update(rows[1:], [field])
+
+
+def dedupe(apps, schema_editor):
+    dedupe_identifiers(apps.get_model('sslcommerz', 'Payment'), 'transaction_id')
+    dedupe_identifiers(apps.get_model('sslcommerz', 'Payment'), 'invoice_number')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sslcommerz', '0007_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe, migrations.RunPython.noop),
+    ]
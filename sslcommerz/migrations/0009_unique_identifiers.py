@@ -0,0 +1,25 @@
+# Generated by Django 4.1.13 on 2026-10-19 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sslcommerz', '0008_dedupe_identifiers'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='payment',
+            name='payment_transaction_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(fields=('transaction_id',), name='payment_transaction_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(fields=('invoice_number',), name='payment_invoice_unique'),
+        ),
+    ]
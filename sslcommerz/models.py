@@ -47,6 +47,14 @@ class Payment(models.Model):
     
     
 
+    class Meta:
+        constraints = [
+            # From hospital/identifiers.py; the index also serves
+            # ssl_payment_success --> Payment.objects.get(transaction_id=...)
+            models.UniqueConstraint(fields=['transaction_id'], name='payment_transaction_unique'),
+            models.UniqueConstraint(fields=['invoice_number'], name='payment_invoice_unique'),
+        ]
+
     # String representation of object
     def __str__(self):
         return str(self.name)
@@ -1,3 +1,56 @@
+from unittest import mock
+
 from django.test import TestCase
+from django.urls import reverse
+
+from hospital.models import User
+from lifeaid.testing import QueryPlanMixin
+from pharmacy.models import Cart, Medicine, Order
+from .models import Payment
 
 # Create your tests here.
+
+
+class HotQueryIndexTests(QueryPlanMixin, TestCase):
+
+    def test_payment_by_transaction_id(self):
+        self.assertUsesIndex(Payment.objects.filter(transaction_id='SSLCZ_TEST_ABCDEFGH'))
+
+
+class PaymentSuccessTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create(username='buyer', is_patient=True)
+        self.napa = Medicine.objects.create(name='Napa', price=12, stock_quantity=5)
+        self.order = Order.objects.create(user=user, trans_ID='SSLCZ_TEST_000000001')
+        self.order.orderitems.add(Cart.objects.create(user=user, item=self.napa, quantity=2))
+        Payment.objects.create(patient=user.patient, order=self.order, payment_type='pharmacy',
+                               transaction_id='SSLCZ_TEST_000000001')
+
+    def post(self):
+        return self.client.post(reverse('ssl-payment-success'), {
+            'status': 'VALID', 'tran_id': 'SSLCZ_TEST_000000001', 'val_id': 'V1',
+            'verify_sign': 'forged', 'verify_key': 'status,tran_id,val_id',
+        })
+
+    @mock.patch('sslcommerz.views.sslcz')
+    def test_failed_hash_changes_nothing(self, sslcz):
+        sslcz.hash_validate_ipn.return_value = False
+        with self.assertLogs('sslcommerz.views', 'ERROR'):
+            self.assertRedirects(self.post(), reverse('ssl-payment-fail'), fetch_redirect_response=False)
+
+        sslcz.validationTransactionOrder.assert_not_called()
+        self.napa.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.napa.stock_quantity, 5)
+        self.assertEqual((self.order.payment_status, self.order.ordered), (None, False))
+
+    @mock.patch('sslcommerz.views.sslcz')
+    def test_payment_the_gateway_does_not_confirm_changes_nothing(self, sslcz):
+        sslcz.hash_validate_ipn.return_value = True
+        sslcz.validationTransactionOrder.return_value = {'status': 'INVALID_TRANSACTION'}
+        with self.assertLogs('sslcommerz.views', 'ERROR'):
+            self.post()
+
+        self.napa.refresh_from_db()
+        self.assertEqual(self.napa.stock_quantity, 5)
@@ -2,12 +2,15 @@ from django.shortcuts import render
 from django.urls import reverse
 from django.shortcuts import render, HttpResponseRedirect, redirect
 from django.contrib.auth.decorators import login_required
+from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
 import random
 import string
 from .models import Payment
 from hospital.models import Patient
+from hospital.identifiers import next_identifier
 from pharmacy.models import Order, Cart
+from pharmacy.stock import OutOfStock
 from doctor.models import Appointment, Prescription, Prescription_test, testCart, testOrder 
 from django.contrib.auth.decorators import login_required
 
@@ -19,8 +22,12 @@ from django.utils.html import strip_tags
 
 
 # from .models import Patient, User
-from sslcommerz_lib import SSLCOMMERZ
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+import logging
+
+
+logger = logging.getLogger(__name__)
 
 
 STORE_ID = settings.STORE_ID
@@ -30,27 +37,27 @@ STORE_NAME = settings.STORE_NAME
 payment_settings = {'store_id': STORE_ID,
             'store_pass': STORE_PASSWORD, 'issandbox': True}
 
-sslcz = SSLCOMMERZ(payment_settings)
+def sslcommerz_client():
+    # sslcommerz_lib pulls in requests; only the payment views need it
+    from sslcommerz_lib import SSLCOMMERZ
+    return SSLCOMMERZ(payment_settings)
 
 
-# Create your views here.
+sslcz = SimpleLazyObject(sslcommerz_client)
 
 
+def payment_is_valid(payment_data):
+    # The success POST comes through the patient's browser: check SSLCommerz
+    # signed it, then ask SSLCommerz about the payment itself
+    if not sslcz.hash_validate_ipn(payment_data):
+        return False
+    response = sslcz.validationTransactionOrder(payment_data['val_id'])
+    return response.get('status') in ('VALID', 'VALIDATED')
+
+
+# Create your views here.
 
-def generate_random_string():
-    N = 8
-    string_var = ""
-    string_var = ''.join(random.choices(
-        string.ascii_uppercase + string.digits, k=N))
-    string_var = "SSLCZ_TEST_" + string_var
-    return string_var
 
-def generate_random_invoice():
-    N = 4
-    string_var = ""
-    string_var = ''.join(random.choices(string.digits, k=N))
-    string_var = "#INV-" + string_var
-    return string_var
 
 
 def generate_random_val_id():
@@ -85,12 +92,12 @@ def ssl_payment_request(request, pk, id):
     patient = Patient.objects.get(patient_id=pk)
     appointment = Appointment.objects.get(id=id)
     
-    invoice_number = generate_random_invoice()
+    invoice_number = next_identifier('invoice')
     
     post_body = {}
     post_body['total_amount'] = appointment.doctor.consultation_fee + appointment.doctor.report_fee
     post_body['currency'] = "BDT"
-    post_body['tran_id'] = generate_random_string()
+    post_body['tran_id'] = next_identifier('transaction')
 
     post_body['success_url'] = request.build_absolute_uri(
         reverse('ssl-payment-success'))
@@ -155,12 +162,12 @@ def ssl_payment_request_medicine(request, pk, id):
     patient = Patient.objects.get(patient_id=pk)
     order = Order.objects.get(id=id)
     
-    invoice_number = generate_random_invoice()
+    invoice_number = next_identifier('invoice')
     
     post_body = {}
     post_body['total_amount'] = order.final_bill()
     post_body['currency'] = "BDT"
-    post_body['tran_id'] = generate_random_string()
+    post_body['tran_id'] = next_identifier('transaction')
 
     post_body['success_url'] = request.build_absolute_uri(
         reverse('ssl-payment-success'))
@@ -224,12 +231,12 @@ def ssl_payment_request_test(request, pk, id, pk2):
     test_order = testOrder.objects.get(id=id)
     prescription = Prescription.objects.get(prescription_id=pk2)
     
-    invoice_number = generate_random_invoice()
+    invoice_number = next_identifier('invoice')
     
     post_body = {}
     post_body['total_amount'] = test_order.final_bill()
     post_body['currency'] = "BDT"
-    post_body['tran_id'] = generate_random_string()
+    post_body['tran_id'] = next_identifier('transaction')
 
     post_body['success_url'] = request.build_absolute_uri(
         reverse('ssl-payment-success'))
@@ -321,6 +328,12 @@ def ssl_payment_success(request):
         payment_data['currency_amount']
         """
 
+        # Nothing is marked paid or taken off stock until the payment checks out
+        if not payment_is_valid(payment_data):
+            logger.error('SSLCommerz payment %s failed validation', tran_id)
+            messages.error(request, 'Your payment could not be verified. Please contact us if you were charged.')
+            return redirect('ssl-payment-fail')
+
         # Update Database
         payment = Payment.objects.get(transaction_id=tran_id)
         
@@ -344,12 +357,6 @@ def ssl_payment_success(request):
             appointment.payment_status = "VALID"
             appointment.save()
             
-    
-            if sslcz.hash_validate_ipn(payment_data):
-                response = sslcz.validationTransactionOrder(payment_data['val_id'])
-                print(response)
-            else:
-                print("Hash validation failed")
 
             #dic = {'payment_data': payment_data, 'response': response}
             #return render(request, 'success.html', dic)
@@ -404,12 +411,6 @@ def ssl_payment_success(request):
             test_order = testOrder.objects.get(trans_ID=tran_id)
             test_order.payment_status = "VALID"
             test_order.save()
-    
-            if sslcz.hash_validate_ipn(payment_data):
-                response = sslcz.validationTransactionOrder(payment_data['val_id'])
-                print(response)
-            else:
-                print("Hash validation failed")
                 
             # # Mailtrap
             patient_email = payment.patient.email
@@ -483,12 +484,14 @@ def ssl_payment_success(request):
             order = Order.objects.get(trans_ID=tran_id)
             order.payment_status = "VALID"
             order.save()
-    
-            if sslcz.hash_validate_ipn(payment_data):
-                response = sslcz.validationTransactionOrder(payment_data['val_id'])
-                print(response)
-            else:
-                print("Hash validation failed")
+            
+            try:
+                order.stock_quantity_decrease()
+            except OutOfStock as e:
+                order.payment_status = "OUT_OF_STOCK"
+                order.save(update_fields=['payment_status'])
+                messages.error(request, f'{e}. Your payment will be refunded.')
+                return redirect('patient-dashboard')
                 
             # Mailtrap
             patient_email = payment.patient.email
@@ -534,8 +537,6 @@ def ssl_payment_success(request):
             except BadHeaderError:
                 return HttpResponse('Invalid header found')
             
-            # Reset cart
-            Cart.objects.all().delete()
                 
             return redirect('patient-dashboard')
 